@@ -0,0 +1,313 @@
+"""
+Penyimpanan percakapan & hasil analisis di SQLite (WAL).
+
+Riwayat tidak lagi ditahan sebagai list dict di session_state (hilang saat
+logout/idle dan membengkak di memori server). Modul ini menyimpan:
+- conversations : satu baris per percakapan per user
+- messages      : pesan berurutan (seq) per percakapan + metadata JSON
+- threat_rows   : baris tabel threat hasil parse jawaban asisten, ber-index
+                  per user, model, waktu; CWE di tabel threat_cwes
+UI hanya memuat satu halaman pesan terakhir per rerun (lazy paging).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from threat_records import get_threat_records
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id        INTEGER PRIMARY KEY,
+    username  TEXT NOT NULL,
+    title     TEXT NOT NULL DEFAULT '',
+    model     TEXT,
+    created   REAL NOT NULL,
+    updated   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations(username, updated DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id               INTEGER PRIMARY KEY,
+    conversation_id  INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    seq              INTEGER NOT NULL,
+    role             TEXT NOT NULL,
+    content          TEXT NOT NULL,
+    display          TEXT,
+    model            TEXT,
+    meta             TEXT,
+    created          REAL NOT NULL,
+    UNIQUE (conversation_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS threat_rows (
+    id               INTEGER PRIMARY KEY,
+    message_id       INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    conversation_id  INTEGER NOT NULL,
+    username         TEXT NOT NULL,
+    model            TEXT,
+    flow             TEXT,
+    threat           TEXT,
+    ciaan            TEXT,
+    scenario         TEXT,
+    recommendation   TEXT,
+    dread            REAL,
+    created          REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threat_rows_user ON threat_rows(username, created DESC);
+CREATE INDEX IF NOT EXISTS idx_threat_rows_model ON threat_rows(model, created DESC);
+CREATE INDEX IF NOT EXISTS idx_threat_rows_created ON threat_rows(created DESC);
+CREATE INDEX IF NOT EXISTS idx_threat_rows_message ON threat_rows(message_id);
+
+CREATE TABLE IF NOT EXISTS threat_cwes (
+    row_id  INTEGER NOT NULL REFERENCES threat_rows(id) ON DELETE CASCADE,
+    cwe     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threat_cwes_cwe ON threat_cwes(cwe);
+CREATE INDEX IF NOT EXISTS idx_threat_cwes_row ON threat_cwes(row_id);
+"""
+
+_CWE_RE = re.compile(r"CWE[-\s]?(\d{1,4})", re.I)
+
+# Kolom pesan yang disimpan langsung; sisanya (usage, cache_key, ...) masuk `meta`
+_MESSAGE_FIELDS = ("role", "content", "display")
+
+
+def normalize_cwe(value: str) -> str:
+    """'cwe 89' / 'CWE-089' → 'CWE-89'; '' jika tidak ada nomor CWE."""
+    m = _CWE_RE.search(value or "")
+    return f"CWE-{int(m.group(1))}" if m else ""
+
+
+def extract_threat_rows(content: str) -> list:
+    """Baris threat jawaban asisten (flow, threat, C/I/Au/Av/N, CWE, skor DREAD) dari ThreatRecords."""
+    return get_threat_records(content).rows()
+
+
+class AnalysisStore:
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    # ---- percakapan ----
+    def create_conversation(self, username: str, model: str = None, title: str = "") -> int:
+        now = self._clock()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO conversations (username, title, model, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (username, title, model, now, now),
+            )
+            return cur.lastrowid
+
+    def list_conversations(self, username: str, limit: int = 20, offset: int = 0) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, model, created, updated FROM conversations "
+                "WHERE username = ? ORDER BY updated DESC LIMIT ? OFFSET ?",
+                (username, limit, offset),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def latest_conversation(self, username: str):
+        convs = self.list_conversations(username, limit=1)
+        return convs[0]["id"] if convs else None
+
+    def delete_conversation(self, conversation_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    # ---- pesan ----
+    def append_message(self, conversation_id: int, message: dict, username: str = "", model: str = None) -> dict:
+        """
+        Simpan pesan di akhir percakapan; pesan asisten juga di-parse ke threat_rows.
+        Mengembalikan salinan `message` dengan `id` dan `seq`.
+        """
+        now = self._clock()
+        meta = {k: v for k, v in message.items() if k not in _MESSAGE_FIELDS and k not in ("id", "seq")}
+        threat_rows = extract_threat_rows(message["content"]) if message["role"] == "assistant" else []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()[0]
+                cur = self._conn.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, display, model, meta, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (conversation_id, seq, message["role"], message["content"], message.get("display"),
+                     model, json.dumps(meta) if meta else None, now),
+                )
+                message_id = cur.lastrowid
+                for row in threat_rows:
+                    row_id = self._conn.execute(
+                        "INSERT INTO threat_rows (message_id, conversation_id, username, model, flow, threat, "
+                        "ciaan, scenario, recommendation, dread, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (message_id, conversation_id, username, model, row["flow"], row["threat"], row["ciaan"],
+                         row["scenario"], row["recommendation"], row["dread"], now),
+                    ).lastrowid
+                    self._conn.executemany(
+                        "INSERT INTO threat_cwes (row_id, cwe) VALUES (?, ?)", [(row_id, c) for c in row["cwes"]]
+                    )
+                title_src = message.get("display") or message["content"]
+                self._conn.execute(
+                    "UPDATE conversations SET updated = ?, "
+                    "title = CASE WHEN title = '' AND ? = 'user' THEN ? ELSE title END WHERE id = ?",
+                    (now, message["role"], " ".join(title_src.split())[:80], conversation_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(message, id=message_id, seq=seq)
+
+    def update_message_meta(self, message_id: int, **changes) -> None:
+        """Ubah metadata pesan; nilai None menghapus kunci."""
+        with self._lock:
+            row = self._conn.execute("SELECT meta FROM messages WHERE id = ?", (message_id,)).fetchone()
+            if row is None:
+                return
+            meta = json.loads(row["meta"]) if row["meta"] else {}
+            for k, v in changes.items():
+                if v is None:
+                    meta.pop(k, None)
+                else:
+                    meta[k] = v
+            self._conn.execute("UPDATE messages SET meta = ? WHERE id = ?",
+                               (json.dumps(meta) if meta else None, message_id))
+
+    def delete_message(self, message_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+
+    def count_messages(self, conversation_id: int) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+
+    def load_messages(self, conversation_id: int, limit: int = 20, before_seq: int = None) -> list:
+        """`limit` pesan terakhir (sebelum `before_seq` jika diisi), urut naik; format dict pesan chat."""
+        query = "SELECT id, seq, role, content, display, meta FROM messages WHERE conversation_id = ?"
+        params = [conversation_id]
+        if before_seq is not None:
+            query += " AND seq < ?"
+            params.append(before_seq)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        messages = []
+        for r in reversed(rows):
+            message = json.loads(r["meta"]) if r["meta"] else {}
+            message.update(id=r["id"], seq=r["seq"], role=r["role"], content=r["content"])
+            if r["display"] is not None:
+                message["display"] = r["display"]
+            messages.append(message)
+        return messages
+
+    def load_contents(self, conversation_id: int, role: str = "assistant") -> list:
+        """[(seq, content)] semua pesan `role` di percakapan (urut naik), tanpa meta."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, content FROM messages WHERE conversation_id = ? AND role = ? ORDER BY seq",
+                (conversation_id, role),
+            ).fetchall()
+        return [(r["seq"], r["content"]) for r in rows]
+
+    def get_message(self, message_id: int):
+        """Satu pesan (format dict pesan chat) atau None jika sudah dihapus."""
+        with self._lock:
+            r = self._conn.execute(
+                "SELECT id, seq, role, content, display, meta FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+        if r is None:
+            return None
+        message = json.loads(r["meta"]) if r["meta"] else {}
+        message.update(id=r["id"], seq=r["seq"], role=r["role"], content=r["content"])
+        if r["display"] is not None:
+            message["display"] = r["display"]
+        return message
+
+    def load_analyses(self, after_id: int = 0, limit: int = 1000) -> list:
+        """
+        Pasangan pertanyaan → jawaban asisten dengan id jawaban > `after_id` (urut id naik),
+        untuk indeks kemiripan: prompt yang ditampilkan, teks flow/threat & CWE dari
+        threat_rows (tanpa parse ulang markdown). Prompt berisi file dan jawaban hasil
+        pakai-ulang dilewati agar tidak terindeks dua kali.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.id, a.conversation_id, a.model, a.created, a.meta, c.username, "
+                "COALESCE(u.display, u.content) AS prompt, u.meta AS prompt_meta, "
+                "(SELECT group_concat(COALESCE(t.flow, '') || ' ' || COALESCE(t.threat, ''), '\n') "
+                " FROM threat_rows t WHERE t.message_id = a.id) AS threats, "
+                "(SELECT group_concat(w.cwe, ' ') FROM threat_rows t JOIN threat_cwes w ON w.row_id = t.id "
+                " WHERE t.message_id = a.id) AS cwes, "
+                "(SELECT COUNT(*) FROM threat_rows t WHERE t.message_id = a.id) AS threat_count "
+                "FROM messages a "
+                "JOIN messages u ON u.conversation_id = a.conversation_id AND u.seq = a.seq - 1 AND u.role = 'user' "
+                "JOIN conversations c ON c.id = a.conversation_id "
+                "WHERE a.role = 'assistant' AND a.id > ? ORDER BY a.id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+        analyses = []
+        for r in rows:
+            meta = json.loads(r["meta"]) if r["meta"] else {}
+            prompt_meta = json.loads(r["prompt_meta"]) if r["prompt_meta"] else {}
+            analyses.append({
+                "id": r["id"],
+                "conversation_id": r["conversation_id"],
+                "username": r["username"],
+                "model": r["model"],
+                "created": r["created"],
+                "prompt": r["prompt"],
+                "threats": f"{r['threats'] or ''}\n{r['cwes'] or ''}".strip(),
+                "threat_count": r["threat_count"],
+                "indexable": "file" not in prompt_meta and "reused_from" not in meta,
+            })
+        return analyses
+
+    # ---- kueri threat ----
+    def query_threats(self, username: str = None, model: str = None, cwe: str = None,
+                      since: float = None, limit: int = 100) -> list:
+        """Baris threat terbaru dengan filter opsional; memakai index per kolom filter."""
+        query = ("SELECT t.id, t.conversation_id, t.model, t.flow, t.threat, t.ciaan, t.dread, t.created, "
+                 "(SELECT group_concat(cwe, ', ') FROM threat_cwes WHERE row_id = t.id) AS cwes "
+                 "FROM threat_rows t")
+        where, params = [], []
+        if cwe:
+            query += " JOIN threat_cwes c ON c.row_id = t.id"
+            where.append("c.cwe = ?")
+            params.append(normalize_cwe(cwe) or cwe)
+        if username:
+            where.append("t.username = ?")
+            params.append(username)
+        if model:
+            where.append("t.model = ?")
+            params.append(model)
+        if since is not None:
+            where.append("t.created >= ?")
+            params.append(since)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY t.created DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(r) for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
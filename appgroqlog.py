@@ -1,423 +1,788 @@
 import streamlit as st
-import groq
-from PIL import Image
 import time
-import base64
-import re
+import os
 
-# HTML/Markdown -> PDF
-import markdown2
-from xhtml2pdf import pisa
-from io import BytesIO, StringIO
+# groq dan PIL diimpor saat dibutuhkan (klien dibuat sekali / gambar ditampilkan) agar
+# halaman login tidak membayar impor pertamanya; xhtml2pdf & pandas ditunda di exporters.
 
-# Excel
-import pandas as pd
+# Model dokumen (markdown di-parse sekali per pesan)
+from report_model import get_report_document
 
-# =========================
-# 1) Konfigurasi Halaman
-# =========================
-st.set_page_config(
-    page_title="Alfa Threat Model Expert Analysis",
-    page_icon="⚡️",
-    layout="centered"
-)
+# Ekspor PDF/Excel
+from exporters import ExportError, create_pdf_with_xhtml2pdf, create_excel_from_markdown
 
-# =========================
-# 2) PDF Utilities (rapi)
-# =========================
-def _shape_tables_for_pdf(raw_html: str) -> str:
-    """
-    Post-process HTML agar tabel lebih rapi untuk xhtml2pdf:
-    - Tambahkan <thead> pada baris header
-    - Tambahkan <colgroup> dengan lebar kolom yang presisi jika header cocok
-    - Rapikan sel & mencegah baris terbelah
-    """
-    def strip_tags(t):
-        return re.sub(r"<[^>]+>", "", t, flags=re.I | re.S).strip()
-
-    def add_colgroup_for_known_table(table_html: str) -> str:
-        m = re.search(r"<tr[^>]*>(.*?)</tr>", table_html, flags=re.I | re.S)
-        if not m:
-            return table_html
-        header_row = m.group(1)
-        headers = re.findall(r"<t[hd][^>]*>(.*?)</t[hd]>", header_row, flags=re.I | re.S)
-        headers_text = [strip_tags(h).lower() for h in headers]
-        if not headers_text:
-            return table_html
-
-        def norm(h):
-            h = h.replace("authentication", "au").replace("availability", "av")
-            h = h.replace("confidentiality", "c").replace("integrity", "i")
-            h = h.replace("non-repudiation", "n")
-            return h.strip().lower()
-
-        mapped = [norm(h) for h in headers_text]
-
-        score = 0
-        if any(x.startswith("flow") for x in mapped): score += 1
-        if "threat" in "".join(mapped): score += 1
-        for k in ["c", "i", "au", "av", "n"]:
-            if k in mapped: score += 1
-        if any("scenario" in x for x in mapped): score += 1
-        if any("rekomendasi" in x for x in mapped): score += 1
-        if score < max(5, len(mapped) // 2):
-            return table_html  # bukan tabel target
-
-        # target: 9 kolom → 18,22,4,4,4,4,4,22,18
-        widths = [18, 22, 4, 4, 4, 4, 4, 22, 18]
-        n = len(mapped)
-        if n == 9:
-            weights = widths
-        else:
-            base = [20, 20] + [int(60 / max(1, n - 2))] * (n - 2)
-            weights = base
-
-        colgroup = "<colgroup>" + "".join([f'<col style="width:{w}%;"/>' for w in weights]) + "</colgroup>"
-        table_html = re.sub(r"(<table[^>]*>)", r"\1" + colgroup, table_html, flags=re.I | re.S, count=1)
-        return table_html
-
-    def ensure_thead(table_html: str) -> str:
-        if re.search(r"<thead", table_html, flags=re.I):
-            return table_html
-        return re.sub(
-            r"(<table[^>]*>\s*)(<tr[^>]*>.*?</tr>)",
-            r"\1<thead>\2</thead>",
-            table_html,
-            flags=re.I | re.S,
-            count=1
-        )
+# Laporan satu percakapan penuh (PDF berdaftar isi + workbook), dirakit dari fragmen per pesan
+from session_report import fragment_key, render_session_excel, render_session_pdf, session_export_key
 
-    def process_table(m):
-        tbl = m.group(0)
-        tbl = ensure_thead(tbl)
-        tbl = add_colgroup_for_known_table(tbl)
-        return tbl
+# Cache ekspor & worker pool
+from export_cache import ExportCache, make_export_key
+from export_pool import ExportExecutor, JOB_CANCELLED, JOB_DONE, JOB_PENDING
 
-    shaped = re.sub(r"<table[^>]*>.*?</table>", process_table, raw_html, flags=re.I | re.S)
-    return shaped
+# Streaming respons
+from streaming import MarkdownStreamBuffer
 
+# Budget konteks percakapan
+from context_budget import budget_for_model, build_context, digest_assistant_message, estimate_tokens
 
-def create_pdf_with_xhtml2pdf(markdown_content, filename="alfa_threat_analysis.pdf"):
-    """
-    PDF generator dengan styling tabel yang sudah dibereskan:
-    - Header tabel diulang (thead)
-    - Lebar kolom diatur (colgroup)
-    - Wrap teks, border rapi, baris tidak terbelah
-    """
-    try:
-        html_string = markdown2.markdown(
-            markdown_content,
-            extras=["tables", "fenced-code-blocks", "code-friendly"]
-        )
-        html_string = _shape_tables_for_pdf(html_string)
-
-        full_html = f"""
-        <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    @page {{ margin: 1.3cm; }}
-                    body {{
-                        font-family: Helvetica, Arial, sans-serif;
-                        font-size: 10pt;
-                        line-height: 1.35;
-                    }}
-                    h1, h2, h3, h4 {{ margin: 8px 0 6px; font-weight: bold; }}
-                    p {{ margin: 4px 0; }}
-
-                    table {{
-                        border-collapse: collapse;
-                        width: 100%;
-                        table-layout: fixed;
-                        margin: 8px 0;
-                        page-break-inside: auto;
-                        -pdf-keep-in-frame: auto;
-                    }}
-                    thead {{ display: table-header-group; }}
-                    tr {{ page-break-inside: avoid; }}
-                    th, td {{
-                        border: 0.8pt solid #444;
-                        padding: 6px 6px;
-                        vertical-align: top;
-                        word-wrap: break-word;
-                        white-space: pre-wrap;
-                        font-size: 9pt;
-                    }}
-                    th {{
-                        background-color: #f0f0f0;
-                        font-weight: bold;
-                        text-align: center;
-                    }}
-                    /* Pusatkan kolom CIA/Av/Au/N jika ada */
-                    th:nth-child(3), th:nth-child(4), th:nth-child(5), th:nth-child(6), th:nth-child(7),
-                    td:nth-child(3), td:nth-child(4), td:nth-child(5), td:nth-child(6), td:nth-child(7) {{
-                        text-align: center;
-                        width: 4%;
-                    }}
-                    pre, code {{
-                        background-color: #f4f4f4;
-                        padding: 2px 4px;
-                        border: 1px solid #ddd;
-                        border-radius: 3px;
-                        font-family: 'Courier New', monospace;
-                        white-space: pre-wrap;
-                        word-wrap: break-word;
-                        font-size: 8pt;
-                    }}
-                </style>
-            </head>
-            <body>
-                {html_string}
-            </body>
-        </html>
-        """
-
-        result_file = BytesIO()
-        pisa_status = pisa.CreatePDF(
-            BytesIO(full_html.encode("UTF-8")),
-            dest=result_file,
-            encoding="UTF-8"
-        )
-        if pisa_status.err:
-            st.error(f"Gagal membuat PDF: {pisa_status.err}")
-            return ""
-
-        result_file.seek(0)
-        b64_pdf = base64.b64encode(result_file.read()).decode()
-        href = f'''
-        <a href="data:application/pdf;base64,{b64_pdf}"
-           download="{filename}"
-           style="display:inline-block; padding:8px 12px; background:#FF4B4B; color:#fff;
-                  border-radius:5px; text-decoration:none; font-weight:bold;">
-           💾 Unduh Analisis (PDF)
-        </a>
-        '''
-        return href
+# Analisis batch
+from batch_analysis import load_flows, merge_batch_results
 
-    except Exception as e:
-        st.error(f"Terjadi kesalahan saat membuat PDF: {e}")
-        return ""
+# Scheduler request Groq (rate limit, retry, fallback)
+from groq_scheduler import GroqScheduler, count_usage
+
+# Span waktu per tahap & counter token (panel admin)
+import perf
+
+# Ekstraksi teks file unggahan (PDF/gambar/OCR)
+from ingestion import IngestError, create_ocr_pool, ingest
+
+# Cache respons Groq (SQLite, opt-in)
+from response_cache import ResponseCache, response_key
+
+# Rekaman threat kolumnar & agregat DREAD/CWE
+from threat_records import concat_records, get_threat_records
+
+# Riwayat percakapan & baris threat (SQLite)
+from analysis_store import AnalysisStore
 
+# Indeks kemiripan analisis sebelumnya (pakai ulang / jadikan konteks sebelum memanggil Groq)
+from similarity_index import SimilarityIndex, context_prompt, find_similar
 
+# Analisis dokumen besar per potongan (map-reduce)
+from chunked_analysis import (
+    chunk_token_budget, merge_chunk_results, run_chunked_analysis, split_into_chunks
+)
+
+# Indeks referensi lokal CWE/OWASP/ASVS untuk validasi & pengayaan jawaban
+from reference_index import default_index, enrich_response
+
+# Model, system prompt, klien Groq & analisis flow (tanpa Streamlit, dipakai juga cli.py)
+from threat_analysis import MODEL_OPTIONS, analyze_flows, create_groq_client, system_prompt
+
+# =========================
+# 1) Konfigurasi Halaman
 # =========================
-# 3) Excel Utilities (super rapi)
+# Worker proses (spawn/forkserver) mengimpor ulang skrip ini sebagai __mp_main__;
+# halaman hanya dirender saat dijalankan oleh Streamlit.
+if __name__ == "__main__":
+    st.set_page_config(
+        page_title="Alfa Threat Model Expert Analysis",
+        page_icon="⚡️",
+        layout="centered"
+    )
+
 # =========================
-def _clean_sheet_name(name: str) -> str:
-    cleaned = re.sub(r'[:\\/\?\*\[\]]', ' ', name).strip()
-    return (cleaned[:31] or "Sheet") if cleaned else "Sheet"
-
-def _openpyxl_style_table(ws, df):
-    from openpyxl.utils import get_column_letter
-    from openpyxl.styles import Alignment, Font
-    from openpyxl.worksheet.table import Table, TableStyleInfo
-    from openpyxl.formatting.rule import ColorScaleRule
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-    if max_row < 1 or max_col < 1:
-        return
+# 2) Export Cache
+# =========================
+# Naikkan jika format/styling ekspor berubah agar entri lama (termasuk spill disk) tidak dipakai.
+EXPORT_SETTINGS_VERSION = 5
 
-    ref = f"A1:{get_column_letter(max_col)}{max_row}"
+def _get_setting(name: str, default=None):
+    """Ambil konfigurasi dari st.secrets, lalu environment, lalu default."""
     try:
-        t = Table(displayName=f"T_{ws.title.replace(' ', '_')}", ref=ref)
-        style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
-                               showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-        t.tableStyleInfo = style
-        ws.add_table(t)
+        if name in st.secrets:
+            return st.secrets[name]
     except Exception:
         pass
+    return os.environ.get(name, default)
+
+@st.cache_resource
+def get_export_cache() -> ExportCache:
+    """Satu cache per proses server, dipakai bersama oleh semua sesi & rerun."""
+    return ExportCache(
+        max_entries=int(_get_setting("EXPORT_CACHE_MAX_ENTRIES", 64)),
+        max_bytes=int(_get_setting("EXPORT_CACHE_MAX_MB", 64)) * 1024 * 1024,
+        spill_dir=_get_setting("EXPORT_CACHE_DIR") or None,
+    )
+
+def export_key(fmt: str, markdown_content: str) -> str:
+    return fragment_key(fmt, markdown_content, EXPORT_SETTINGS_VERSION)
+
+def cached_pdf_bytes(markdown_content: str):
+    return get_export_cache().get_or_create(
+        export_key("pdf", markdown_content), lambda: create_pdf_with_xhtml2pdf(markdown_content)
+    )
+
+def cached_excel_bytes(markdown_content: str):
+    return get_export_cache().get_or_create(
+        export_key("xlsx", markdown_content),
+        lambda: create_excel_from_markdown(markdown_content, "alfa_threat_analysis.xlsx")
+    )
+
+# Polling status job ekspor hanya me-rerun fragment ini, bukan seluruh halaman
+_fragment = getattr(st, "fragment", None)
+
+@st.cache_resource
+def get_export_executor():
+    """
+    Pool proses bersama untuk semua sesi di server ini.
+    EXPORT_POOL_WORKERS=0 (atau Streamlit tanpa st.fragment) → render sinkron.
+    """
+    workers = int(_get_setting("EXPORT_POOL_WORKERS", 2))
+    if workers <= 0 or _fragment is None:
+        return None
+    return ExportExecutor(
+        max_workers=workers,
+        default_timeout=float(_get_setting("EXPORT_JOB_TIMEOUT", 120)),
+    )
+
+def _export_job_status(job_id: int, label: str):
+    state, _ = get_export_executor().poll(job_id)
+    if state != JOB_PENDING:
+        st.rerun()
+    st.caption(f"⏳ Menyiapkan {label} di latar belakang...")
+    if st.button("Batal", key=f"cancel_export_{job_id}"):
+        get_export_executor().cancel(job_id)
+        st.rerun()
 
-    ws.freeze_panes = "A2"
-    ws.auto_filter.ref = ref
-
-    header_font = Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
-    for row in ws.iter_rows(min_row=2, max_row=max_row, max_col=max_col):
-        for cell in row:
-            cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-    for col_idx in range(1, max_col + 1):
-        col_letter = get_column_letter(col_idx)
-        max_len = 0
-        for cell in ws[col_letter]:
-            val = "" if cell.value is None else str(cell.value)
-            max_len = max(max_len, min(len(val), 80))
-        ws.column_dimensions[col_letter].width = min(max(12, max_len + 2), 60)
-
-    numeric_cols = []
-    for j, col in enumerate(df.columns, start=1):
-        series = pd.to_numeric(df[col], errors='coerce')
-        if series.notna().sum() >= max(1, len(series) // 2):
-            numeric_cols.append(j)
-    if numeric_cols:
-        for j in numeric_cols:
-            col_letter = get_column_letter(j)
-            rng = f"{col_letter}2:{col_letter}{max_row}"
-            try:
-                rule = ColorScaleRule(start_type="min", mid_type="percentile", end_type="max",
-                                      mid_value=50)
-                ws.conditional_formatting.add(rng, rule)
-            except Exception:
-                pass
+if _fragment is not None:
+    _export_job_status = _fragment(run_every=1.0)(_export_job_status)
 
-    try:
-        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-        ws.page_setup.fitToWidth = 1
-        ws.page_setup.fitToHeight = 0
-        ws.sheet_properties.pageSetUpPr.fitToPage = True
-        ws.print_title_rows = "1:1"
-        ws.page_margins.left = ws.page_margins.right = 0.4
-        ws.page_margins.top = ws.page_margins.bottom = 0.5
-    except Exception:
-        pass
+def _export_via_pool(executor, fmt: str, content: str, label: str):
+    """
+    Kirim render ke pool. Mengembalikan bytes jika sudah selesai; None jika masih
+    berjalan (status ditampilkan & di-poll) atau gagal/dibatalkan.
+    """
+    key = export_key(fmt, content)
+    job_id = executor.submit(fmt, content, key=key)
+    state, result = executor.poll(job_id)
+    if state == JOB_PENDING:
+        _export_job_status(job_id, label)
+        return None
+    executor.forget(job_id)
+    if state == JOB_DONE:
+        get_export_cache().put(key, result)
+        return result
+    st.session_state.export_requests.discard((fmt, make_export_key("msg", content)))
+    if state != JOB_CANCELLED:
+        st.error(f"Gagal membuat {label}: {result}")
+    return None
+
+@st.cache_resource
+def get_ingest_cache() -> ExportCache:
+    """Hasil ekstraksi file per hash isi, dipakai bersama semua sesi & rerun."""
+    return ExportCache(
+        max_entries=int(_get_setting("INGEST_CACHE_MAX_ENTRIES", 32)),
+        max_bytes=int(_get_setting("INGEST_CACHE_MAX_MB", 32)) * 1024 * 1024,
+        spill_dir=_get_setting("INGEST_CACHE_DIR") or None,
+    )
+
+@st.cache_resource
+def get_ocr_pool():
+    """Pool proses OCR bersama; OCR_POOL_WORKERS=0 → OCR di thread skrip."""
+    workers = int(_get_setting("OCR_POOL_WORKERS", 2))
+    if workers <= 0:
+        return None
+    return create_ocr_pool(workers)
 
-def _xlsxwriter_style_table(workbook, worksheet, df):
-    wrap = workbook.add_format({'text_wrap': True, 'valign': 'top'})
-    worksheet.set_column(0, len(df.columns) - 1, 12, wrap)
-    worksheet.freeze_panes(1, 0)
+def ingest_upload(uploaded_file):
+    """
+    Ekstrak teks file unggahan (cache per hash isi). Progres per halaman hanya
+    tampil saat file benar-benar diproses, bukan saat diambil dari cache.
+    """
+    progress = st.empty()
 
-    rows = len(df.index)
-    cols = len(df.columns)
+    def on_page(page):
+        label = "OCR" if page.ocr else "teks"
+        progress.caption(f"⏳ Membaca {uploaded_file.name}: halaman {page.number} ({label})")
 
     try:
-        worksheet.add_table(0, 0, rows, cols - 1, {
-            'columns': [{'header': str(h)} for h in df.columns],
-            'style': 'Table Style Medium 9',
-            'autofilter': True
-        })
-    except Exception:
-        pass
+        doc = ingest(
+            uploaded_file.getvalue(), uploaded_file.name, uploaded_file.type,
+            cache=get_ingest_cache(), executor=get_ocr_pool(),
+            lang=_get_setting("OCR_LANG", "eng"), on_page=on_page,
+        )
+    except IngestError as e:
+        progress.empty()
+        st.error(str(e))
+        return None
+    except Exception as e:
+        progress.empty()
+        st.error(f"Gagal membaca file '{uploaded_file.name}': {e}")
+        return None
+    progress.empty()
+    return doc
 
-    for i, col in enumerate(df.columns):
-        col_values = [str(col)] + ["" if pd.isna(x) else str(x) for x in df[col].tolist()]
-        max_len = min(max(len(x) for x in col_values), 80)
-        worksheet.set_column(i, i, min(max(12, max_len + 2), 60), wrap)
+def run_document_analysis(client, ingested, question: str, model: str, system_prompt: str,
+                          context_budget: int, fallback_models=()) -> str:
+    """
+    Dokumen melebihi konteks: pecah per potongan, analisis bersamaan, lalu gabungkan
+    menjadi satu laporan (tabel threat terdeduplikasi + ringkasan DREAD).
+    Mengembalikan None (dengan st.error) jika semua potongan gagal.
+    """
+    max_tokens = chunk_token_budget(context_budget, system_prompt, question)
+    chunks = split_into_chunks(ingested.text, max_tokens, overlap_tokens=max_tokens // 10)
+    progress = st.progress(0.0, text=f"Menganalisis {len(chunks)} bagian dokumen...")
+    results = []
+    started = time.perf_counter()
+    for result in run_chunked_analysis(client, chunks, model, system_prompt, ingested.name, question,
+                                       scheduler=get_scheduler(), fallback_models=fallback_models):
+        results.append(result)
+        status = "✅" if result.ok else "❌"
+        progress.progress(len(results) / len(chunks),
+                          text=f"{len(results)}/{len(chunks)} bagian selesai · {status} Bagian {result.index + 1}")
+    progress.empty()
+    st.caption(f"{len(chunks)} bagian dianalisis dalam {time.perf_counter() - started:.1f}s")
+    if not any(r.ok for r in results):
+        st.error(f"Semua {len(chunks)} bagian dokumen gagal dianalisis: {results[-1].error if results else '-'}")
+        return None
+    return merge_chunk_results(results, ingested.name, question)
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """File SQLite bersama; bertahan lintas logout, tab, dan restart server."""
+    return ResponseCache(
+        _get_setting("RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3")),
+        ttl_seconds=float(_get_setting("RESPONSE_CACHE_TTL_HOURS", 168)) * 3600,
+        max_entries=int(_get_setting("RESPONSE_CACHE_MAX_ENTRIES", 500)),
+        max_bytes=int(_get_setting("RESPONSE_CACHE_MAX_MB", 50)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_analysis_store() -> AnalysisStore:
+    """Riwayat semua user di satu file SQLite; session_state hanya menyimpan id percakapan."""
+    return AnalysisStore(_get_setting("ANALYSIS_DB_PATH", os.path.join(".cache", "analysis.sqlite3")))
+
+@st.cache_resource
+def get_similarity_index() -> SimilarityIndex:
+    """Indeks kemiripan per proses; jawaban baru ditambahkan inkremental dari AnalysisStore saat mencari."""
+    return SimilarityIndex()
+
+# Pesan yang dimuat per halaman riwayat, dan yang dipakai untuk menyusun konteks
+HISTORY_PAGE_SIZE = 10
+CONTEXT_HISTORY_MESSAGES = 20
+
+def save_message(message: dict, model: str = None) -> dict:
+    """Simpan pesan ke percakapan aktif (dibuat saat pesan pertama); kembalikan pesan + id/seq."""
+    store = get_analysis_store()
+    if not st.session_state.get("conversation_id"):
+        st.session_state.conversation_id = store.create_conversation(st.session_state.get("username", ""), model)
+    return store.append_message(st.session_state.conversation_id, message,
+                                username=st.session_state.get("username", ""), model=model)
+
+def _discard_unanswered(user_message: dict):
+    """
+    Hapus pertanyaan yang gagal dijawab (jika belum ada jawaban setelahnya); percakapan
+    yang jadi kosong (pertanyaan pertama gagal) ikut dihapus agar tidak muncul di riwayat.
+    """
+    store = get_analysis_store()
+    conversation_id = st.session_state.conversation_id
+    last = store.load_messages(conversation_id, limit=1)
+    if last and last[0]["id"] == user_message["id"]:
+        store.delete_message(user_message["id"])
+    if not store.count_messages(conversation_id):
+        store.delete_conversation(conversation_id)
+        st.session_state.conversation_id = None
+
+def conversation_records(store, conversation_id, window: list):
+    """ThreatRecords seluruh percakapan (bukan hanya halaman riwayat yang tampil)."""
+    if window and window[0]["seq"] == 0:
+        contents = [(m["seq"], m["content"]) for m in window if m["role"] == "assistant"]
+    else:
+        contents = store.load_contents(conversation_id) if conversation_id else []
+    return concat_records([get_threat_records(content).with_source(seq) for seq, content in contents])
+
+def render_conversation_picker():
+    """Pilih percakapan tersimpan (terbaru dulu) atau mulai percakapan baru."""
+    store = get_analysis_store()
+    username = st.session_state.get("username", "")
+    if "conversation_id" not in st.session_state:
+        st.session_state.conversation_id = store.latest_conversation(username)
+
+    st.subheader("Percakapan")
+    conversations = store.list_conversations(username, limit=20)
+    options = [c["id"] for c in conversations]
+    current = st.session_state.conversation_id
+    if current not in options:
+        options.insert(0, current)
+    titles = {c["id"]: c["title"] or f"Percakapan #{c['id']}" for c in conversations}
+    selected = st.selectbox(
+        "Riwayat",
+        options,
+        index=options.index(current),
+        format_func=lambda cid: titles.get(cid, "Percakapan baru") if cid else "Percakapan baru",
+    )
+    if selected != current:
+        st.session_state.conversation_id = selected
+        st.session_state.history_limit = HISTORY_PAGE_SIZE
+        st.rerun()
+    if st.button("➕ Percakapan baru"):
+        st.session_state.conversation_id = None
+        st.session_state.history_limit = HISTORY_PAGE_SIZE
+        st.rerun()
+
+def render_threat_search(model_option: str):
+    """Cari baris threat dari analisis sebelumnya (per CWE / model) lewat index SQLite."""
+    with st.expander("🔎 Cari threat tersimpan"):
+        cwe = st.text_input("CWE", placeholder="mis. CWE-89", key="threat_search_cwe")
+        only_model = st.checkbox(f"Hanya model {model_option}", key="threat_search_model")
+        rows = get_analysis_store().query_threats(
+            username=st.session_state.get("username", ""),
+            model=model_option if only_model else None,
+            cwe=cwe.strip() or None,
+            limit=50,
+        )
+        if rows:
+            st.dataframe(
+                [{"Flow": r["flow"], "Threat": r["threat"], "CWE": r["cwes"] or "",
+                  "DREAD": r["dread"], "Model": r["model"]} for r in rows],
+                width="stretch",
+            )
+        else:
+            st.caption("Belum ada threat yang cocok.")
+
+def render_reference_lookup():
+    """Cari CWE/OWASP/ASVS di indeks lokal: awalan id ('CWE-7', 'A0', 'V5') atau kata kunci."""
+    with st.expander("📚 Referensi CWE/OWASP/ASVS"):
+        query = st.text_input("ID atau kata kunci", placeholder="mis. CWE-79, A03, V2.1, idor",
+                              key="reference_lookup").strip()
+        if not query:
+            return
+        index = default_index()
+        entries = index.prefix(query, limit=15) or [e for e, _score in index.search(query, limit=10)]
+        if entries:
+            st.dataframe(
+                [{"ID": e.id, "Judul": e.title, "Terkait": ", ".join(e.refs)} for e in entries],
+                width="stretch",
+            )
+        else:
+            st.caption("Tidak ada referensi yang cocok.")
 
-    for i, col in enumerate(df.columns):
-        series = pd.to_numeric(df[col], errors='coerce')
-        if series.notna().sum() >= max(1, len(series)//2):
-            worksheet.conditional_format(1, i, rows, i, {'type': '3_color_scale'})
+def render_cache_marker(idx: int, message: dict):
+    """Penanda jawaban dari cache + tombol untuk menghapus entri tersebut."""
+    key = message.get("cache_key")
+    if not key:
+        return
+    if message.get("cached"):
+        st.caption(f"⚡ Disajikan dari cache ({message.get('cache_ms', 0):.1f} ms)")
+    if st.button("🗑️ Hapus dari cache", key=f"invalidate_cache_{idx}",
+                 help="Pertanyaan yang sama berikutnya akan dianalisis ulang oleh model."):
+        get_response_cache().invalidate(key)
+        if message.get("id"):
+            get_analysis_store().update_message_meta(message["id"], cache_key=None, cached=False)
+        st.rerun()
 
-    worksheet.set_landscape()
-    worksheet.fit_to_pages(1, 0)
-    worksheet.set_margins(left=0.4, right=0.4, top=0.5, bottom=0.5)
+def render_reuse_marker(message: dict):
+    """Penanda jawaban yang dipakai ulang dari analisis serupa sebelumnya."""
+    if message.get("reused_from"):
+        st.caption(f"♻️ Memakai ulang analisis sebelumnya (kemiripan {message.get('similarity', 0):.2f}) "
+                   "· tanpa panggilan Groq")
+
+# Analisis serupa: pertanyaan ditahan sampai user memilih pakai ulang / jadikan konteks / analisis baru
+SIMILAR_LIMIT = 3
+
+def _choose_similar(action: str, match: dict = None):
+    st.session_state.similar_choice = {"action": action, "match": match}
+
+def _render_similar_panel(pending: dict):
+    store = get_analysis_store()
+    with st.chat_message("user"):
+        st.markdown(pending["prompt"])
+    with st.chat_message("assistant"):
+        st.info("Ditemukan analisis serupa sebelumnya. Pakai ulang tanpa memanggil Groq, kirim ringkasannya "
+                "sebagai konteks, atau tetap analisis baru.")
+        for match in pending["matches"]:
+            prior = store.get_message(match["id"])
+            if prior is None:
+                continue
+            st.markdown(f"**{match['prompt']}**")
+            created = time.strftime("%d-%m-%Y %H:%M", time.localtime(match["created"])) if match["created"] else "-"
+            st.caption(f"Kemiripan {match['score']:.2f} · {match['threat_count']} threat · "
+                       f"{match['model'] or '-'} · {created}")
+            with st.expander("Pratinjau ringkasan"):
+                st.text(digest_assistant_message(prior["content"]))
+            col_reuse, col_context = st.columns(2)
+            col_reuse.button("♻️ Pakai ulang", key=f"similar_reuse_{match['id']}",
+                             on_click=_choose_similar, args=("reuse", match))
+            col_context.button("🧩 Jadikan konteks", key=f"similar_context_{match['id']}",
+                               on_click=_choose_similar, args=("context", match))
+        st.button("🚀 Analisis baru", key="similar_new", on_click=_choose_similar, args=("new",))
+
+def resolve_similar_prompt(prompt, enabled: bool):
+    """
+    Sebelum memanggil Groq: cari analisis serupa milik user. Jika ada, pertanyaan ditahan
+    dan pilihan ditampilkan; setelah user memilih, kembalikan (prompt, pilihan).
+    Tanpa kecocokan (atau dinonaktifkan) → (prompt, None) langsung.
+    """
+    conversation_id = st.session_state.get("conversation_id")
+    if prompt:
+        st.session_state.pop("similar_choice", None)
+        matches = []
+        if enabled:
+            with perf.span("similar.search"):
+                matches = find_similar(
+                    get_similarity_index(), get_analysis_store(), prompt,
+                    username=st.session_state.get("username", ""),
+                    limit=SIMILAR_LIMIT, min_score=float(_get_setting("SIMILAR_MIN_SCORE", 0.5)),
+                )
+        if not matches:
+            st.session_state.pop("similar_pending", None)
+            return prompt, None
+        st.session_state.similar_pending = {"prompt": prompt, "matches": matches, "conversation_id": conversation_id}
+
+    pending = st.session_state.get("similar_pending")
+    if pending is None or pending["conversation_id"] != conversation_id:
+        st.session_state.pop("similar_pending", None)
+        return None, None
+    choice = st.session_state.pop("similar_choice", None)
+    if choice is None:
+        _render_similar_panel(pending)
+        return None, None
+    del st.session_state["similar_pending"]
+    if choice["action"] == "new":
+        return pending["prompt"], None
+    prior = get_analysis_store().get_message(choice["match"]["id"])
+    if prior is None:
+        st.warning("Analisis sebelumnya sudah dihapus; pertanyaan dianalisis ulang.")
+        return pending["prompt"], None
+    return pending["prompt"], dict(choice, content=prior["content"])
+
+def render_report(markdown_content: str):
+    """Tampilkan pesan asisten dari model dokumen yang sama dengan eksportir."""
+    doc = get_report_document(markdown_content)
+    for kind, part in doc.segments():
+        st.markdown(part if kind == "text" else part.source)
+
+# Unduhan per pesan
+EXPORT_MODE_LAZY = "Sesuai permintaan"
+EXPORT_MODE_EAGER = "Langsung"
+PDF_MIME = "application/pdf"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _export_slot(fmt: str, idx: int, content: str, lazy: bool):
+    """
+    Satu format ekspor untuk satu pesan. Pada mode lazy hanya tombol 'Siapkan'
+    yang ditampilkan; render baru terjadi setelah format itu diminta.
+    """
+    requested = st.session_state.setdefault("export_requests", set())
+    req_key = (fmt, make_export_key("msg", content))
+    label = "PDF" if fmt == "pdf" else "Excel"
+
+    if lazy and req_key not in requested:
+        if not st.button(f"⚙️ Siapkan {label}", key=f"prepare_{fmt}_{idx}"):
+            return
+        requested.add(req_key)
+
+    data = get_export_cache().get(export_key(fmt, content))
+    if data is None:
+        executor = get_export_executor()
+        if executor is not None:
+            data = _export_via_pool(executor, fmt, content, label)
+        else:
+            with st.spinner(f"Menyiapkan {label}..."):
+                data = cached_pdf_bytes(content) if fmt == "pdf" else cached_excel_bytes(content)
+    if data:
+        st.download_button(
+            "💾 Unduh Analisis (PDF)" if fmt == "pdf" else "📥 Unduh Analisis (Excel)",
+            data=data,
+            file_name=f"analisis_{idx}.pdf" if fmt == "pdf" else f"alfa_threat_analysis_{idx}.xlsx",
+            mime=PDF_MIME if fmt == "pdf" else XLSX_MIME,
+            key=f"{'pdf' if fmt == 'pdf' else 'excel'}_download_{idx}"
+        )
 
-def _parse_markdown_tables_simple(md_text):
+def render_export_controls(idx: int, content: str, export_mode: str):
+    """
+    Kontrol unduhan PDF/Excel untuk satu pesan asisten:
+    - 'Langsung'          → kedua file dibuat (lewat cache) dan langsung bisa diunduh
+    - 'Sesuai permintaan' → render hanya untuk pesan & format yang diminta
+    Bytes dikirim lewat st.download_button (tanpa data URI base64 di halaman).
+    Key widget hanya bergantung pada indeks pesan, sehingga klik pada pesan terbaru
+    tetap terbaca saat pesan itu dirender ulang sebagai riwayat.
     """
-    Fallback sederhana: parse tabel Markdown (| col | ...).
-    Kembalikan list DataFrame.
+    lazy = export_mode == EXPORT_MODE_LAZY
+    col_pdf, col_xlsx = st.columns(2)
+    with col_pdf:
+        _export_slot("pdf", idx, content, lazy)
+    with col_xlsx:
+        _export_slot("xlsx", idx, content, lazy)
+
+def render_session_export():
     """
-    lines = md_text.strip().splitlines()
-    tables = []
-    i = 0
-    while i < len(lines):
-        if '|' in lines[i]:
-            if i + 1 < len(lines) and re.search(r'^\s*\|?\s*:?-{3,}.*\|.*-+', lines[i+1]):
-                start = i
-                j = i
-                while j < len(lines) and '|' in lines[j] and not lines[j].strip().startswith('```'):
-                    j += 1
-                block = lines[start:j]
-
-                def split_row(row):
-                    row = row.strip()
-                    if row.startswith('|'): row = row[1:]
-                    if row.endswith('|'): row = row[:-1]
-                    return [c.strip() for c in row.split('|')]
-
-                if len(block) >= 2:
-                    header = split_row(block[0])
-                    data_rows = [split_row(r) for r in block[2:]]
-                    max_cols = len(header)
-                    norm = []
-                    for r in data_rows:
-                        if len(r) < max_cols:
-                            r = r + ['']*(max_cols-len(r))
-                        elif len(r) > max_cols:
-                            r = r[:max_cols]
-                        norm.append(r)
+    Unduh seluruh percakapan aktif sebagai satu PDF (daftar isi + outline) dan satu
+    workbook. Fragmen PDF per jawaban diambil dari cache ekspor per pesan, jadi
+    setelah jawaban baru hanya jawaban itu yang di-render.
+    Render hanya terjadi pada rerun klik 'Siapkan'; rerun berikutnya cukup mengambil
+    bytes dari cache ekspor selama percakapan belum bertambah pesan.
+    """
+    conversation_id = st.session_state.get("conversation_id")
+    with st.expander("📑 Laporan sesi"):
+        if not conversation_id:
+            st.caption("Belum ada percakapan untuk dilaporkan.")
+            return
+        store = get_analysis_store()
+        prepared = st.session_state.setdefault("session_exports", {})
+        count = store.count_messages(conversation_id)
+        col_pdf, col_xlsx = st.columns(2)
+        for fmt, col in (("pdf", col_pdf), ("xlsx", col_xlsx)):
+            label = "PDF" if fmt == "pdf" else "Excel"
+            with col:
+                data = None
+                key, prepared_count = prepared.get((fmt, conversation_id), (None, None))
+                if key is not None and prepared_count == count:
+                    data = get_export_cache().get(key)
+                if data is None:
+                    prepared.pop((fmt, conversation_id), None)
+                    if not st.button(f"⚙️ Siapkan {label}", key=f"prepare_session_{fmt}"):
+                        continue
+                    messages = store.load_messages(conversation_id, limit=count)
                     try:
-                        df = pd.DataFrame(norm, columns=header)
-                        tables.append(df)
-                    except Exception:
-                        pass
-                i = j
-                continue
-        i += 1
-    return tables
+                        with st.spinner(f"Menyiapkan {label} sesi..."):
+                            if fmt == "pdf":
+                                data = render_session_pdf(messages, get_export_cache(), EXPORT_SETTINGS_VERSION)
+                            else:
+                                data = render_session_excel(messages, get_export_cache(), EXPORT_SETTINGS_VERSION)
+                    except ExportError as e:
+                        st.error(f"Gagal membuat {label} sesi: {e}")
+                        continue
+                    if not data:
+                        st.caption("Belum ada jawaban di percakapan ini.")
+                        continue
+                    prepared[(fmt, conversation_id)] = (
+                        session_export_key(fmt, messages, EXPORT_SETTINGS_VERSION), count
+                    )
+                st.download_button(
+                    f"💾 Unduh {label}",
+                    data=data,
+                    file_name=f"laporan_sesi_{conversation_id}.{fmt}",
+                    mime=PDF_MIME if fmt == "pdf" else XLSX_MIME,
+                    key=f"session_download_{fmt}",
+                )
+
+@st.cache_resource
+def get_scheduler() -> GroqScheduler:
+    """Antrean & rate limiter bersama untuk semua sesi di proses server ini."""
+    return GroqScheduler(
+        max_concurrent=int(_get_setting("GROQ_MAX_CONCURRENT", 4)),
+        max_retries=int(_get_setting("GROQ_MAX_RETRIES", 3)),
+    )
 
-def create_excel_from_markdown(markdown_content: str, filename: str = "alfa_threat_analysis.xlsx"):
+@st.cache_resource(max_entries=16)
+def get_groq_client(api_key: str, base_url: str = None):
     """
-    Mengubah output markdown asisten menjadi file Excel yang rapi:
-    - Tiap tabel → sheet sebagai Excel Table (banded rows, filter)
-    - Tidak ada tabel → sheet 'Output' berisi teks (1 kolom)
-    - Freeze header, wrap text, auto-fit kolom, print setup, conditional formatting numerik
+    Satu klien Groq per API key (dan base URL) per proses, dipakai ulang lintas
+    rerun & sesi: pool koneksi HTTP (TLS, keep-alive) tidak dibangun ulang di
+    setiap rerun. Sesi dengan API key berbeda mendapat klien sendiri.
     """
-    try:
-        html_string = markdown2.markdown(
-            markdown_content,
-            extras=["tables", "fenced-code-blocks", "code-friendly"]
-        )
-        tables = []
-        try:
-            tables = pd.read_html(StringIO(html_string))
-        except Exception:
-            tables = []
+    return create_groq_client(
+        api_key, base_url,
+        max_concurrent=int(_get_setting("GROQ_MAX_CONCURRENT", 4)),
+        keepalive=float(_get_setting("GROQ_KEEPALIVE_SECONDS", 60)),
+    )
+
+def fallback_models_for(model: str, enabled: bool):
+    return [m for m in MODEL_OPTIONS if m != model] if enabled else []
+
+def stream_chat_completion(client, messages, model: str, placeholder, fallback_models=()) -> str:
+    """
+    Panggil Groq dengan stream=True dan tampilkan token ke `placeholder`
+    secara bertahap. Render ulang dibatasi oleh MarkdownStreamBuffer (tabel hanya
+    dirender saat satu baris selesai). Mengembalikan teks lengkap.
+    """
+    buffer = MarkdownStreamBuffer()
+    started = time.perf_counter()
+    first_token_at = None
+
+    stream, model_used = get_scheduler().create(
+        client, messages, model, fallback_models=fallback_models, stream=True
+    )
+    usage = None
+    for chunk in stream:
+        # Groq mengirim usage pada chunk terakhir (x_groq.usage)
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+            usage = x_groq.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        if buffer.feed(delta):
+            placeholder.markdown(buffer.renderable() + " ▌")
+
+    response_text = buffer.text
+    placeholder.markdown(response_text)
+    if first_token_at is not None:
+        perf.record("groq.ttft", first_token_at - started)
+    perf.record("groq.stream", time.perf_counter() - started)
+    count_usage(usage)
+    st.session_state.last_stream_stats = {
+        "ttft": (first_token_at - started) if first_token_at else None,
+        "total": time.perf_counter() - started,
+        "renders": buffer.renders,
+        "usage": usage,
+        "model": model_used,
+    }
+    return response_text
+
+def _usage_dict(usage, context_report: dict) -> dict:
+    """Gabungkan estimasi token lokal dengan usage aktual dari respons Groq."""
+    return {
+        "prompt_est": context_report["prompt_tokens_est"],
+        "budget": context_report["budget"],
+        "digested": context_report["digested"],
+        "dropped": context_report["dropped"],
+        "prompt": getattr(usage, "prompt_tokens", None),
+        "completion": getattr(usage, "completion_tokens", None),
+    }
 
-        if not tables:
-            tables = _parse_markdown_tables_simple(markdown_content)
+def render_usage_caption(usage: dict):
+    if not usage:
+        return
+    text = f"Konteks ~{usage['prompt_est']} token (budget {usage['budget']})"
+    if usage.get("digested") or usage.get("dropped"):
+        text += f" · {usage['digested']} diringkas, {usage['dropped']} dibuang"
+    if usage.get("prompt") is not None:
+        text += f" · Groq: {usage['prompt']} prompt / {usage['completion']} completion"
+    st.caption(text)
+
+def render_perf_panel():
+    """
+    Panel admin: p50/p95 per tahap (Groq, parse markdown, markdown2, PDF, Excel) dan
+    counter token dari perf. Hanya untuk user di PERF_ADMIN_USERS (default 'admin').
+    """
+    admins = {u.strip() for u in str(_get_setting("PERF_ADMIN_USERS", "admin")).split(",")}
+    if st.session_state.get("username", "") not in admins:
+        return
+    recorder = perf.RECORDER
+    with st.expander("⏱️ Performa (admin)"):
+        # Flag milik proses, bukan sesi: hanya diubah saat admin mengklik
+        st.checkbox(
+            "Aktifkan instrumentasi", value=recorder.enabled,
+            on_change=lambda: setattr(recorder, "enabled", not recorder.enabled),
+            help="Berlaku untuk seluruh proses server. Saat mati, span tidak mengukur apa pun."
+        )
+        snap = recorder.snapshot()
+        if snap["stages"]:
+            st.dataframe(
+                [{"Tahap": stage, "n": s["count"], "p50 (ms)": round(s["p50"] * 1000, 1),
+                  "p95 (ms)": round(s["p95"] * 1000, 1), "Maks (ms)": round(s["max"] * 1000, 1),
+                  "Total (s)": round(s["total"], 2)} for stage, s in snap["stages"].items()],
+                width="stretch",
+            )
+        else:
+            st.caption("Belum ada tahap yang terukur.")
+        if snap["values"]:
+            st.dataframe(
+                [{"Nilai": name, "n": v["count"], "Terakhir": v["last"], "p50": v["p50"], "p95": v["p95"],
+                  "Maks": v["max"]} for name, v in snap["values"].items()],
+                width="stretch",
+            )
+            st.caption("Ukuran & puncak memori dalam byte; puncak memori diukur bila EXPORT_TRACE_MEMORY=1.")
+        if snap["counters"]:
+            st.caption(" · ".join(f"{name}: {value}" for name, value in sorted(snap["counters"].items())))
+
+        col_json, col_prom = st.columns(2)
+        with col_json:
+            st.download_button("JSON", data=recorder.to_json(), file_name="perf_report.json",
+                               mime="application/json", key="perf_download_json")
+        with col_prom:
+            st.download_button("Prometheus", data=recorder.to_prometheus(), file_name="perf_report.prom",
+                               mime="text/plain", key="perf_download_prom")
+        path = _get_setting("PERF_REPORT_PATH", "perf_report.json")
+        if st.button("💾 Tulis ke file lokal", key="perf_write_report",
+                     help=f"{path} dan {os.path.splitext(path)[0]}.prom"):
+            try:
+                recorder.write_report(path)
+                recorder.write_report(os.path.splitext(path)[0] + ".prom")
+                st.success(f"Laporan ditulis ke {path}.")
+            except OSError as e:
+                st.error(f"Gagal menulis laporan: {e}")
+        if st.button("Reset", key="perf_reset"):
+            recorder.reset()
+            st.rerun()
 
-        only_text_mode = False
-        if not tables:
-            only_text_mode = True
-            tables = [pd.DataFrame({"Output": [markdown_content]})]
+def render_risk_summary(records, title: str = "📊 Ringkasan risiko"):
+    """Agregat dari ThreatRecords: risiko per flow, top-N DREAD, jumlah threat per CWE."""
+    if not len(records):
+        return
+    with st.expander(f"{title} · {len(records)} threat"):
+        st.markdown("**Risiko per flow**")
+        st.dataframe(
+            [{"Flow": r["flow"], "Threat": r["threats"], "DREAD maks": r["dread_max"],
+              "DREAD rata-rata": r["dread_mean"], "C/I/Au/Av/N": r["ciaan"]} for r in records.flow_risk()],
+            width="stretch",
+        )
+        top = records.top_by_dread(10)
+        if top:
+            rows = records.rows()
+            st.markdown("**Top DREAD**")
+            st.dataframe(
+                [{"Threat": rows[i]["threat"], "Flow": rows[i]["flow"], "DREAD": rows[i]["dread"],
+                  "CWE": ", ".join(rows[i]["cwes"])} for i in top],
+                width="stretch",
+            )
+        counts = records.cwe_counts(top=15)
+        if counts:
+            st.markdown("**Threat per CWE**")
+            st.dataframe([{"CWE": c, "Jumlah": n} for c, n in counts], width="stretch")
+
+def render_batch_page(client, model: str, system_prompt: str, export_mode: str, fallback_models=(),
+                      validate_refs: bool = False):
+    """
+    Mode batch: unggah CSV/XLSX berisi banyak flow, analisis konkuren ke Groq,
+    progres ditampilkan per flow selesai, lalu hasil digabung ke satu laporan.
+    """
+    st.subheader("Analisis Batch")
+    st.write("Unggah CSV/XLSX berisi deskripsi flow (satu flow per baris, kolom 'flow' atau kolom pertama).")
 
-        output = BytesIO()
+    flows_file = st.file_uploader("File daftar flow", type=["csv", "xlsx"], key="batch_file")
+    col_conc, col_retry = st.columns(2)
+    concurrency = col_conc.slider("Konkurensi", 1, 16, 4, help="Jumlah request ke Groq yang berjalan bersamaan.")
+    retries = col_retry.number_input("Retry per flow", 0, 5, 2)
 
-        engine = None
+    flows = []
+    if flows_file is not None:
         try:
-            import openpyxl  # noqa
-            engine = "openpyxl"
-        except Exception:
-            try:
-                import xlsxwriter  # noqa
-                engine = "xlsxwriter"
-            except Exception:
-                engine = None
-
-        if not engine:
-            st.error("Tidak ditemukan engine Excel (openpyxl/xlsxwriter). Tambahkan salah satunya ke environment.")
-            return None
-
-        if engine == "openpyxl":
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                for idx, df in enumerate(tables, start=1):
-                    df = df.applymap(lambda x: str(x).strip() if pd.notna(x) else x)
-                    sheet_name = "Output" if (only_text_mode and idx == 1) else f"Table{idx}"
-                    sheet_name = _clean_sheet_name(sheet_name)
-                    df.to_excel(writer, index=False, sheet_name=sheet_name)
-                    ws = writer.sheets[sheet_name]
-                    _openpyxl_style_table(ws, df)
-        else:
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                for idx, df in enumerate(tables, start=1):
-                    df = df.applymap(lambda x: str(x).strip() if pd.notna(x) else x)
-                    sheet_name = "Output" if (only_text_mode and idx == 1) else f"Table{idx}"
-                    sheet_name = _clean_sheet_name(sheet_name)
-                    df.to_excel(writer, index=False, sheet_name=sheet_name)
-                    ws = writer.sheets[sheet_name]
-                    _xlsxwriter_style_table(writer.book, ws, df)
-
-        output.seek(0)
-        return output.read()
-    except Exception as e:
-        st.error(f"Gagal membuat Excel: {e}")
-        return None
+            flows = load_flows(flows_file.getvalue(), flows_file.name)
+        except Exception as e:
+            st.error(f"Gagal membaca file flow: {e}")
+        st.caption(f"{len(flows)} flow ditemukan.")
+
+    if flows and st.button("🚀 Jalankan analisis batch", disabled=client is None):
+        progress = st.progress(0.0, text="Memulai...")
+        results = []
+        started = time.perf_counter()
+        for result in analyze_flows(client, flows, model, system_prompt, scheduler=get_scheduler(),
+                                    concurrency=concurrency, retries=int(retries),
+                                    fallback_models=fallback_models, validate_refs=validate_refs):
+            results.append(result)
+            done = len(results)
+            status = "✅" if result.ok else "❌"
+            progress.progress(done / len(flows), text=f"{done}/{len(flows)} selesai · {status} Flow {result.index + 1}")
+        elapsed = time.perf_counter() - started
+        st.session_state.batch_results = results
+        st.session_state.batch_report = merge_batch_results(results)
+        st.session_state.batch_stats = {
+            "flows": len(flows),
+            "failed": sum(1 for r in results if not r.ok),
+            "elapsed": elapsed,
+        }
+
+    if st.session_state.get("batch_report"):
+        stats = st.session_state.batch_stats
+        rate = stats["flows"] / stats["elapsed"] * 60 if stats["elapsed"] else 0
+        st.success(
+            f"{stats['flows'] - stats['failed']}/{stats['flows']} flow berhasil dalam "
+            f"{stats['elapsed']:.1f} detik ({rate:.1f} flow/menit)."
+        )
+        for result in sorted(st.session_state.batch_results, key=lambda r: r.index):
+            label = f"{'✅' if result.ok else '❌'} Flow {result.index + 1} · {result.elapsed:.1f}s"
+            with st.expander(label):
+                st.caption(result.flow)
+                if result.ok:
+                    render_report(result.response)
+                else:
+                    st.error(result.error)
+        render_risk_summary(concat_records([
+            get_threat_records(r.response).with_source(r.index) for r in st.session_state.batch_results if r.ok
+        ]))
+        st.markdown("**Laporan gabungan**")
+        render_export_controls("batch", st.session_state.batch_report, export_mode)
 
 # =========================
-# 4) Main App
+# 3) Main App
 # =========================
 def main_app():
     st.session_state.last_activity = time.time()
@@ -426,34 +791,16 @@ def main_app():
     st.write("Deskripsikan Flow aplikasi maka AlfaThreat akan menganalisa-nya dengan mudah dan akurat.")
     st.markdown("---")
 
-    SYSTEM_PROMPT_CONTENT = """
-    Anda adalah pakar keamanan siber dengan pengalaman 30 tahun, yang mahir dalam mengidentifikasi dan menganalisis potensi ancaman keamanan siber berdasarkan ASVS dan CWE. Jika ada pertanyaan di luar cyber security jangan berikan jawaban.
-    Peran Anda adalah membuat kajian/report dalam tabel yang rapi serta up to date dengan perkembangan cyber security atas poin berikut:
-    1. Gambarkan threat modelling diagram DFD menggunakan arrow.
-
-    2. Berikan dalam tabel dan mapping nomor CWE-nya berdasarkan threat.
-
-    3. Berikan list kerentanan dalam satu tabel pada Confidentiality, Integrity, Authentication, Availability, Non-repudiation atas threat tersebut termasuk dalam threat apa (contoh: SQLi, XSS, IDOR, DDoS). Lalu pada kolom sampingnya berikan Scenario serangan, lalu pada kolom sampingnya berikan rekomendasi keamanannya (minimal 5 rekomendasi).
-       Format tabel contoh:
-       | FLOW PROSES            | THREAT                    | C | I | Au | Av | N | SCENARIO                                                     | REKOMENDASI PENGAMANAN             |
-       ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-       | contoh flow: user login | contoh threat: injection A06:01 | v |   | v  |   | v | fraudster injeksi form login                                 | implementasikan parameterized queries |
-
-    4. Berikan penilaian DREAD (INFORMATIONAL=1, LOW=2, MEDIUM=3, HIGH=4, CRITICAL=5). Beri nilai masing-masing komponen dalam satu kolom, contoh: Discoverability=3, Reproducibility=2, dst. Rata-rata dari 5 komponen adalah skornya.
-
-    5. Gunakan standar industri (OWASP, ASVS, NIST, Gartner) untuk analisis teknis.
-
-    6. Batasi jawaban hanya dalam lingkup keamanan siber.
-
-    7. Semua output Bahasa Indonesia dan jangan buang makna serapan Inggrisnya.
-    """
-
     with st.sidebar:
         st.subheader(f"Selamat datang, {st.session_state.get('username','')}!")
 
         if 'GROQ_API_KEY' not in st.session_state:
             st.session_state.GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", "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").strip()
 
+        app_mode = st.radio("Mode", ("Chat", "Batch"), horizontal=True)
+
+        render_conversation_picker()
+
         st.subheader("Unggah File")
         st.markdown("Unggah file untuk dianalisis.")
         uploaded_file = st.file_uploader(
@@ -464,11 +811,100 @@ def main_app():
         st.subheader("Model")
         model_option = st.selectbox(
             'Pilih model yang akan digunakan:',
-            ('llama-3.3-70b-versatile', 'qwen/qwen3-32b', 'deepseek-r1-distill-llama-70b')
+            MODEL_OPTIONS
+        )
+        use_fallback = st.checkbox(
+            "Fallback ke model lain saat dibatasi",
+            value=True,
+            help="Jika model terpilih terus membalas 429/timeout, coba model lain di daftar."
+        )
+        fallback_models = fallback_models_for(model_option, use_fallback)
+
+        use_response_cache = st.checkbox(
+            "Cache respons",
+            value=False,
+            help="Pertanyaan identik (model, konteks, dan prompt sama) dijawab dari cache lokal tanpa memanggil Groq."
+        )
+
+        check_similar = st.checkbox(
+            "Cek analisis serupa",
+            value=True,
+            help="Sebelum memanggil Groq, tampilkan analisis Anda sebelumnya yang paling mirip untuk "
+                 "dipakai ulang atau dikirim sebagai ringkasan konteks."
         )
 
+        validate_refs = st.checkbox(
+            "Validasi CWE/OWASP/ASVS lokal",
+            value=True,
+            help="CWE di tabel threat dicek ke indeks referensi lokal lalu dilengkapi nama CWE, "
+                 "kategori OWASP Top 10, dan bagian ASVS; model cukup menulis nomor CWE."
+        )
+        SYSTEM_PROMPT_CONTENT = system_prompt(validate_refs)
+
+        stream_mode = st.checkbox(
+            "Streaming respons",
+            value=True,
+            help="Tampilkan jawaban sedikit demi sedikit selama model masih menulis."
+        )
+
+        st.subheader("Ekspor")
+        export_mode = st.radio(
+            "Pembuatan file PDF/Excel:",
+            (EXPORT_MODE_LAZY, EXPORT_MODE_EAGER),
+            help="'Sesuai permintaan' hanya me-render file yang diminta sehingga rerun lebih ringan."
+        )
+
+        context_budget = st.number_input(
+            "Budget token konteks",
+            min_value=1000,
+            max_value=120000,
+            value=budget_for_model(model_option),
+            step=500,
+            key=f"context_budget_{model_option}",
+            help="Riwayat lama diringkas/dibuang agar prompt tetap di bawah budget ini."
+        )
+
+        ingested = None
         if uploaded_file:
-            st.success(f"File '{uploaded_file.name}' siap dianalisis.")
+            ingested = ingest_upload(uploaded_file)
+            if ingested is not None:
+                info = f"File '{uploaded_file.name}' siap dianalisis ({len(ingested.pages)} halaman"
+                if ingested.ocr_pages:
+                    info += f", {ingested.ocr_pages} via OCR"
+                st.success(info + ").")
+                for err in ingested.errors:
+                    st.warning(f"OCR gagal — {err}")
+
+        # Dokumen yang tidak muat di setengah budget konteks dianalisis per bagian
+        chunked_mode = False
+        if ingested is not None and app_mode == "Chat":
+            doc_tokens = estimate_tokens(ingested.text)
+            if doc_tokens > int(context_budget) // 2:
+                chunked_mode = st.checkbox(
+                    "Analisis dokumen per bagian",
+                    value=True,
+                    help=f"Dokumen ~{doc_tokens} token melebihi konteks; dipecah dan dianalisis paralel, "
+                         "lalu tabel threat digabung."
+                )
+
+        stats = get_export_cache().stats()
+        caption = f"Cache ekspor: {stats['hits']} hit / {stats['misses']} miss · {stats['entries']} entri"
+        executor = get_export_executor()
+        if executor is not None:
+            pool_stats = executor.stats()
+            caption += f" · worker {pool_stats['workers']}, antre {pool_stats['pending']}"
+        st.caption(caption)
+        sched = get_scheduler().stats()
+        st.caption(
+            f"Antrean Groq: {sched['queue_depth']} menunggu, {sched['active']} aktif · "
+            f"tunggu p50 {sched['wait_p50']:.1f}s / p95 {sched['wait_p95']:.1f}s · 429: {sched['rate_limited']}"
+        )
+
+        render_threat_search(model_option)
+        render_reference_lookup()
+        if app_mode == "Chat":
+            render_session_export()
+        render_perf_panel()
 
         if st.button("Logout"):
             for key in list(st.session_state.keys()):
@@ -478,40 +914,60 @@ def main_app():
     client = None
     if st.session_state.GROQ_API_KEY:
         try:
-            client = groq.Groq(api_key=st.session_state.GROQ_API_KEY)
+            client = get_groq_client(st.session_state.GROQ_API_KEY, _get_setting("GROQ_BASE_URL") or None)
         except Exception as e:
             st.error(f"Gagal menginisialisasi klien Groq. Pastikan kunci API Anda valid. Error: {e}")
     else:
         st.warning("Kunci API Groq tidak ditemukan. Tambahkan di Secrets Streamlit: GROQ_API_KEY.")
 
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if app_mode == "Batch":
+        render_batch_page(client, model_option, SYSTEM_PROMPT_CONTENT, export_mode, fallback_models, validate_refs)
+        return
+
+    store = get_analysis_store()
+    history_limit = st.session_state.setdefault("history_limit", HISTORY_PAGE_SIZE)
+    conversation_id = st.session_state.get("conversation_id")
+    window = store.load_messages(conversation_id, limit=history_limit) if conversation_id else []
+
+    # Riwayat dimuat per halaman dari SQLite, bukan ditahan di memori sesi
+    if window and window[0]["seq"] > 0:
+        if st.button(f"⬆️ Muat {HISTORY_PAGE_SIZE} pesan sebelumnya", key="load_older_messages"):
+            st.session_state.history_limit = history_limit + HISTORY_PAGE_SIZE
+            st.rerun()
+
+    render_risk_summary(conversation_records(store, conversation_id, window), "📊 Ringkasan risiko percakapan")
 
-    # Tampilkan riwayat + unduhan (pakai key unik)
-    for idx, message in enumerate(st.session_state.messages):
+    # Tampilkan riwayat + unduhan (key widget = nomor urut pesan di percakapan)
+    for message in window:
+        idx = message["seq"]
         with st.chat_message(message["role"]):
-            st.markdown(message["content"])
             if message["role"] == "assistant":
-                pdf_download_link = create_pdf_with_xhtml2pdf(
-                    message["content"],
-                    f"analisis_{idx}.pdf"
-                )
-                st.markdown(pdf_download_link, unsafe_allow_html=True)
-                excel_bytes = create_excel_from_markdown(
-                    message["content"],
-                    "alfa_threat_analysis.xlsx"
-                )
-                if excel_bytes:
-                    st.download_button(
-                        "📥 Unduh Analisis (Excel)",
-                        data=excel_bytes,
-                        file_name=f"alfa_threat_analysis_{idx}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        key=f"excel_download_{idx}"
-                    )
-
-    # Input pengguna
-    if prompt := st.chat_input("Deskripsikan skenario atau ajukan pertanyaan keamanan..."):
+                render_report(message["content"])
+                render_cache_marker(idx, message)
+                render_reuse_marker(message)
+                render_usage_caption(message.get("usage"))
+                render_export_controls(idx, message["content"], export_mode)
+            else:
+                st.markdown(message.get("display", message["content"]))
+
+    # Input pengguna (pertanyaan tanpa file dicek dulu ke analisis serupa)
+    prompt, similar = resolve_similar_prompt(
+        st.chat_input("Deskripsikan skenario atau ajukan pertanyaan keamanan..."),
+        check_similar and uploaded_file is None,
+    )
+    if prompt and similar is not None and similar["action"] == "reuse":
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        save_message({"role": "user", "content": prompt, "display": prompt}, model_option)
+        match = similar["match"]
+        message = save_message({"role": "assistant", "content": similar["content"],
+                                "reused_from": match["id"], "similarity": match["score"]}, match["model"])
+        perf.count("similar.reused")
+        with st.chat_message("assistant"):
+            render_report(message["content"])
+            render_reuse_marker(message)
+            render_export_controls(message["seq"], message["content"], export_mode)
+    elif prompt:
         if not client:
             st.error("Tidak dapat melanjutkan. Klien Groq belum terinisialisasi.")
         else:
@@ -519,56 +975,144 @@ def main_app():
                 st.markdown(prompt)
 
             final_prompt = prompt
+            user_meta = {}
+            if similar is not None:
+                # Ringkasan analisis serupa (bukan jawaban utuh) sebagai acuan model
+                final_prompt = context_prompt(prompt, similar["match"]["prompt"], similar["content"])
+                user_meta["similar_context"] = similar["match"]["id"]
+                st.caption(f"🧩 Ringkasan analisis serupa dikirim sebagai konteks "
+                           f"(kemiripan {similar['match']['score']:.2f}).")
             if uploaded_file is not None:
+                user_meta["file"] = uploaded_file.name
                 st.info(f"Menganalisis file: **{uploaded_file.name}**...")
                 if uploaded_file.type in ["image/jpeg", "image/png"]:
+                    from PIL import Image
+
                     image = Image.open(uploaded_file)
                     st.image(image, caption=f"File gambar: {uploaded_file.name}", use_column_width=True)
                 final_prompt = f"Berdasarkan sebuah file bernama '{uploaded_file.name}', jawab pertanyaan ini dari sudut pandang keamanan siber: {prompt}"
-                st.success("Konteks file berhasil ditambahkan ke dalam prompt.")
-
-            st.session_state.messages.append({"role": "user", "content": final_prompt})
+                file_text = ingested.excerpt(int(context_budget) // 2) if ingested is not None else ""
+                if file_text:
+                    final_prompt += f"\n\nIsi file '{uploaded_file.name}':\n\n{file_text}"
+                    st.success("Konteks file berhasil ditambahkan ke dalam prompt.")
+                else:
+                    st.warning("Tidak ada teks yang bisa diambil dari file; hanya nama file yang dikirim.")
+
+            # Riwayat menampilkan pertanyaan asli, bukan isi file yang disisipkan
+            user_message = save_message(
+                {"role": "user", "content": final_prompt, "display": prompt, **user_meta}, model_option
+            )
+
+            if chunked_mode:
+                try:
+                    with st.chat_message("assistant"):
+                        response_text = run_document_analysis(
+                            client, ingested, prompt, model_option, SYSTEM_PROMPT_CONTENT,
+                            int(context_budget), fallback_models
+                        )
+                        if response_text is None:
+                            _discard_unanswered(user_message)
+                            return
+                        if validate_refs:
+                            response_text = enrich_response(response_text)
+                        message = save_message({"role": "assistant", "content": response_text}, model_option)
+                        render_report(response_text)
+                        render_export_controls(message["seq"], response_text, export_mode)
+                except Exception as e:
+                    st.error(f"Terjadi kesalahan saat analisis dokumen: {e}")
+                    _discard_unanswered(user_message)
+                return
 
             try:
                 system_message = {"role": "system", "content": SYSTEM_PROMPT_CONTENT}
-                messages_to_send = [system_message] + st.session_state.messages
-
-                with st.spinner("Alfa Threat sedang menganalisis... 🤔"):
-                    chat_completion = client.chat.completions.create(
-                        messages=messages_to_send,
-                        model=model_option,
-                    )
-                    response_text = chat_completion.choices[0].message.content
-                    st.session_state.messages.append({"role": "assistant", "content": response_text})
+                history = store.load_messages(st.session_state.conversation_id, limit=CONTEXT_HISTORY_MESSAGES)
+                messages_to_send, context_report = build_context(
+                    system_message, history, model_option, budget=int(context_budget)
+                )
 
+                response_cache = get_response_cache() if use_response_cache else None
+                cache_key = cached = None
+                if response_cache is not None:
+                    lookup_started = time.perf_counter()
+                    cache_key = response_key(SYSTEM_PROMPT_CONTENT, model_option, messages_to_send)
+                    cached = response_cache.get(cache_key)
+
+                if cached is not None:
+                    message = {
+                        "role": "assistant",
+                        "content": cached["response"],
+                        "usage": cached["usage"],
+                        "cache_key": cache_key,
+                        "cached": True,
+                        "cache_ms": (time.perf_counter() - lookup_started) * 1000,
+                    }
+                    message = save_message(message, model_option)
+                    latest_idx = message["seq"]
                     with st.chat_message("assistant"):
-                        st.markdown(response_text)
-
-                        # PDF (link, tidak perlu key)
-                        pdf_download_link = create_pdf_with_xhtml2pdf(
-                            response_text,
-                            f"analisis_latest.pdf"
+                        render_report(message["content"])
+                        render_cache_marker(latest_idx, message)
+                        render_usage_caption(message["usage"])
+                        render_export_controls(latest_idx, message["content"], export_mode)
+                elif stream_mode:
+                    with st.chat_message("assistant"):
+                        placeholder = st.empty()
+                        placeholder.markdown("Alfa Threat sedang menganalisis... 🤔")
+                        response_text = stream_chat_completion(
+                            client, messages_to_send, model_option, placeholder, fallback_models
+                        )
+                        stats = st.session_state.last_stream_stats
+                        if validate_refs:
+                            response_text = enrich_response(response_text)
+                            placeholder.markdown(response_text)
+                        if stats["model"] != model_option:
+                            st.info(f"Model {model_option} sedang dibatasi; jawaban dari {stats['model']}.")
+                        usage = _usage_dict(stats["usage"], context_report)
+                        message = {"role": "assistant", "content": response_text, "usage": usage}
+                        if response_cache is not None and stats["model"] == model_option:
+                            response_cache.put(cache_key, model_option, prompt, response_text, usage)
+                            message["cache_key"] = cache_key
+                        message = save_message(message, stats["model"])
+
+                        if stats["ttft"] is not None:
+                            st.caption(f"Token pertama {stats['ttft']:.2f}s · selesai {stats['total']:.1f}s")
+                        render_usage_caption(usage)
+
+                        # Ekspor baru dibuat setelah stream selesai
+                        latest_idx = message["seq"]
+                        render_cache_marker(latest_idx, message)
+                        render_export_controls(latest_idx, response_text, export_mode)
+                else:
+                    with st.spinner("Alfa Threat sedang menganalisis... 🤔"):
+                        chat_completion, model_used = get_scheduler().create(
+                            client, messages_to_send, model_option, fallback_models=fallback_models
                         )
-                        st.markdown(pdf_download_link, unsafe_allow_html=True)
-
-                        # Excel (pakai key unik)
-                        excel_bytes = create_excel_from_markdown(response_text, "alfa_threat_analysis.xlsx")
-                        if excel_bytes:
-                            st.download_button(
-                                "📥 Unduh Analisis (Excel)",
-                                data=excel_bytes,
-                                file_name="alfa_threat_analysis_latest.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                key=f"excel_download_latest_{len(st.session_state.messages)}"
-                            )
+                        if model_used != model_option:
+                            st.info(f"Model {model_option} sedang dibatasi; jawaban dari {model_used}.")
+                        response_text = chat_completion.choices[0].message.content
+                        if validate_refs:
+                            response_text = enrich_response(response_text)
+                        usage = _usage_dict(getattr(chat_completion, "usage", None), context_report)
+                        message = {"role": "assistant", "content": response_text, "usage": usage}
+                        if response_cache is not None and model_used == model_option:
+                            response_cache.put(cache_key, model_option, prompt, response_text, usage)
+                            message["cache_key"] = cache_key
+                        message = save_message(message, model_used)
+
+                        with st.chat_message("assistant"):
+                            render_report(response_text)
+                            render_usage_caption(usage)
+
+                            # Nomor urut sama dengan riwayat agar rerun berikutnya kena cache
+                            latest_idx = message["seq"]
+                            render_cache_marker(latest_idx, message)
+                            render_export_controls(latest_idx, response_text, export_mode)
 
             except Exception as e:
                 st.error(f"Terjadi kesalahan saat berkomunikasi dengan API Groq. Detail: {e}")
-                if st.session_state.messages and st.session_state.messages[-1].get("role") == "user":
-                    st.session_state.messages.pop()
+                _discard_unanswered(user_message)
 
 # =========================
-# 5) Login Page
+# 4) Login Page
 # =========================
 def login_page():
     st.title("Login Alfa Threat Model")
@@ -592,28 +1136,26 @@ def login_page():
                 st.error("Username atau password salah.")
 
 # =========================
-# 6) App Flow & Session
+# 5) App Flow & Session
 # =========================
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'username' not in st.session_state:
-    st.session_state.username = ""
-if 'last_activity' not in st.session_state:
-    st.session_state.last_activity = 0
-
-# Auto-logout 30 menit idle
-if st.session_state.authenticated:
-    if time.time() - st.session_state.last_activity > 1800:
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.warning("Sesi Anda telah berakhir karena tidak aktif. Silakan login kembali.")
-        time.sleep(1.5)
-        st.rerun()
-
-if st.session_state.authenticated:
-    main_app()
-else:
-    login_page()
-
-
+if __name__ == "__main__":
+    if 'authenticated' not in st.session_state:
+        st.session_state.authenticated = False
+    if 'username' not in st.session_state:
+        st.session_state.username = ""
+    if 'last_activity' not in st.session_state:
+        st.session_state.last_activity = 0
+
+    # Auto-logout 30 menit idle
+    if st.session_state.authenticated:
+        if time.time() - st.session_state.last_activity > 1800:
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            st.warning("Sesi Anda telah berakhir karena tidak aktif. Silakan login kembali.")
+            time.sleep(1.5)
+            st.rerun()
 
+    if st.session_state.authenticated:
+        main_app()
+    else:
+        login_page()
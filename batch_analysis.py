@@ -0,0 +1,151 @@
+"""
+Analisis threat secara batch untuk banyak flow aplikasi sekaligus.
+
+- Membaca daftar flow dari CSV/XLSX
+- Mengirim ke Groq secara konkuren dengan batas konkurensi & retry (backoff)
+- Hasil di-yield sesuai urutan selesai agar UI bisa menampilkan progres
+- Menggabungkan semua jawaban menjadi satu markdown laporan yang lalu diekspor
+  lewat eksportir PDF/Excel yang sama
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+
+from report_model import to_markdown_table
+
+FLOW_COLUMN_HINTS = ("flow", "deskripsi", "description", "skenario", "scenario", "alur")
+
+
+@dataclass
+class BatchResult:
+    index: int
+    flow: str
+    response: str = ""
+    error: str = ""
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+def load_flows(data: bytes, filename: str) -> list:
+    """Ambil deskripsi flow dari CSV/XLSX (kolom bernama flow/deskripsi/…, atau kolom pertama)."""
+    import pandas as pd
+
+    name = filename.lower()
+    if name.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(BytesIO(data), dtype=str)
+    else:
+        df = pd.read_csv(BytesIO(data), dtype=str, sep=None, engine="python")
+    if df.empty or not len(df.columns):
+        return []
+
+    column = df.columns[0]
+    for col in df.columns:
+        if any(h in str(col).lower() for h in FLOW_COLUMN_HINTS):
+            column = col
+            break
+    flows = df[column].dropna().astype(str).str.strip()
+    return [f for f in flows.tolist() if f]
+
+
+def analyze_flow(client, model: str, system_prompt: str, flow: str,
+                 retries: int = 2, backoff: float = 2.0, scheduler=None, fallback_models=()):
+    """
+    Satu flow → (teks jawaban, jumlah percobaan). Exception terakhir diteruskan.
+    Dengan `scheduler` (GroqScheduler), retry/backoff/fallback ditangani scheduler.
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": flow},
+    ]
+    if scheduler is not None:
+        completion, _model_used = scheduler.create(
+            client, messages, model, fallback_models=fallback_models, max_retries=retries
+        )
+        return completion.choices[0].message.content, 1
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            completion = client.chat.completions.create(messages=messages, model=model)
+            return completion.choices[0].message.content, attempt
+        except Exception:
+            if attempt > retries:
+                raise
+            time.sleep(backoff * (2 ** (attempt - 1)))
+
+
+def run_batch(client, flows: list, model: str, system_prompt: str,
+              concurrency: int = 4, retries: int = 2, analyze=None, scheduler=None, fallback_models=()):
+    """
+    Generator BatchResult sesuai urutan selesai. Konkurensi dibatasi `concurrency`
+    sehingga total waktu ≈ ceil(n / concurrency) × latensi per flow.
+    """
+    if analyze is None:
+        def analyze(client, model, system_prompt, flow, retries):
+            return analyze_flow(client, model, system_prompt, flow, retries=retries,
+                                scheduler=scheduler, fallback_models=fallback_models)
+
+    def job(index, flow):
+        started = time.perf_counter()
+        result = BatchResult(index=index, flow=flow)
+        try:
+            result.response, result.attempts = analyze(client, model, system_prompt, flow, retries=retries)
+        except Exception as e:
+            result.error = str(e) or e.__class__.__name__
+            result.attempts = retries + 1
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as pool:
+        futures = [pool.submit(job, i, flow) for i, flow in enumerate(flows)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _short_title(flow: str, limit: int = 80) -> str:
+    title = " ".join(flow.split())
+    return title if len(title) <= limit else title[:limit - 1] + "…"
+
+
+def merge_batch_results(results: list) -> str:
+    """
+    Gabungkan hasil batch menjadi satu markdown:
+    1) Tabel threat konsolidasi (semua baris tabel threat, kolom dipetakan lewat nama,
+       + kolom nomor flow)
+    2) Bagian per flow berisi jawaban lengkap
+    3) Daftar flow yang gagal
+    """
+    results = sorted(results, key=lambda r: r.index)
+    parts = ["# Laporan Batch Threat Analysis", ""]
+
+    # Impor lokal: chunked_analysis mengimpor run_batch dari modul ini
+    from chunked_analysis import align_threat_tables
+
+    header, _positions, aligned = align_threat_tables(results)
+    rows = [[str(r.index + 1)] + row for r, row in aligned]
+    if header:
+        parts.append("## Konsolidasi Threat")
+        parts.append("")
+        parts.append(to_markdown_table(["NO FLOW"] + header, rows))
+        parts.append("")
+
+    for r in results:
+        if r.ok:
+            parts.append(f"## Flow {r.index + 1}: {_short_title(r.flow)}")
+            parts.append("")
+            parts.append(r.response.strip())
+            parts.append("")
+
+    failed = [r for r in results if not r.ok]
+    if failed:
+        parts.append("## Flow Gagal Dianalisis")
+        parts.append("")
+        for r in failed:
+            parts.append(f"- Flow {r.index + 1}: {_short_title(r.flow)} — {r.error}")
+    return "\n".join(parts).strip() + "\n"
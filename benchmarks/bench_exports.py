@@ -0,0 +1,228 @@
+"""
+Benchmark jalur ekspor pada laporan sintetis berbentuk keluaran SYSTEM_PROMPT_CONTENT:
+diagram DFD (arrow), tabel CWE, tabel C/I/Au/Av/N 9 kolom, dan tabel DREAD,
+masing-masing `rows` baris (default 10, 100, 500, 2000).
+
+Kasus:
+- shape_tables     : _shape_tables_for_pdf pada HTML markdown2 (disiapkan sekali)
+- parse_tables     : _parse_markdown_tables_simple (memo model dokumen dikosongkan)
+- pdf              : create_pdf_with_xhtml2pdf, end-to-end dari markdown
+- excel_openpyxl   : create_excel_from_markdown, engine openpyxl (jalur biasa)
+- excel_xlsxwriter : create_excel_from_markdown, engine xlsxwriter (jalur biasa)
+- excel_fast       : create_excel_from_markdown, jalur cepat xlsxwriter constant_memory
+
+Tiap kasus mengosongkan memo (get_report_document/get_threat_records) sebelum
+setiap pemanggilan agar yang diukur adalah ekspor pesan baru. Waktu diukur
+`--repeat` kali; puncak memori diukur sekali terpisah dengan tracemalloc (hanya
+alokasi lewat alokator Python). Error UI exporters (st.error) diganti perekam sehingga
+kegagalan ekspor menggagalkan benchmark, bukan diam-diam mengembalikan None.
+Semua offline; laporan dibangkitkan dengan seed tetap.
+
+Jalankan dari root repo:
+    python benchmarks/bench_exports.py --rows 10 100 500 2000 --out bench_exports.json
+    python benchmarks/bench_exports.py --rows 100 --cases pdf excel_fast --compare bench_exports.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exporters  # noqa: E402
+from report_model import get_report_document  # noqa: E402
+from threat_records import get_threat_records  # noqa: E402
+
+CASES = ("shape_tables", "parse_tables", "pdf", "excel_openpyxl", "excel_xlsxwriter", "excel_fast")
+
+_FLOWS = ("user login", "reset password", "verifikasi OTP", "transfer dana", "upload dokumen", "lihat profil")
+_THREATS = (
+    ("SQL Injection", "A03:2021", "CWE-89"), ("Cross-Site Scripting", "A03:2021", "CWE-79"),
+    ("IDOR", "A01:2021", "CWE-639"), ("Brute force", "A07:2021", "CWE-307"),
+    ("Session fixation", "A07:2021", "CWE-384"), ("SSRF", "A10:2021", "CWE-918"),
+    ("DDoS", "A05:2021", "CWE-400"), ("Sensitive data exposure", "A02:2021", "CWE-311"),
+)
+_DREAD_HEADER = ("Threat", "Damage", "Reproducibility", "Exploitability", "Affected Users", "Discoverability", "Skor")
+
+
+def synthetic_report(rows: int, seed: int = 7) -> str:
+    """Markdown jawaban asisten dengan empat bagian SYSTEM_PROMPT_CONTENT, `rows` baris per tabel."""
+    rnd = random.Random(seed)
+    picks = [(rnd.choice(_FLOWS), *rnd.choice(_THREATS)) for _ in range(rows)]
+    out = ["### 1. Diagram DFD",
+           "User -> Web App -> API Gateway -> Auth Service -> Database",
+           "Web App -> Object Storage; API Gateway -> Payment Service",
+           "",
+           "### 2. Mapping CWE",
+           "| No | Threat | CWE |",
+           "|---|---|---|"]
+    out += [f"| {i} | {threat} | {cwe} |" for i, (_flow, threat, _owasp, cwe) in enumerate(picks, start=1)]
+    out += ["",
+            "### 3. Tabel Kerentanan",
+            "| FLOW PROSES | THREAT | C | I | Au | Av | N | SCENARIO | REKOMENDASI PENGAMANAN |",
+            "|---|---|---|---|---|---|---|---|---|"]
+    for i, (flow, threat, owasp, cwe) in enumerate(picks, start=1):
+        marks = " | ".join("v" if rnd.random() < 0.5 else " " for _ in range(5))
+        out.append(
+            f"| {flow} | **{threat}** {owasp} | {marks} | penyerang #{i} mengeksploitasi {flow} "
+            f"melalui {threat.lower()} ({cwe}) pada parameter request | "
+            "validasi input<br>rate limiting<br>MFA<br>logging & monitoring<br>least privilege |"
+        )
+    out += ["", "### 4. DREAD", "| " + " | ".join(_DREAD_HEADER) + " |", "|" + "---|" * len(_DREAD_HEADER)]
+    for _flow, threat, _owasp, _cwe in picks:
+        scores = [rnd.randint(1, 5) for _ in range(5)]
+        out.append(f"| {threat} | " + " | ".join(map(str, scores)) + f" | {sum(scores) / 5:.1f} |")
+    return "\n".join(out) + "\n"
+
+
+class _ErrorRecorder:
+    """Pengganti exporters._ui_error: kumpulkan pesan error agar kegagalan terlihat."""
+
+    def __init__(self):
+        self.errors = []
+
+    def __call__(self, message):
+        self.errors.append(str(message))
+
+
+@contextmanager
+def _excel_mode(engine: str, fast: bool):
+    """Paksa engine Excel & jalur cepat/biasa lewat atribut modul exporters."""
+    saved = exporters.excel_engine, exporters.FAST_EXCEL_MIN_ROWS
+    exporters.excel_engine = lambda: engine
+    exporters.FAST_EXCEL_MIN_ROWS = 0 if fast else sys.maxsize
+    try:
+        yield
+    finally:
+        exporters.excel_engine, exporters.FAST_EXCEL_MIN_ROWS = saved
+
+
+def _clear_memos():
+    get_report_document.cache_clear()
+    get_threat_records.cache_clear()
+
+
+def _cold(fn, *args):
+    def run():
+        _clear_memos()
+        return fn(*args)
+    return run
+
+
+def _case(name: str, markdown: str):
+    """(fungsi tanpa argumen, context manager) untuk satu kasus."""
+    if name == "shape_tables":
+        html = get_report_document(markdown).html
+        return (lambda: exporters._shape_tables_for_pdf(html)), nullcontext()
+    if name == "parse_tables":
+        return _cold(exporters._parse_markdown_tables_simple, markdown), nullcontext()
+    if name == "pdf":
+        return _cold(exporters.create_pdf_with_xhtml2pdf, markdown), nullcontext()
+    engine, fast = {"excel_openpyxl": ("openpyxl", False), "excel_xlsxwriter": ("xlsxwriter", False),
+                    "excel_fast": ("xlsxwriter", True)}[name]
+    return _cold(exporters.create_excel_from_markdown, markdown), _excel_mode(engine, fast)
+
+
+def _output_size(result) -> int:
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    if isinstance(result, list):
+        return sum(len(df.index) for df in result)      # parse_tables: total baris
+    return 0
+
+
+def run_case(name: str, rows: int, repeat: int, stub: _ErrorRecorder) -> dict:
+    markdown = synthetic_report(rows)
+    fn, mode = _case(name, markdown)
+    with mode:
+        result = fn()                                    # pemanasan (impor, font, dsb.)
+        if result is None or stub.errors:
+            raise SystemExit(f"[{name} rows={rows}] ekspor gagal: {stub.errors or 'None'}")
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        fn()
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "case": name,
+        "rows": rows,
+        "input_bytes": len(markdown.encode("utf-8")),
+        "output_size": _output_size(result),
+        "repeat": repeat,
+        "min_ms": min(times) * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "max_ms": max(times) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def _versions() -> dict:
+    versions = {"python": platform.python_version(), "platform": platform.platform()}
+    for module in ("pandas", "markdown2", "xhtml2pdf", "openpyxl", "xlsxwriter"):
+        try:
+            versions[module] = getattr(__import__(module), "__version__", "?")
+        except ImportError:
+            versions[module] = None
+    return versions
+
+
+def _compare(results: list, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["rows"]): r for r in json.load(f)["results"]}
+    print(f"\nDibandingkan dengan {baseline_path} (median waktu, puncak memori):", file=sys.stderr)
+    for r in results:
+        base = baseline.get((r["case"], r["rows"]))
+        if not base:
+            continue
+        print(f"  {r['case']:<17} {r['rows']:>5} baris  waktu {r['median_ms'] / base['median_ms']:>5.2f}x"
+              f"  memori {r['peak_kb'] / max(base['peak_kb'], 1e-9):>5.2f}x", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[10, 100, 500, 2000])
+    ap.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="tulis hasil JSON ke file (default: stdout)")
+    ap.add_argument("--compare", help="JSON hasil sebelumnya untuk dibandingkan")
+    args = ap.parse_args()
+
+    # Peringatan CSS xhtml2pdf muncul di setiap render; keluaran benchmark cukup ringkasan
+    logging.getLogger("xhtml2pdf").setLevel(logging.ERROR)
+    stub = _ErrorRecorder()
+    exporters._ui_error = stub
+
+    results = []
+    for rows in args.rows:
+        for name in args.cases:
+            r = run_case(name, rows, args.repeat, stub)
+            results.append(r)
+            print(f"{name:<17} {rows:>5} baris  median {r['median_ms']:>9.1f} ms  "
+                  f"puncak {r['peak_kb'] / 1024:>7.1f} MB  keluaran {r['output_size']}", file=sys.stderr)
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "versions": _versions(),
+              "args": vars(args), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
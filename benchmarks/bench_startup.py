@@ -0,0 +1,136 @@
+"""
+Benchmark start skrip Streamlit per jalur masuk, lewat streamlit.testing AppTest.
+
+- cold : eksekusi pertama skrip di proses Python baru (termasuk impor modul
+         aplikasi dan dependensinya), diulang `--repeat` kali di proses terpisah
+- warm : rerun berikutnya di proses yang sama (modul sudah di sys.modules)
+
+Jalur: login (belum login), chat (percakapan kosong), chat-history (percakapan
+dengan `--history` pasang pesan berisi tabel threat). Untuk tiap jalur juga
+dicatat dependensi berat yang ikut termuat oleh skrip, untuk memastikan
+xhtml2pdf/pandas baru dimuat saat ekspor.
+
+Jalankan dari root repo:
+    python benchmarks/bench_startup.py --repeat 3 --warm 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "appgroqlog.py")
+sys.path.insert(0, ROOT)
+
+PATHS = ("login", "chat", "chat-history")
+HEAVY_MODULES = ("groq", "PIL.Image", "numpy", "pandas", "markdown2", "xhtml2pdf", "openpyxl", "xlsxwriter")
+USERNAME = "bench"
+
+
+def _seed_history(db_path: str, pairs: int) -> None:
+    """Satu percakapan berisi `pairs` pertanyaan + jawaban laporan (dijalankan di proses induk)."""
+    sys.path.insert(0, os.path.join(ROOT, "tools"))
+    from analysis_store import AnalysisStore
+    from fake_groq_server import SAMPLE_REPORT
+
+    store = AnalysisStore(db_path)
+    conv = store.create_conversation(USERNAME, model="bench")
+    for i in range(pairs):
+        store.append_message(conv, {"role": "user", "content": f"Analisis flow login #{i}"}, USERNAME, "bench")
+        store.append_message(conv, {"role": "assistant", "content": SAMPLE_REPORT}, USERNAME, "bench")
+    store.close()
+
+
+def _child(path: str, warm: int) -> dict:
+    """Satu proses: eksekusi cold + `warm` rerun; hasil dicetak sebagai JSON."""
+    from streamlit.testing.v1 import AppTest
+
+    before = {m for m in HEAVY_MODULES if m in sys.modules}
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.secrets["GROQ_API_KEY"] = "bench"
+    if path != "login":
+        at.session_state["authenticated"] = True
+        at.session_state["username"] = USERNAME
+        at.session_state["last_activity"] = time.time()
+
+    started = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"skrip gagal pada jalur {path}: {at.exception[0].message}")
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules and m not in before]
+
+    warm_times = []
+    for _ in range(warm):
+        if path != "login":
+            at.session_state["last_activity"] = time.time()
+        started = time.perf_counter()
+        at.run()
+        warm_times.append(time.perf_counter() - started)
+    return {"cold": cold, "warm": warm_times, "loaded": loaded}
+
+
+def _run_path(path: str, repeat: int, warm: int, env: dict) -> dict:
+    colds, warms, loaded = [], [], []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", path, "--warm", str(warm)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise SystemExit(f"[{path}] gagal:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        colds.append(result["cold"])
+        warms.extend(result["warm"])
+        loaded = result["loaded"]
+    return {"cold": colds, "warm": warms, "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--repeat", type=int, default=3, help="jumlah proses baru (cold) per jalur")
+    parser.add_argument("--warm", type=int, default=5, help="jumlah rerun warm per proses")
+    parser.add_argument("--history", type=int, default=10, help="pasang pesan untuk jalur chat-history")
+    parser.add_argument("--json", action="store_true", help="cetak hasil mentah sebagai JSON")
+    parser.add_argument("--child", choices=PATHS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args.child, args.warm)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        for path in args.paths:
+            # Database baru per jalur agar jalur chat benar-benar kosong
+            env = dict(
+                os.environ,
+                ANALYSIS_DB_PATH=os.path.join(tmp, f"{path}.sqlite3"),
+                RESPONSE_CACHE_PATH=os.path.join(tmp, f"{path}-responses.sqlite3"),
+                EXPORT_POOL_WORKERS="0",
+            )
+            if path == "chat-history":
+                _seed_history(env["ANALYSIS_DB_PATH"], args.history)
+            results[path] = _run_path(path, args.repeat, args.warm, env)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'jalur':<14} {'cold med':>10} {'cold min':>10} {'warm med':>10} {'warm p95':>10}  modul berat termuat")
+    for path, r in results.items():
+        warm = sorted(r["warm"]) or [0.0]
+        p95 = warm[min(len(warm) - 1, int(round(0.95 * (len(warm) - 1))))]
+        print(
+            f"{path:<14} {statistics.median(r['cold']) * 1000:>8.0f}ms {min(r['cold']) * 1000:>8.0f}ms "
+            f"{statistics.median(warm) * 1000:>8.0f}ms {p95 * 1000:>8.0f}ms  {', '.join(r['loaded']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Micro-benchmark: _shape_tables_for_pdf (pemindai satu lintasan) vs implementasi
+lama berbasis re.sub bersarang, pada laporan sintetis berukuran besar.
+
+Jalankan dari root repo:
+    python benchmarks/bench_table_shaper.py --tables 40 --rows 200
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exporters import _shape_tables_for_pdf  # noqa: E402
+
+
+def _shape_tables_for_pdf_legacy(raw_html: str) -> str:
+    """Salinan implementasi lama (acuan hasil & kecepatan)."""
+    def strip_tags(t):
+        return re.sub(r"<[^>]+>", "", t, flags=re.I | re.S).strip()
+
+    def add_colgroup_for_known_table(table_html: str) -> str:
+        m = re.search(r"<tr[^>]*>(.*?)</tr>", table_html, flags=re.I | re.S)
+        if not m:
+            return table_html
+        header_row = m.group(1)
+        headers = re.findall(r"<t[hd][^>]*>(.*?)</t[hd]>", header_row, flags=re.I | re.S)
+        headers_text = [strip_tags(h).lower() for h in headers]
+        if not headers_text:
+            return table_html
+
+        def norm(h):
+            h = h.replace("authentication", "au").replace("availability", "av")
+            h = h.replace("confidentiality", "c").replace("integrity", "i")
+            h = h.replace("non-repudiation", "n")
+            return h.strip().lower()
+
+        mapped = [norm(h) for h in headers_text]
+
+        score = 0
+        if any(x.startswith("flow") for x in mapped): score += 1
+        if "threat" in "".join(mapped): score += 1
+        for k in ["c", "i", "au", "av", "n"]:
+            if k in mapped: score += 1
+        if any("scenario" in x for x in mapped): score += 1
+        if any("rekomendasi" in x for x in mapped): score += 1
+        if score < max(5, len(mapped) // 2):
+            return table_html
+
+        widths = [18, 22, 4, 4, 4, 4, 4, 22, 18]
+        n = len(mapped)
+        if n == 9:
+            weights = widths
+        else:
+            base = [20, 20] + [int(60 / max(1, n - 2))] * (n - 2)
+            weights = base
+
+        colgroup = "<colgroup>" + "".join([f'<col style="width:{w}%;"/>' for w in weights]) + "</colgroup>"
+        table_html = re.sub(r"(<table[^>]*>)", r"\1" + colgroup, table_html, flags=re.I | re.S, count=1)
+        return table_html
+
+    def ensure_thead(table_html: str) -> str:
+        if re.search(r"<thead", table_html, flags=re.I):
+            return table_html
+        return re.sub(
+            r"(<table[^>]*>\s*)(<tr[^>]*>.*?</tr>)",
+            r"\1<thead>\2</thead>",
+            table_html,
+            flags=re.I | re.S,
+            count=1
+        )
+
+    def process_table(m):
+        tbl = m.group(0)
+        tbl = ensure_thead(tbl)
+        tbl = add_colgroup_for_known_table(tbl)
+        return tbl
+
+    return re.sub(r"<table[^>]*>.*?</table>", process_table, raw_html, flags=re.I | re.S)
+
+
+THREAT_HEADER = ["FLOW PROSES", "THREAT", "C", "I", "Au", "Av", "N", "SCENARIO", "REKOMENDASI PENGAMANAN"]
+CWE_HEADER = ["No", "Threat", "CWE"]
+
+
+def _row(cells, tag="td"):
+    return "<tr>\n" + "".join(f"<{tag}>{c}</{tag}>\n" for c in cells) + "</tr>\n"
+
+
+def synthetic_report_html(tables: int, rows: int) -> str:
+    """HTML mirip keluaran markdown2: campuran tabel threat, CWE, dengan/tanpa <thead>."""
+    parts = ["<h2>Diagram DFD</h2>\n<p>User -&gt; Web App -&gt; API -&gt; DB</p>\n"]
+    for t in range(tables):
+        header = THREAT_HEADER if t % 2 == 0 else CWE_HEADER
+        body = []
+        for r in range(rows):
+            if header is THREAT_HEADER:
+                cells = [f"flow {r}", f"<strong>SQLi</strong> A03:{r}", "v", "", "v", "", "v",
+                         "penyerang menyisipkan payload " * 3, "gunakan parameterized query"]
+            else:
+                cells = [str(r), f"Threat {r}", f"CWE-{79 + r % 50}"]
+            body.append(_row(cells))
+        if t % 3 == 0:
+            # tanpa <thead> (mis. HTML dari sumber lain)
+            parts.append("<table>\n" + _row(header, "th") + "".join(body) + "</table>\n")
+        else:
+            parts.append("<table>\n<thead>\n" + _row(header, "th") + "</thead>\n<tbody>\n"
+                         + "".join(body) + "</tbody>\n</table>\n")
+        parts.append("<p>Catatan tabel.</p>\n")
+    # HTML rusak: tabel tanpa penutup </tr> di akhir dokumen
+    parts.append("<table><tr><td>x" * 3)
+    return "".join(parts)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tables", type=int, default=40)
+    ap.add_argument("--rows", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    html = synthetic_report_html(args.tables, args.rows)
+    new = _shape_tables_for_pdf(html)
+    old = _shape_tables_for_pdf_legacy(html)
+    if new != old:
+        print("HASIL BERBEDA dengan implementasi lama!", file=sys.stderr)
+        sys.exit(1)
+
+    t_old = min(timeit.repeat(lambda: _shape_tables_for_pdf_legacy(html), number=1, repeat=args.repeat))
+    t_new = min(timeit.repeat(lambda: _shape_tables_for_pdf(html), number=1, repeat=args.repeat))
+    print(f"HTML {len(html) / 1024:.0f} KB, {args.tables} tabel x {args.rows} baris")
+    print(f"legacy   : {t_old * 1000:8.2f} ms")
+    print(f"scanner  : {t_new * 1000:8.2f} ms  ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
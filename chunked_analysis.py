@@ -0,0 +1,269 @@
+"""
+Analisis map-reduce untuk dokumen unggahan yang melebihi konteks model.
+
+- Teks hasil ekstraksi dipecah menjadi potongan berbatas token dengan overlap
+  (dipotong di batas baris; baris yang terlalu panjang dipotong per kata)
+- Semua potongan dianalisis bersamaan lewat run_batch (scheduler yang sama
+  dengan chat), sehingga total waktu ≈ potongan paling lambat
+- Baris tabel threat dari semua potongan digabung & dideduplikasi, skor DREAD
+  diringkas per threat, lalu hasilnya menjadi satu markdown yang diekspor
+  dengan eksportir PDF/Excel yang sama
+"""
+import re
+
+from batch_analysis import run_batch
+from context_budget import dread_score, estimate_tokens
+from report_model import get_report_document, to_markdown_table
+from threat_records import threat_key
+
+# Cadangan token untuk jawaban model dan instruksi per potongan
+CHUNK_COMPLETION_RESERVE = 1500
+CHUNK_PROMPT_OVERHEAD = 150
+MIN_CHUNK_TOKENS = 500
+MAX_CHUNK_CONCURRENCY = 8
+
+CHUNK_PROMPT = (
+    "Dokumen '{name}' terlalu besar sehingga dianalisis per bagian. "
+    "Ini bagian {index} dari {total}. Analisis hanya isi bagian ini dengan format "
+    "yang diminta (tabel threat, CWE, DREAD).\n\n"
+    "Pertanyaan: {question}\n\n"
+    "Isi bagian {index}:\n\n{chunk}"
+)
+
+DREAD_LEVELS = ((4.5, "CRITICAL"), (3.5, "HIGH"), (2.5, "MEDIUM"), (1.5, "LOW"), (0.0, "INFORMATIONAL"))
+
+_KEY_STRIP_RE = re.compile(r"[^\w\s]+")
+
+
+def chunk_token_budget(context_budget: int, system_prompt: str, question: str = "") -> int:
+    """Token isi dokumen per potongan agar prompt + jawaban tetap di bawah budget konteks."""
+    available = (context_budget - estimate_tokens(system_prompt) - estimate_tokens(question)
+                 - CHUNK_PROMPT_OVERHEAD - CHUNK_COMPLETION_RESERVE)
+    return max(MIN_CHUNK_TOKENS, available)
+
+
+def _split_long_line(line: str, max_tokens: int):
+    piece, piece_tokens = [], 0
+    for word in line.split():
+        t = estimate_tokens(word)
+        if piece and piece_tokens + t > max_tokens:
+            yield " ".join(piece), piece_tokens
+            piece, piece_tokens = [], 0
+        piece.append(word)
+        piece_tokens += t
+    if piece:
+        yield " ".join(piece), piece_tokens
+
+
+def split_into_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> list:
+    """
+    Potongan teks ≤ `max_tokens` (estimasi). Setiap potongan diawali baris-baris
+    terakhir potongan sebelumnya hingga `overlap_tokens`, agar threat yang
+    melintasi batas potongan tetap terlihat utuh di salah satu potongan.
+    """
+    max_tokens = max(1, int(max_tokens))
+    overlap_tokens = max(0, min(int(overlap_tokens), max_tokens // 2))
+
+    units = []
+    for line in (text or "").splitlines():
+        t = estimate_tokens(line)
+        if t <= max_tokens:
+            units.append((line, t))
+        else:
+            units.extend(_split_long_line(line, max_tokens))
+
+    chunks = []
+    current, current_tokens = [], 0
+    for line, t in units:
+        if current and current_tokens + t > max_tokens:
+            chunks.append("\n".join(u[0] for u in current).strip())
+            carry, carry_tokens = [], 0
+            for unit in reversed(current):
+                if carry_tokens + unit[1] > overlap_tokens:
+                    break
+                carry.insert(0, unit)
+                carry_tokens += unit[1]
+            if carry_tokens + t > max_tokens:
+                carry, carry_tokens = [], 0
+            current, current_tokens = carry, carry_tokens
+        current.append((line, t))
+        current_tokens += t
+    if current:
+        chunks.append("\n".join(u[0] for u in current).strip())
+    return [c for c in chunks if c]
+
+
+def build_chunk_prompts(chunks: list, name: str, question: str) -> list:
+    total = len(chunks)
+    return [
+        CHUNK_PROMPT.format(name=name, index=i, total=total, question=question, chunk=chunk)
+        for i, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def run_chunked_analysis(client, chunks: list, model: str, system_prompt: str, name: str, question: str,
+                         retries: int = 2, scheduler=None, fallback_models=(), concurrency: int = None):
+    """Generator BatchResult per potongan (urutan selesai); semua potongan dikirim bersamaan."""
+    prompts = build_chunk_prompts(chunks, name, question)
+    concurrency = concurrency or min(MAX_CHUNK_CONCURRENCY, max(1, len(prompts)))
+    yield from run_batch(client, prompts, model, system_prompt, concurrency=concurrency, retries=retries,
+                         scheduler=scheduler, fallback_models=fallback_models)
+
+
+# -------------------------
+# Penggabungan hasil
+# -------------------------
+def _row_key(text: str) -> str:
+    return " ".join(_KEY_STRIP_RE.sub(" ", text.lower()).split())
+
+
+def dread_level(score: float) -> str:
+    for threshold, level in DREAD_LEVELS:
+        if score >= threshold:
+            return level
+    return DREAD_LEVELS[-1][1]
+
+
+# Peran kolom tabel threat selain C/I/Au/Av/N (kata kunci header, seperti parse_threat_records)
+_COLUMN_ROLES = (
+    ("flow", ("flow",)),
+    ("threat", ("threat", "ancaman")),
+    ("scenario", ("scenario", "skenario")),
+    ("recommendation", ("rekomendasi", "recommendation", "mitigasi")),
+)
+
+
+def _column_roles(table) -> dict:
+    """{peran: indeks kolom}; kolom tanpa peran dikenali memakai header ternormalisasi sebagai peran."""
+    roles = {key: idx for idx, key in table.ciaan_columns()}
+    for role, needles in _COLUMN_ROLES:
+        idx = table.column(*needles)
+        if idx is not None and idx not in roles.values():
+            roles[role] = idx
+    for idx, h in enumerate(table.header):
+        if idx not in roles.values():
+            roles.setdefault("h:" + _row_key(h), idx)
+    return roles
+
+
+def align_threat_tables(results: list):
+    """
+    (header, {peran: indeks kolom}, [(BatchResult, baris)]) dari tabel threat semua hasil yang berhasil.
+    Header mengikuti tabel pertama; sel tabel berikutnya dipetakan lewat nama kolom
+    (urutan/jumlah kolom boleh beda, kolom baru ditambahkan di kanan); semua baris
+    dilebarkan ke header akhir.
+    """
+    header = []
+    positions = {}          # peran → indeks kolom gabungan
+    rows = []
+    for r in sorted(results, key=lambda r: r.index):
+        if not r.ok:
+            continue
+        for table in get_report_document(r.response).tables_of_kind("threat"):
+            roles = _column_roles(table)
+            for role, idx in sorted(roles.items(), key=lambda kv: kv[1]):
+                if role not in positions:
+                    positions[role] = len(header)
+                    header.append(table.header[idx])
+            for row in table.rows:
+                out = [""] * len(header)
+                for role, idx in roles.items():
+                    if idx < len(row):
+                        out[positions[role]] = row[idx]
+                rows.append((r, out))
+    for _r, out in rows:
+        out.extend([""] * (len(header) - len(out)))
+    return header, positions, rows
+
+
+def merge_threat_tables(results: list):
+    """
+    (header, rows, total_baris) tabel threat gabungan (kolom dipetakan seperti
+    align_threat_tables). Baris dengan flow+threat sama (threat_key: kode OWASP/CWE
+    di nama threat diabaikan) digabung: tanda C/I/Au/Av/N di-OR-kan, kolom teks
+    memakai isi pertama yang tidak kosong.
+    """
+    header, positions, aligned = align_threat_tables(results)
+    merged = {}
+    for _r, out in aligned:
+        key = (
+            _row_key(out[positions["flow"]]) if "flow" in positions else "",
+            threat_key(out[positions["threat"]]) if "threat" in positions else threat_key(out[0]),
+        )
+        if key not in merged:
+            merged[key] = out
+            continue
+        existing = merged[key]
+        for idx, value in enumerate(out):
+            if not existing[idx].strip() and value.strip():
+                existing[idx] = value
+    return header or None, list(merged.values()), len(aligned)
+
+
+def merge_dread_scores(results: list) -> list:
+    """[(threat, skor, [nomor bagian])] urut skor tertinggi; skor tertinggi antar bagian dipakai."""
+    by_threat = {}
+    for r in results:
+        if not r.ok:
+            continue
+        for table in get_report_document(r.response).tables_of_kind("dread"):
+            header = [h.lower() for h in table.header]
+            threat_idx = table.column("threat", "ancaman")
+            if threat_idx is None:
+                threat_idx = 0
+            for row in table.rows:
+                threat = row[threat_idx].strip() if threat_idx < len(row) else ""
+                score = dread_score(header, row)
+                if not threat or score is None:
+                    continue
+                key = threat_key(threat)
+                entry = by_threat.setdefault(key, [threat, score, set()])
+                entry[1] = max(entry[1], score)
+                entry[2].add(r.index + 1)
+    return sorted(((t, s, sorted(parts)) for t, s, parts in by_threat.values()), key=lambda x: -x[1])
+
+
+def merge_chunk_results(results: list, name: str, question: str) -> str:
+    """Satu markdown laporan: tabel threat gabungan, ringkasan DREAD, dan bagian yang gagal."""
+    results = sorted(results, key=lambda r: r.index)
+    failed = [r for r in results if not r.ok]
+    header, rows, total_rows = merge_threat_tables(results)
+    scores = merge_dread_scores(results)
+
+    parts = [f"# Analisis Dokumen: {name}", "", f"**Pertanyaan:** {question}", ""]
+    parts.append(
+        f"_{len(results)} bagian dianalisis ({len(failed)} gagal); "
+        f"{len(rows)} threat unik dari {total_rows} baris._"
+    )
+    parts.append("")
+
+    if header:
+        parts.append("## Tabel Threat (Gabungan)")
+        parts.append("")
+        parts.append(to_markdown_table(header, rows))
+        parts.append("")
+
+    if scores:
+        parts.append("## Ringkasan DREAD")
+        parts.append("")
+        parts.append(to_markdown_table(
+            ["THREAT", "SKOR DREAD", "LEVEL", "BAGIAN"],
+            [[t, f"{s:.1f}", dread_level(s), ", ".join(map(str, p))] for t, s, p in scores],
+        ))
+        parts.append("")
+
+    if not header and not scores:
+        # Model tidak mengembalikan tabel: sertakan jawaban per bagian apa adanya
+        for r in results:
+            if r.ok:
+                parts.append(f"## Bagian {r.index + 1}")
+                parts.append("")
+                parts.append(r.response.strip())
+                parts.append("")
+
+    if failed:
+        parts.append("## Bagian Gagal Dianalisis")
+        parts.append("")
+        for r in failed:
+            parts.append(f"- Bagian {r.index + 1} — {r.error}")
+    return "\n".join(parts).strip() + "\n"
@@ -0,0 +1,290 @@
+"""
+Pembuatan laporan threat tanpa Streamlit (bulk/CI).
+
+    # Analisis flow lewat Groq → markdown + PDF/XLSX per flow
+    python cli.py analyze flows.csv login.txt -o hasil/ --format pdf xlsx --merged
+    echo "user login dengan OTP" | python cli.py analyze -o hasil/
+
+    # Ekspor jawaban markdown yang sudah ada → PDF/XLSX
+    python cli.py export laporan1.md laporan2.md -o hasil/ --export-workers 4
+
+Masukan: file CSV/XLSX (satu flow per baris, kolom 'flow' atau kolom pertama),
+file teks lain (seluruh isi = satu flow / satu markdown), atau stdin ('-' atau
+tanpa file; analyze: satu flow per baris, export: seluruh stdin satu markdown).
+
+Request Groq berjalan konkuren lewat GroqScheduler (thread), render PDF/XLSX di
+pool proses yang sama dengan worker ekspor aplikasi; keduanya tumpang tindih,
+jadi ekspor flow pertama berjalan selagi flow lain masih menunggu Groq.
+Ukuran (dan dengan --trace-memory, puncak memori) dicetak per file ekspor; di akhir
+statistik throughput (atau JSON dengan --json).
+Kunci API: --api-key atau GROQ_API_KEY; GROQ_BASE_URL opsional.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import perf
+from batch_analysis import load_flows, merge_batch_results
+from export_pool import _mp_context
+from exporters import render_export, write_pdf
+from groq_scheduler import GroqScheduler
+from threat_analysis import MODEL_OPTIONS, analyze_flows, create_groq_client, system_prompt
+
+FORMATS = ("pdf", "xlsx")
+MERGED_NAME = "laporan_gabungan"
+_SLUG_RE = re.compile(r"[^a-zA-Z0-9]+")
+
+
+def _slug(text: str, limit: int = 40) -> str:
+    return _SLUG_RE.sub("_", text).strip("_").lower()[:limit] or "laporan"
+
+
+def _unique_names(items: list, reserved=()) -> list:
+    """Nama ganda (stem sama dari folder berbeda, slug terpotong) diberi akhiran _2, _3, ..."""
+    used = set(reserved)
+    out = []
+    for name, text in items:
+        unique, n = name, 1
+        while unique in used:
+            n += 1
+            unique = f"{name}_{n}"
+        used.add(unique)
+        out.append((unique, text))
+    return out
+
+
+def read_inputs(paths: list, mode: str) -> list:
+    """
+    [(nama, teks)] dari file / stdin. mode 'analyze' memecah CSV/XLSX & stdin per flow.
+    Nama unik per pemanggilan (dipakai langsung sebagai nama file output).
+    """
+    items = []
+    for path in paths or ["-"]:
+        if path == "-":
+            text = sys.stdin.read()
+            if mode == "analyze":
+                flows = [line.strip() for line in text.splitlines() if line.strip()]
+                items += [(f"{i:03d}_{_slug(flow)}", flow) for i, flow in enumerate(flows, start=1)]
+            elif text.strip():
+                items.append(("stdin", text))
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if mode == "analyze" and path.lower().endswith((".csv", ".xlsx", ".xls")):
+            with open(path, "rb") as f:
+                flows = load_flows(f.read(), path)
+            items += [(f"{_slug(stem)}_{i:03d}", flow) for i, flow in enumerate(flows, start=1)]
+        else:
+            with open(path, encoding="utf-8") as f:
+                items.append((_slug(stem), f.read()))
+    return _unique_names(items, reserved=(MERGED_NAME,) if mode == "analyze" else ())
+
+
+def _render_job(fmt: str, markdown_content: str, path: str, trace_memory: bool = False):
+    """
+    Worker: render lalu tulis langsung ke `path` (PDF di-stream ke file, bytes tidak
+    dikirim balik ke proses induk). Mengembalikan (ukuran, durasi, puncak memori|None).
+    """
+    started = time.perf_counter()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with open(path, "wb") as f:
+            if fmt == "pdf":
+                size = write_pdf(markdown_content, f).size
+            else:
+                size = f.write(render_export(fmt, markdown_content))
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return size, time.perf_counter() - started, peak
+
+
+class ExportWriter:
+    """Render & tulis file ekspor; dengan workers > 0 di pool proses, selain itu sinkron."""
+
+    def __init__(self, out_dir: str, formats, workers: int, trace_memory: bool = False):
+        self.out_dir = out_dir
+        self.formats = formats
+        self.trace_memory = trace_memory
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) if workers > 0 else None
+        self.pending = []
+        self.files = []
+        self.errors = []
+
+    def submit(self, name: str, markdown_content: str) -> None:
+        for fmt in self.formats:
+            path = os.path.join(self.out_dir, f"{name}.{fmt}")
+            args = (fmt, markdown_content, path, self.trace_memory)
+            if self.pool is None:
+                self._collect(path, fmt, lambda: _render_job(*args))
+            else:
+                self.pending.append((path, fmt, self.pool.submit(_render_job, *args)))
+
+    def _collect(self, path: str, fmt: str, result) -> None:
+        try:
+            size, seconds, peak = result()
+        except Exception as e:
+            self.errors.append(f"{os.path.basename(path)}: {e}")
+            return
+        self.files.append({"path": path, "format": fmt, "size": size, "seconds": seconds, "peak_memory": peak})
+        line = f"  {os.path.basename(path)}: {size / 1024:.0f} KB · {seconds:.2f}s"
+        if peak is not None:
+            line += f" · puncak memori {peak / 1024 / 1024:.1f} MB"
+        print(line, file=sys.stderr)
+
+    def close(self) -> None:
+        for path, fmt, future in self.pending:
+            self._collect(path, fmt, future.result)
+        self.pending.clear()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def _write_text(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def run_analyze(args, items: list, writer: ExportWriter) -> dict:
+    api_key = args.api_key or os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        raise SystemExit("Kunci API Groq tidak ditemukan: isi --api-key atau GROQ_API_KEY.")
+    client = create_groq_client(api_key, args.base_url, max_concurrent=args.concurrency)
+    scheduler = GroqScheduler(max_concurrent=args.concurrency, max_retries=args.retries)
+    names = [name for name, _flow in items]
+    flows = [flow for _name, flow in items]
+    fallback = [m for m in MODEL_OPTIONS if m != args.model] if args.fallback else []
+
+    results = []
+    for result in analyze_flows(client, flows, args.model, system_prompt(not args.no_refs), scheduler=scheduler,
+                                concurrency=args.concurrency, retries=args.retries,
+                                fallback_models=fallback, validate_refs=not args.no_refs):
+        results.append(result)
+        status = "ok" if result.ok else f"GAGAL: {result.error}"
+        print(f"[{len(results)}/{len(flows)}] {names[result.index]} · {result.elapsed:.1f}s · {status}",
+              file=sys.stderr)
+        if result.ok:
+            name = names[result.index]
+            _write_text(os.path.join(args.out, f"{name}.md"), result.response)
+            writer.submit(name, result.response)
+
+    if args.merged and any(r.ok for r in results):
+        merged = merge_batch_results(results)
+        _write_text(os.path.join(args.out, f"{MERGED_NAME}.md"), merged)
+        writer.submit(MERGED_NAME, merged)
+    return {
+        "failed": [names[r.index] for r in results if not r.ok],
+        "groq": scheduler.stats(),
+    }
+
+
+def _summary(items: list, writer: ExportWriter, elapsed: float, extra: dict) -> dict:
+    snap = perf.RECORDER.snapshot()
+    seconds = {fmt: [f["seconds"] for f in writer.files if f["format"] == fmt] for fmt in writer.formats}
+    peaks = [f["peak_memory"] for f in writer.files if f["peak_memory"] is not None]
+    summary = {
+        "items": len(items),
+        "failed": extra.get("failed", []),
+        "elapsed": elapsed,
+        "items_per_minute": len(items) / elapsed * 60 if elapsed else 0.0,
+        "files": len(writer.files),
+        "bytes": sum(f["size"] for f in writer.files),
+        "peak_memory_max": max(peaks) if peaks else None,
+        "export_errors": writer.errors,
+        "render_p50": {fmt: perf.percentile(v, 0.50) for fmt, v in seconds.items() if v},
+        "render_p95": {fmt: perf.percentile(v, 0.95) for fmt, v in seconds.items() if v},
+        "exports": writer.files,
+        "tokens": snap["counters"],
+    }
+    if "groq" in extra:
+        request = snap["stages"].get("groq.request", {})
+        summary["groq"] = dict(extra["groq"], request_p50=request.get("p50", 0.0), request_p95=request.get("p95", 0.0))
+    return summary
+
+
+def _print_summary(s: dict) -> None:
+    ok = s["items"] - len(s["failed"])
+    print(f"{ok}/{s['items']} berhasil dalam {s['elapsed']:.1f} detik ({s['items_per_minute']:.1f}/menit) · "
+          f"{s['files']} file, {s['bytes'] / 1024:.0f} KB")
+    for fmt in s["render_p50"]:
+        print(f"  render {fmt}: p50 {s['render_p50'][fmt]:.2f}s / p95 {s['render_p95'][fmt]:.2f}s")
+    if s["peak_memory_max"] is not None:
+        print(f"  puncak memori render terbesar: {s['peak_memory_max'] / 1024 / 1024:.1f} MB")
+    if "groq" in s:
+        g = s["groq"]
+        print(f"  groq: {g['requests']} request, {g['retries']} retry, {g['rate_limited']}x 429 · "
+              f"latensi p50 {g['request_p50']:.2f}s / p95 {g['request_p95']:.2f}s · "
+              f"antre p95 {g['wait_p95']:.2f}s")
+    if s["tokens"]:
+        print("  token: " + ", ".join(f"{k.split('.')[-1]} {v}" for k, v in sorted(s["tokens"].items())))
+    for name in s["failed"]:
+        print(f"  gagal: {name}")
+    for err in s["export_errors"]:
+        print(f"  ekspor gagal: {err}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="*", help="file masukan; '-' atau kosong = stdin")
+    common.add_argument("-o", "--out", default="laporan", help="folder keluaran")
+    common.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS))
+    common.add_argument("--export-workers", type=int, default=os.cpu_count() or 2,
+                        help="proses render PDF/XLSX (0 = sinkron)")
+    common.add_argument("--trace-memory", action="store_true",
+                        help="ukur puncak memori per ekspor (tracemalloc, render lebih lambat)")
+    common.add_argument("--json", action="store_true", help="cetak statistik sebagai JSON")
+
+    analyze = sub.add_parser("analyze", parents=[common], help="analisis flow lewat Groq lalu ekspor")
+    analyze.add_argument("--model", default=MODEL_OPTIONS[0])
+    analyze.add_argument("--concurrency", type=int, default=4, help="request Groq bersamaan")
+    analyze.add_argument("--retries", type=int, default=3)
+    analyze.add_argument("--fallback", action="store_true", help="fallback ke model lain saat dibatasi")
+    analyze.add_argument("--no-refs", action="store_true", help="tanpa validasi CWE/OWASP/ASVS lokal")
+    analyze.add_argument("--merged", action="store_true", help="juga tulis laporan gabungan semua flow")
+    analyze.add_argument("--api-key")
+    analyze.add_argument("--base-url", default=os.environ.get("GROQ_BASE_URL"))
+
+    sub.add_parser("export", parents=[common], help="ekspor markdown yang sudah ada ke PDF/XLSX")
+    args = ap.parse_args(argv)
+
+    items = read_inputs(args.inputs, args.command)
+    if not items:
+        raise SystemExit("Tidak ada masukan.")
+    os.makedirs(args.out, exist_ok=True)
+    perf.RECORDER.enabled = True
+
+    started = time.perf_counter()
+    writer = ExportWriter(args.out, args.format, args.export_workers, trace_memory=args.trace_memory)
+    try:
+        if args.command == "analyze":
+            extra = run_analyze(args, items, writer)
+        else:
+            for name, markdown_content in items:
+                writer.submit(name, markdown_content)
+            extra = {}
+    finally:
+        writer.close()
+    summary = _summary(items, writer, time.perf_counter() - started, extra)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        _print_summary(summary)
+    return 1 if summary["failed"] or summary["export_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
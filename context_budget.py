@@ -0,0 +1,206 @@
+"""
+Manajemen konteks percakapan berbasis budget token.
+
+Setiap jawaban asisten berisi tabel markdown besar, sehingga mengirim seluruh
+riwayat membuat prompt membengkak secara linear. Modul ini:
+- Mengestimasi token secara lokal (tanpa tokenizer eksternal)
+- Menyimpan system prompt + beberapa pesan terakhir apa adanya
+- Mengganti jawaban asisten lama dengan ringkasan terstruktur
+  (flow, threat, CWE, skor DREAD)
+- Membuang pesan paling lama jika budget masih terlampaui
+"""
+import re
+
+from report_model import get_report_document
+
+# Budget token prompt per model (lebih kecil dari context window agar tetap di bawah
+# limit token/menit Groq dan latensi tetap rendah). Bisa dioverride dari UI.
+MODEL_CONTEXT_BUDGETS = {
+    "llama-3.3-70b-versatile": 8000,
+    "qwen/qwen3-32b": 6000,
+    "deepseek-r1-distill-llama-70b": 6000,
+}
+DEFAULT_CONTEXT_BUDGET = 6000
+
+# Overhead format chat per pesan (role, delimiter)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_CWE_RE = re.compile(r"CWE[-\s]?(\d{1,4})", re.I)
+_DREAD_ASSIGN_RE = re.compile(r"=\s*([1-5](?:[.,]\d+)?)")
+_DIGEST_MARKER = "[Ringkasan analisis sebelumnya]"
+
+
+def budget_for_model(model: str) -> int:
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimasi kasar jumlah token BPE: kata panjang dihitung beberapa token,
+    tanda baca (termasuk '|' dan '-' pada tabel) dihitung satu token.
+    """
+    if not text:
+        return 0
+    total = 0
+    for tok in _TOKEN_RE.findall(text):
+        total += 1 + len(tok) // 6
+    return total
+
+
+def estimate_message_tokens(message: dict) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content", ""))
+
+
+# -------------------------
+# Ringkasan jawaban asisten
+# -------------------------
+def _col(header, *needles):
+    for idx, h in enumerate(header):
+        if any(n in h for n in needles):
+            return idx
+    return None
+
+
+def _cell(row, idx):
+    if idx is None or idx >= len(row):
+        return ""
+    return re.sub(r"[*_`]", "", row[idx]).strip()
+
+
+def dread_score(header, row):
+    """Skor DREAD satu baris: kolom skor/rata-rata, atau rata-rata komponen."""
+    score_idx = _col(header, "skor", "score", "rata", "average", "total")
+    if score_idx is not None:
+        m = re.search(r"\d+(?:[.,]\d+)?", _cell(row, score_idx))
+        if m:
+            return float(m.group(0).replace(",", "."))
+    values = [float(v.replace(",", ".")) for v in _DREAD_ASSIGN_RE.findall(" ".join(row))]
+    if not values:
+        for cell in row[1:]:
+            c = cell.strip()
+            if re.fullmatch(r"[1-5](?:[.,]\d+)?", c):
+                values.append(float(c.replace(",", ".")))
+    if values:
+        return sum(values[:5]) / len(values[:5])
+    return None
+
+
+def digest_assistant_message(content: str, max_rows: int = 12) -> str:
+    """
+    Ringkasan ringkas jawaban asisten: satu baris per threat berisi
+    flow, threat, CWE, dan skor DREAD (jika ditemukan).
+    """
+    # threat_records mengimpor dread_score dari modul ini
+    from threat_records import threat_key
+
+    threats = []
+    cwe_by_threat = {}
+    dread_by_threat = {}
+
+    for table in get_report_document(content).tables:
+        header = [h.lower() for h in table.header]
+        rows = table.rows
+        flow_idx = _col(header, "flow")
+        threat_idx = _col(header, "threat", "ancaman", "kerentanan")
+        cwe_idx = _col(header, "cwe")
+        is_dread = table.kind == "dread" or "skor" in " ".join(header)
+
+        for row in rows:
+            threat = _cell(row, threat_idx) or _cell(row, 0)
+            if not threat:
+                continue
+            key = threat_key(threat)
+            cwes = _CWE_RE.findall(_cell(row, cwe_idx) if cwe_idx is not None else " ".join(row))
+            if cwes:
+                cwe_by_threat.setdefault(key, [])
+                for c in cwes:
+                    if f"CWE-{c}" not in cwe_by_threat[key]:
+                        cwe_by_threat[key].append(f"CWE-{c}")
+            if is_dread:
+                score = dread_score(header, row)
+                if score is not None:
+                    dread_by_threat[key] = score
+            elif flow_idx is not None:
+                threats.append((_cell(row, flow_idx), threat))
+
+    if not threats:
+        # Tidak ada tabel threat 9 kolom: pakai threat dari tabel CWE/DREAD
+        threats = [("", t) for t in list(cwe_by_threat) or list(dread_by_threat)]
+
+    lines = [_DIGEST_MARKER]
+    for flow, threat in threats[:max_rows]:
+        key = threat_key(threat)
+        parts = []
+        if flow:
+            parts.append(f"Flow: {flow}")
+        parts.append(f"Threat: {threat}")
+        cwes = cwe_by_threat.get(key) or _CWE_RE.findall(threat)
+        if cwes:
+            parts.append("CWE: " + ", ".join(c if c.startswith("CWE") else f"CWE-{c}" for c in cwes))
+        if key in dread_by_threat:
+            parts.append(f"DREAD: {dread_by_threat[key]:.1f}")
+        lines.append("- " + " | ".join(parts))
+    if len(threats) > max_rows:
+        lines.append(f"- (+{len(threats) - max_rows} threat lain)")
+    if len(lines) == 1:
+        # Jawaban tanpa tabel: potong saja
+        text = " ".join(content.split())
+        lines.append(text[:400] + ("…" if len(text) > 400 else ""))
+    return "\n".join(lines)
+
+
+# -------------------------
+# Penyusunan konteks
+# -------------------------
+def build_context(system_message: dict, history: list, model: str,
+                  budget: int = None, keep_recent: int = 3):
+    """
+    Susun pesan yang dikirim ke model agar muat dalam `budget` token.
+
+    - System prompt dan `keep_recent` pesan terakhir selalu dikirim apa adanya
+    - Jawaban asisten yang lebih lama diganti ringkasannya
+    - Jika masih melebihi budget, pesan paling lama dibuang
+
+    Mengembalikan (messages, report) dengan report berisi estimasi token.
+    """
+    budget = budget or budget_for_model(model)
+    recent = history[-keep_recent:] if keep_recent > 0 else []
+    older = history[:len(history) - len(recent)]
+
+    digested = 0
+    compacted = []
+    for msg in older:
+        if msg.get("role") == "assistant":
+            compacted.append({"role": "assistant", "content": digest_assistant_message(msg["content"])})
+            digested += 1
+        else:
+            compacted.append({"role": msg["role"], "content": msg["content"]})
+
+    fixed = [system_message] + [{"role": m["role"], "content": m["content"]} for m in recent]
+    fixed_tokens = sum(estimate_message_tokens(m) for m in fixed)
+    older_tokens = [estimate_message_tokens(m) for m in compacted]
+
+    dropped = 0
+    total = fixed_tokens + sum(older_tokens)
+    while compacted and total > budget:
+        compacted.pop(0)
+        total -= older_tokens.pop(0)
+        dropped += 1
+    # Jangan mulai riwayat dengan jawaban asisten tanpa pertanyaannya
+    if compacted and compacted[0]["role"] == "assistant" and dropped:
+        compacted.pop(0)
+        total -= older_tokens.pop(0)
+        dropped += 1
+
+    messages = [system_message] + compacted + fixed[1:]
+    report = {
+        "budget": budget,
+        "prompt_tokens_est": total,
+        "system_tokens_est": estimate_message_tokens(system_message),
+        "messages_sent": len(messages),
+        "digested": digested,
+        "dropped": dropped,
+        "over_budget": total > budget,
+    }
+    return messages, report
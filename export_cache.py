@@ -0,0 +1,182 @@
+"""
+Cache ekspor berbasis konten (content-addressed) untuk PDF/Excel.
+
+Kunci = sha256(jenis ekspor + pengaturan + isi markdown), sehingga pesan
+yang sama tidak perlu di-render ulang di setiap rerun Streamlit.
+- LRU terbatas (jumlah entri & total byte)
+- Opsional: entri yang tergusur di-spill ke disk
+- Counter hit/miss/eviction untuk observasi
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def make_export_key(kind: str, content: str, **settings) -> str:
+    """
+    Hash stabil untuk satu ekspor. `settings` diserialisasi dengan key terurut
+    agar urutan argumen tidak memengaruhi kunci.
+    """
+    h = hashlib.sha256()
+    h.update(kind.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    h.update(b"\0")
+    h.update((content or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return int(getattr(value, "nbytes", 0) or 0)
+
+
+class ExportCache:
+    """
+    LRU thread-safe (sesi Streamlit berjalan di thread berbeda).
+    Nilai kosong/None tidak disimpan agar kegagalan render tidak ikut di-cache.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024,
+                 spill_dir: str = None, max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max(0, int(max_disk_bytes or 0))
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    # ---- memori ----
+    def get(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+        value = self._load_spilled(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value) -> None:
+        if not value:
+            return
+        spilled = []
+        with self._lock:
+            if key in self._data:
+                self._bytes -= _sizeof(self._data.pop(key))
+            self._data[key] = value
+            self._bytes += _sizeof(value)
+            while len(self._data) > self.max_entries or (
+                self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1
+            ):
+                old_key, old_value = self._data.popitem(last=False)
+                self._bytes -= _sizeof(old_value)
+                self.evictions += 1
+                spilled.append((old_key, old_value))
+        for old_key, old_value in spilled:
+            self._spill(old_key, old_value)
+
+    def get_or_create(self, key: str, factory):
+        """
+        Ambil dari cache; jika tidak ada, panggil `factory()` di luar lock
+        (render bisa lama) lalu simpan hasilnya.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = factory()
+        self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    # ---- spill ke disk ----
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key[:2], f"{key}.pkl")
+
+    def _spill(self, key: str, value) -> None:
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except Exception:
+            pass
+
+    def _load_spilled(self, key: str):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path, None)
+            return value
+        except Exception:
+            return None
+
+    def _prune_disk(self) -> None:
+        if not self.max_disk_bytes:
+            return
+        files = []
+        total = 0
+        for root, _dirs, names in os.walk(self.spill_dir):
+            for name in names:
+                if not name.endswith(".pkl"):
+                    continue
+                p = os.path.join(root, name)
+                try:
+                    st_ = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st_.st_mtime, st_.st_size, p))
+                total += st_.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _mtime, size, p in sorted(files):
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+            if total <= self.max_disk_bytes:
+                break
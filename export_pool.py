@@ -0,0 +1,216 @@
+"""
+Pool proses untuk render PDF/Excel di latar belakang.
+
+pisa.CreatePDF dan styling openpyxl bersifat CPU-bound dan sinkron; jika dijalankan
+di thread skrip Streamlit, chat membeku selama render. ExportExecutor:
+- Menjalankan job di ProcessPoolExecutor (dibagi antar sesi dalam satu server)
+- Men-deduplikasi job dengan kunci cache yang sama
+- Mendukung timeout per job dan pembatalan; timeout dihitung sejak job mulai
+  berjalan di worker (bukan sejak masuk antrean), dan job yang macet melewati
+  timeout membuat pool didaur ulang (worker dihentikan, job lain dikirim ulang)
+- Status di-poll oleh UI (tanpa menunggu/blocking)
+"""
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from exporters import render_export
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_TIMEOUT = "timeout"
+JOB_CANCELLED = "cancelled"
+
+
+@dataclass
+class ExportJob:
+    id: int
+    fmt: str
+    key: str
+    future: object
+    timeout: float
+    content: str = ""
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: float = None        # pertama kali terlihat berjalan di worker (poll)
+    state: str = JOB_PENDING
+
+
+def _mp_context(preload=("exporters", "pandas", "xhtml2pdf.pisa")):
+    """
+    forkserver (POSIX): worker di-fork dari proses bersih yang sudah memuat
+    modul `preload`, bukan dari server Streamlit yang multi-thread. spawn sebagai cadangan.
+    pandas/xhtml2pdf dimuat di sini karena exporters mengimpornya secara lazy.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(list(preload))
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class ExportExecutor:
+    def __init__(self, max_workers: int = 2, default_timeout: float = 120.0, max_jobs: int = 256):
+        self.max_workers = max(1, int(max_workers))
+        self.default_timeout = float(default_timeout)
+        self.max_jobs = max_jobs
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_mp_context())
+        self._jobs = {}
+        self._by_key = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.recycled = 0
+
+    def submit(self, fmt: str, markdown_content: str, key: str = None, timeout: float = None) -> int:
+        """
+        Kirim job render; jika job dengan `key` yang sama masih tercatat, id job
+        tersebut dikembalikan (dua sesi yang meminta file sama hanya me-render sekali).
+        """
+        with self._lock:
+            if key and key in self._by_key:
+                job = self._jobs.get(self._by_key[key])
+                if job and job.state in (JOB_PENDING, JOB_DONE):
+                    return job.id
+            future = self._pool.submit(render_export, fmt, markdown_content)
+            job = ExportJob(id=next(self._ids), fmt=fmt, key=key, future=future,
+                            timeout=timeout or self.default_timeout, content=markdown_content)
+            self._jobs[job.id] = job
+            if key:
+                self._by_key[key] = job.id
+            self._prune_locked()
+            return job.id
+
+    def poll(self, job_id: int):
+        """(state, hasil): hasil = bytes jika done, pesan error jika gagal, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return JOB_CANCELLED, None
+
+        if job.state == JOB_PENDING:
+            if job.future.done():
+                return self._collect(job)
+            now = time.monotonic()
+            if job.started_at is None and self._is_executing(job):
+                job.started_at = now
+            if job.started_at is not None and now - job.started_at > job.timeout:
+                # Job yang sudah berjalan tidak bisa dibatalkan lewat future: worker-nya dihentikan
+                if not job.future.cancel():
+                    self._recycle_pool(job)
+                self._finish(job, JOB_TIMEOUT)
+                self.timed_out += 1
+                return JOB_TIMEOUT, f"Melebihi batas waktu {job.timeout:.0f} detik"
+            return JOB_PENDING, None
+
+        if job.state == JOB_DONE:
+            return JOB_DONE, job.future.result()
+        if job.state == JOB_ERROR:
+            return JOB_ERROR, str(job.future.exception())
+        return job.state, None
+
+    def cancel(self, job_id: int) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.state != JOB_PENDING:
+            return False
+        cancelled = job.future.cancel()
+        self._finish(job, JOB_CANCELLED)
+        return cancelled
+
+    def forget(self, job_id: int) -> None:
+        """Hapus job dari registry setelah hasilnya dipindah ke cache ekspor."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job and job.key and self._by_key.get(job.key) == job_id:
+                del self._by_key[job.key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.state == JOB_PENDING)
+        return {
+            "workers": self.max_workers,
+            "pending": pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "recycled": self.recycled,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---- internal ----
+    def _is_executing(self, job: ExportJob) -> bool:
+        """
+        True jika job sedang dikerjakan worker. future.running() juga True untuk job
+        yang sudah dipindah ke antrean panggilan pool tapi masih menunggu worker;
+        antrean itu FIFO, jadi yang benar-benar berjalan adalah `max_workers` job
+        running paling awal.
+        """
+        with self._lock:
+            running = [j for j in self._jobs.values() if j.state == JOB_PENDING and j.future.running()]
+        return job in running[:self.max_workers]
+
+    def _recycle_pool(self, stuck: ExportJob) -> None:
+        """
+        Ganti pool yang menjalankan job macet: worker lama dihentikan (render yang hang
+        tidak menahan worker selamanya) dan job lain yang masih pending dikirim ulang.
+        """
+        with self._lock:
+            old = self._pool
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_mp_context())
+            for job in self._jobs.values():
+                if job is stuck or job.state != JOB_PENDING or job.future.done():
+                    continue
+                job.future.cancel()
+                job.future = self._pool.submit(render_export, job.fmt, job.content)
+                job.submitted_at = time.monotonic()
+                job.started_at = None
+            self.recycled += 1
+        terminate = getattr(old, "terminate_workers", None)      # Python 3.14+
+        if terminate is not None:
+            terminate()
+        else:
+            for process in list((getattr(old, "_processes", None) or {}).values()):
+                process.terminate()
+        old.shutdown(wait=False, cancel_futures=True)
+
+    def _collect(self, job: ExportJob):
+        try:
+            result = job.future.result()
+        except CancelledError:
+            self._finish(job, JOB_CANCELLED)
+            return JOB_CANCELLED, None
+        except Exception as e:
+            self._finish(job, JOB_ERROR)
+            self.failed += 1
+            return JOB_ERROR, str(e)
+        self._finish(job, JOB_DONE)
+        self.completed += 1
+        return JOB_DONE, result
+
+    def _finish(self, job: ExportJob, state: str) -> None:
+        with self._lock:
+            job.state = state
+            if state not in (JOB_PENDING, JOB_DONE) and job.key and self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+
+    def _prune_locked(self) -> None:
+        """Batasi registry: buang job selesai paling lama (hasil besar tidak ditahan selamanya)."""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in sorted(self._jobs):
+            job = self._jobs[job_id]
+            if job.state != JOB_PENDING:
+                del self._jobs[job_id]
+                if job.key and self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+            if len(self._jobs) <= self.max_jobs:
+                break
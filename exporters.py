@@ -0,0 +1,651 @@
+"""
+Eksportir PDF (xhtml2pdf) dan Excel (openpyxl/xlsxwriter) untuk output asisten.
+
+Dipisah dari skrip Streamlit agar bisa diimpor ulang (benchmark, worker proses,
+cli.py) tanpa menjalankan halaman aplikasi. Streamlit hanya diimpor oleh
+pembungkus UI create_* saat menampilkan error.
+"""
+import os
+import re
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+
+import perf
+# xhtml2pdf (PDF) dan pandas (Excel) diimpor di dalam fungsi render: keduanya
+# butuh ratusan ms saat impor pertama, sementara halaman login/chat tidak
+# membutuhkannya sampai ada ekspor.
+from report_model import get_report_document, is_threat_table_header
+from threat_records import get_threat_records
+
+# =========================
+# 1) PDF Utilities (rapi)
+# =========================
+# Pola dikompilasi sekali per proses; dipakai dengan search(pos, endpos) agar tidak
+# membuat salinan substring per tabel.
+_TABLE_OPEN_RE = re.compile(r"<table[^>]*>", re.I)
+_TABLE_CLOSE_RE = re.compile(r"</table>", re.I)
+_THEAD_RE = re.compile(r"<thead", re.I)
+_FIRST_ROW_RE = re.compile(r"<tr[^>]*>(.*?)</tr>", re.I | re.S)
+_HEADER_CELL_RE = re.compile(r"<t[hd][^>]*>(.*?)</t[hd]>", re.I | re.S)
+_THEAD_TARGET_RE = re.compile(r"(<table[^>]*>\s*)(<tr[^>]*>.*?</tr>)", re.I | re.S)
+_STRIP_TAGS_RE = re.compile(r"<[^>]+>")
+
+# target: 9 kolom → 18,22,4,4,4,4,4,22,18
+_THREAT_TABLE_WIDTHS = [18, 22, 4, 4, 4, 4, 4, 22, 18]
+
+
+def _colgroup_for_header(headers_text) -> str:
+    """<colgroup> untuk tabel threat yang dikenali, atau '' jika bukan tabel target."""
+    if not headers_text or not is_threat_table_header(headers_text):
+        return ""
+    n = len(headers_text)
+    if n == 9:
+        weights = _THREAT_TABLE_WIDTHS
+    else:
+        weights = [20, 20] + [int(60 / max(1, n - 2))] * (n - 2)
+    return "<colgroup>" + "".join([f'<col style="width:{w}%;"/>' for w in weights]) + "</colgroup>"
+
+
+@perf.timed("pdf.shape_tables")
+def _shape_tables_for_pdf(raw_html: str) -> str:
+    """
+    Post-process HTML agar tabel lebih rapi untuk xhtml2pdf:
+    - Tambahkan <thead> pada baris header
+    - Tambahkan <colgroup> dengan lebar kolom yang presisi jika header cocok
+    - Rapikan sel & mencegah baris terbelah
+    Satu lintasan maju dengan pola terkompilasi: tiap tabel hanya dipindai dalam
+    batas <table>…</table>-nya, sisipan dikumpulkan lalu digabung sekali.
+    Hasil identik dengan versi re.sub bersarang sebelumnya.
+    """
+    out = []
+    last = 0
+    pos = 0
+    n = len(raw_html)
+
+    while pos < n:
+        t_open = _TABLE_OPEN_RE.search(raw_html, pos)
+        if not t_open:
+            break
+        t_close = _TABLE_CLOSE_RE.search(raw_html, t_open.end())
+        if not t_close:
+            break   # tabel tanpa penutup: sisa dokumen dibiarkan apa adanya
+        start, end = t_open.start(), t_close.end()
+
+        inserts = []
+        row = _FIRST_ROW_RE.search(raw_html, start, end)
+        if row:
+            headers = [_STRIP_TAGS_RE.sub("", h).strip().lower()
+                       for h in _HEADER_CELL_RE.findall(raw_html, row.start(1), row.end(1))]
+            colgroup = _colgroup_for_header(headers)
+            if colgroup:
+                inserts.append((t_open.end(), colgroup))
+
+        if not _THEAD_RE.search(raw_html, start, end):
+            target = _THEAD_TARGET_RE.search(raw_html, start, end)
+            if target:
+                inserts.append((target.start(2), "<thead>"))
+                inserts.append((target.end(2), "</thead>"))
+
+        for at, text in sorted(inserts, key=lambda x: x[0]):
+            out.append(raw_html[last:at])
+            out.append(text)
+            last = at
+        pos = end
+
+    if not out:
+        return raw_html
+    out.append(raw_html[last:])
+    return "".join(out)
+
+
+class ExportError(Exception):
+    """Kegagalan render PDF/Excel yang pesannya layak ditampilkan ke pengguna."""
+
+
+@dataclass
+class ExportStats:
+    size: int                       # byte file keluaran
+    peak_memory: int = None         # byte (tracemalloc), hanya bila EXPORT_TRACE_MEMORY aktif
+
+
+# Font PDF: 'helvetica' (font bawaan PDF, tidak disematkan) atau 'dejavu' (DejaVuSans.ttf
+# yang dibundel: panah, bullet, ≥ dsb. tampil). Dibaca dari environment agar worker
+# proses memakai pengaturan yang sama; nilainya ikut kunci cache ekspor.
+PDF_FONT = os.environ.get("EXPORT_PDF_FONT", "helvetica").strip().lower()
+# Ukur puncak memori per ekspor PDF (tracemalloc memperlambat render; default mati)
+TRACE_EXPORT_MEMORY = os.environ.get("EXPORT_TRACE_MEMORY", "").lower() in ("1", "true", "yes")
+
+_FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+_DEJAVU_BOLD_PATHS = (
+    os.path.join(_FONT_DIR, "DejaVuSans-Bold.ttf"),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+)
+
+
+@lru_cache(maxsize=1)
+def _register_dejavu() -> str:
+    """
+    Daftarkan DejaVuSans ke reportlab sekali per proses (bukan @font-face per dokumen).
+    reportlab hanya menyematkan subset glyph yang dipakai, bukan TTF 740 KB utuh.
+    Tebal memakai DejaVuSans-Bold.ttf bila ada (di samping modul ini atau font
+    sistem), selain itu bobot normal.
+    """
+    import xhtml2pdf.default
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont("DejaVuSans", os.path.join(_FONT_DIR, "DejaVuSans.ttf")))
+    bold = next((p for p in _DEJAVU_BOLD_PATHS if os.path.exists(p)), None)
+    if bold:
+        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", bold))
+    bold_name = "DejaVuSans-Bold" if bold else "DejaVuSans"
+    pdfmetrics.registerFontFamily("DejaVuSans", normal="DejaVuSans", bold=bold_name,
+                                  italic="DejaVuSans", boldItalic=bold_name)
+    xhtml2pdf.default.DEFAULT_FONT["dejavusans"] = "DejaVuSans"
+    return "DejaVuSans"
+
+
+@contextmanager
+def _traced_memory():
+    """
+    Puncak memori blok via tracemalloc; pemanggil membaca hasilnya setelah blok.
+    None bila tidak diukur atau tracemalloc sudah dipakai pihak lain (mis. render
+    bersamaan di thread lain, benchmark).
+    """
+    result = [None]
+    if not TRACE_EXPORT_MEMORY or tracemalloc.is_tracing():
+        yield lambda: result[0]
+        return
+    tracemalloc.start()
+    try:
+        yield lambda: result[0]
+    finally:
+        result[0] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+# Template HTML PDF dibentuk sekali per proses (bukan f-string besar per ekspor);
+# isi dokumen disisipkan di antara HEAD dan TAIL.
+_PDF_HTML_HEAD = """
+    <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                @page { margin: 1.3cm; }
+                body {
+                    font-family: Helvetica, Arial, sans-serif;
+                    font-size: 10pt;
+                    line-height: 1.35;
+                }
+                h1, h2, h3, h4 { margin: 8px 0 6px; font-weight: bold; }
+                p { margin: 4px 0; }
+
+                table {
+                    border-collapse: collapse;
+                    width: 100%;
+                    table-layout: fixed;
+                    margin: 8px 0;
+                    page-break-inside: auto;
+                    -pdf-keep-in-frame: auto;
+                }
+                thead { display: table-header-group; }
+                tr { page-break-inside: avoid; }
+                th, td {
+                    border: 0.8pt solid #444;
+                    padding: 6px 6px;
+                    vertical-align: top;
+                    word-wrap: break-word;
+                    white-space: pre-wrap;
+                    font-size: 9pt;
+                }
+                th {
+                    background-color: #f0f0f0;
+                    font-weight: bold;
+                    text-align: center;
+                }
+                /* Pusatkan kolom CIA/Av/Au/N jika ada */
+                th:nth-child(3), th:nth-child(4), th:nth-child(5), th:nth-child(6), th:nth-child(7),
+                td:nth-child(3), td:nth-child(4), td:nth-child(5), td:nth-child(6), td:nth-child(7) {
+                    text-align: center;
+                    width: 4%;
+                }
+                pre, code {
+                    background-color: #f4f4f4;
+                    padding: 2px 4px;
+                    border: 1px solid #ddd;
+                    border-radius: 3px;
+                    font-family: 'Courier New', monospace;
+                    white-space: pre-wrap;
+                    word-wrap: break-word;
+                    font-size: 8pt;
+                }
+            </style>
+        </head>
+        <body>
+            """
+_PDF_HTML_TAIL = """
+        </body>
+    </html>
+    """
+_PDF_HTML_HEAD_DEJAVU = _PDF_HTML_HEAD.replace(
+    "font-family: Helvetica, Arial, sans-serif;", "font-family: DejaVuSans, Helvetica, sans-serif;"
+)
+
+
+def _pdf_html_head() -> str:
+    if PDF_FONT == "dejavu":
+        _register_dejavu()
+        return _PDF_HTML_HEAD_DEJAVU
+    return _PDF_HTML_HEAD
+
+
+def render_pdf_bytes(markdown_content: str, doc=None) -> bytes:
+    """
+    PDF generator dengan styling tabel yang sudah dibereskan:
+    - Header tabel diulang (thead)
+    - Lebar kolom diatur (colgroup)
+    - Wrap teks, border rapi, baris tidak terbelah
+    Tanpa pemanggilan Streamlit (aman untuk worker proses); gagal → ExportError.
+    """
+    out = BytesIO()
+    write_pdf(markdown_content, out, doc=doc)
+    return out.getvalue()      # berbagi buffer BytesIO, tanpa salinan
+
+
+@perf.timed("export.pdf")
+def write_pdf(markdown_content: str, dest, doc=None) -> ExportStats:
+    """
+    Seperti render_pdf_bytes, tetapi PDF ditulis langsung ke file biner `dest`
+    (mis. file keluaran CLI) tanpa menahan bytes hasil di memori.
+    Ukuran & puncak memori dicatat ke perf (pdf.output_bytes, pdf.peak_memory_bytes).
+    """
+    with _traced_memory() as peak:
+        doc = doc or get_report_document(markdown_content)
+        size = write_html_pdf(_shape_tables_for_pdf(doc.html), dest)
+    stats = ExportStats(size=size, peak_memory=peak())
+    perf.observe("pdf.output_bytes", stats.size)
+    perf.observe("pdf.peak_memory_bytes", stats.peak_memory)
+    return stats
+
+
+def render_html_pdf_bytes(html_string: str) -> bytes:
+    """Potongan HTML body → PDF dengan template/CSS ekspor yang sama; gagal → ExportError."""
+    out = BytesIO()
+    write_html_pdf(html_string, out)
+    return out.getvalue()
+
+
+def write_html_pdf(html_string: str, dest) -> int:
+    """Potongan HTML body → PDF ke file biner `dest`; mengembalikan jumlah byte yang ditulis."""
+    from xhtml2pdf import pisa
+
+    # str langsung ke pisa: tanpa salinan encode UTF-8 (dan decode ulang di parser)
+    full_html = "".join((_pdf_html_head(), html_string, _PDF_HTML_TAIL))
+    start = dest.tell()
+    with perf.span("pdf.pisa"):
+        pisa_status = pisa.CreatePDF(full_html, dest=dest, encoding="UTF-8")
+    if pisa_status.err:
+        raise ExportError(pisa_status.err)
+    return dest.tell() - start
+
+
+def _ui_error(message: str) -> None:
+    """Tampilkan error di halaman Streamlit (hanya dipakai pembungkus UI)."""
+    import streamlit as st
+    st.error(message)
+
+
+def create_pdf_with_xhtml2pdf(markdown_content, filename="alfa_threat_analysis.pdf", doc=None):
+    """
+    Bungkus render_pdf_bytes untuk UI: kesalahan ditampilkan via st.error.
+    Mengembalikan bytes PDF (untuk st.download_button) atau None jika gagal.
+    """
+    try:
+        return render_pdf_bytes(markdown_content, doc=doc)
+    except ExportError as e:
+        _ui_error(f"Gagal membuat PDF: {e}")
+    except Exception as e:
+        _ui_error(f"Terjadi kesalahan saat membuat PDF: {e}")
+    return None
+
+
+# =========================
+# 2) Excel Utilities (super rapi)
+# =========================
+def _clean_sheet_name(name: str) -> str:
+    cleaned = re.sub(r'[:\\/\?\*\[\]]', ' ', name).strip()
+    return (cleaned[:31] or "Sheet") if cleaned else "Sheet"
+
+# Jumlah baris total minimal agar render_excel_bytes otomatis memakai jalur cepat
+FAST_EXCEL_MIN_ROWS = 500
+
+
+def _strip_frame(df):
+    """Pengganti df.applymap(str.strip): strip per kolom secara vektor, NaN dibiarkan."""
+    import pandas as pd
+
+    out = df.copy()
+    for i in range(out.shape[1]):
+        s = out.iloc[:, i]
+        if s.dtype == object or pd.api.types.is_string_dtype(s):
+            out.iloc[:, i] = s.where(s.isna(), s.astype(str).str.strip())
+    return out
+
+
+def _column_profile(df):
+    """
+    Dihitung sekali per DataFrame (vektor per kolom, bukan per sel):
+    - widths: lebar kolom = min(max(12, panjang_maks + 2), 60), panjang dibatasi 80
+    - numeric: kolom yang mayoritas nilainya angka (untuk color scale)
+    - numbers: nilai numerik hasil konversi (NaN jika bukan angka)
+    """
+    import pandas as pd
+
+    widths, numeric, numbers = [], [], []
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        lengths = s.fillna("").astype(str).str.len().clip(upper=80)
+        max_len = max(min(len(str(col)), 80), int(lengths.max()) if len(lengths) else 0)
+        widths.append(min(max(12, max_len + 2), 60))
+        num = pd.to_numeric(s, errors="coerce")
+        numbers.append(num)
+        numeric.append(bool(num.notna().sum() >= max(1, len(num) // 2)))
+    return {"widths": widths, "numeric": numeric, "numbers": numbers}
+
+
+def _with_numbers(df, profile):
+    """Sel angka di kolom numerik ditulis sebagai angka (agar color scale bekerja)."""
+    # dtype object: pandas 3 menolak angka di kolom bertipe string
+    out = df.astype(object)
+    for i, is_num in enumerate(profile["numeric"]):
+        if is_num:
+            num = profile["numbers"][i]
+            out.iloc[:, i] = num.astype(object).where(num.notna(), df.iloc[:, i])
+    return out
+
+
+@perf.timed("excel.style")
+def _openpyxl_style_table(ws, df, profile=None):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+    from openpyxl.formatting.rule import ColorScaleRule
+
+    max_row = ws.max_row
+    max_col = ws.max_column
+    if max_row < 1 or max_col < 1:
+        return
+
+    ref = f"A1:{get_column_letter(max_col)}{max_row}"
+    try:
+        t = Table(displayName=f"T_{ws.title.replace(' ', '_')}", ref=ref)
+        style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
+                               showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+        t.tableStyleInfo = style
+        ws.add_table(t)
+    except Exception:
+        pass
+
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = ref
+
+    profile = profile or _column_profile(df)
+
+    # Satu objek style dipakai bersama (openpyxl meng-intern style; tidak perlu dibuat per sel).
+    # Alignment tetap di-set per sel: openpyxl menulis sel berisi tanpa atribut style,
+    # dan Excel tidak memakai style kolom/baris untuk sel seperti itu.
+    header_font = Font(bold=True)
+    wrap = Alignment(wrap_text=True, vertical="top")
+    for cell in ws[1]:
+        cell.font = header_font
+    for row in ws.iter_rows(min_row=1, max_row=max_row, max_col=max_col):
+        for cell in row:
+            cell.alignment = wrap
+
+    for col_idx, width in enumerate(profile["widths"], start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    numeric_cols = [j for j, is_num in enumerate(profile["numeric"], start=1) if is_num]
+    if numeric_cols:
+        for j in numeric_cols:
+            col_letter = get_column_letter(j)
+            rng = f"{col_letter}2:{col_letter}{max_row}"
+            try:
+                rule = ColorScaleRule(start_type="min", mid_type="percentile", end_type="max",
+                                      mid_value=50)
+                ws.conditional_formatting.add(rng, rule)
+            except Exception:
+                pass
+
+    try:
+        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+        ws.page_setup.fitToWidth = 1
+        ws.page_setup.fitToHeight = 0
+        ws.sheet_properties.pageSetUpPr.fitToPage = True
+        ws.print_title_rows = "1:1"
+        ws.page_margins.left = ws.page_margins.right = 0.4
+        ws.page_margins.top = ws.page_margins.bottom = 0.5
+    except Exception:
+        pass
+
+@perf.timed("excel.style")
+def _xlsxwriter_style_table(workbook, worksheet, df, profile=None):
+    wrap = workbook.add_format({'text_wrap': True, 'valign': 'top'})
+    worksheet.set_column(0, len(df.columns) - 1, 12, wrap)
+    worksheet.freeze_panes(1, 0)
+
+    rows = len(df.index)
+    cols = len(df.columns)
+
+    try:
+        worksheet.add_table(0, 0, rows, cols - 1, {
+            'columns': [{'header': str(h)} for h in df.columns],
+            'style': 'Table Style Medium 9',
+            'autofilter': True
+        })
+    except Exception:
+        pass
+
+    profile = profile or _column_profile(df)
+    for i, width in enumerate(profile["widths"]):
+        worksheet.set_column(i, i, width, wrap)
+
+    for i, is_num in enumerate(profile["numeric"]):
+        if is_num:
+            worksheet.conditional_format(1, i, rows, i, {'type': '3_color_scale'})
+
+    worksheet.set_landscape()
+    worksheet.fit_to_pages(1, 0)
+    worksheet.set_margins(left=0.4, right=0.4, top=0.5, bottom=0.5)
+
+@lru_cache(maxsize=None)
+def _has_module(name: str) -> bool:
+    """Hasil dicache per proses: impor yang gagal tidak diulang di setiap ekspor."""
+    try:
+        __import__(name)
+        return True
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=1)
+def excel_engine():
+    """Engine Excel yang tersedia ('openpyxl' diutamakan, lalu 'xlsxwriter') atau None; dideteksi sekali."""
+    for name in ("openpyxl", "xlsxwriter"):
+        if _has_module(name):
+            return name
+    return None
+
+
+def _write_workbook_fast(output, sheets):
+    """
+    Jalur cepat xlsxwriter (constant_memory): baris ditulis berurutan dengan
+    write_row, format diterapkan per kolom/rentang, bukan per sel.
+    Excel Table (banded) diganti autofilter + header tebal karena tabel tidak
+    bisa dibuat di mode constant_memory.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    try:
+        wrap = workbook.add_format({"text_wrap": True, "valign": "top"})
+        header_fmt = workbook.add_format({"bold": True, "text_wrap": True, "valign": "top",
+                                          "bg_color": "#DCE6F1", "border": 1})
+        for sheet_name, df in sheets:
+            profile = _column_profile(df)
+            ws = workbook.add_worksheet(sheet_name)
+            rows, cols = len(df.index), len(df.columns)
+            for i, width in enumerate(profile["widths"]):
+                ws.set_column(i, i, width, wrap)
+
+            ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+            values = _with_numbers(df, profile).astype(object)
+            values = values.where(values.notna(), None)
+            for r, record in enumerate(values.itertuples(index=False, name=None), start=1):
+                ws.write_row(r, 0, record)
+
+            ws.freeze_panes(1, 0)
+            if cols:
+                ws.autofilter(0, 0, rows, cols - 1)
+            for i, is_num in enumerate(profile["numeric"]):
+                if is_num and rows:
+                    ws.conditional_format(1, i, rows, i, {"type": "3_color_scale"})
+            ws.set_landscape()
+            ws.fit_to_pages(1, 0)
+            ws.repeat_rows(0)
+            ws.set_margins(left=0.4, right=0.4, top=0.5, bottom=0.5)
+    finally:
+        workbook.close()
+
+
+def _parse_markdown_tables_simple(md_text):
+    """
+    Parse tabel Markdown (| col | ...) lewat model dokumen.
+    Kembalikan list DataFrame.
+    """
+    return [t.to_dataframe() for t in get_report_document(md_text).tables]
+
+def _summary_frames(records) -> list:
+    """
+    Sheet ringkasan dari ThreatRecords: risiko per flow, top DREAD, jumlah per CWE.
+    dtype object seperti tabel markdown, agar profil kolom/konversi angka sama.
+    """
+    if not len(records):
+        return []
+    import pandas as pd
+
+    frames = [("Risiko Flow", pd.DataFrame([
+        {"FLOW": r["flow"], "JUMLAH THREAT": r["threats"], "DREAD MAKS": r["dread_max"],
+         "DREAD RATA-RATA": r["dread_mean"], "C/I/Au/Av/N": r["ciaan"]}
+        for r in records.flow_risk()
+    ], dtype=object))]
+    top = records.top_by_dread(10)
+    if top:
+        rows = records.rows()
+        frames.append(("Top DREAD", pd.DataFrame([
+            {"THREAT": rows[i]["threat"], "FLOW": rows[i]["flow"], "SKOR DREAD": rows[i]["dread"],
+             "CWE": ", ".join(rows[i]["cwes"])}
+            for i in top
+        ], dtype=object)))
+    counts = records.cwe_counts()
+    if counts:
+        frames.append(("CWE", pd.DataFrame(counts, columns=["CWE", "JUMLAH THREAT"], dtype=object)))
+    return frames
+
+
+@perf.timed("export.xlsx")
+def render_excel_bytes(markdown_content: str, doc=None, fast: bool = None) -> bytes:
+    """
+    Mengubah output markdown asisten menjadi file Excel yang rapi:
+    - Tiap tabel → sheet sebagai Excel Table (banded rows, filter)
+    - Tidak ada tabel → sheet 'Output' berisi teks (1 kolom)
+    - Freeze header, wrap text, auto-fit kolom, print setup, conditional formatting numerik
+    - Sheet ringkasan (risiko per flow, top DREAD, CWE) dari ThreatRecords
+    Tabel diambil dari model dokumen (tanpa markdown2 + read_html ulang).
+    Tanpa pemanggilan Streamlit (aman untuk worker proses); gagal → ExportError.
+
+    fast=None → jalur cepat otomatis dipakai bila total baris ≥ FAST_EXCEL_MIN_ROWS
+    dan xlsxwriter tersedia (constant_memory, format per kolom).
+    """
+    import pandas as pd
+
+    doc = doc or get_report_document(markdown_content)
+    tables = [t.to_dataframe() for t in doc.tables]
+
+    only_text_mode = False
+    if not tables:
+        only_text_mode = True
+        tables = [pd.DataFrame({"Output": [markdown_content]})]
+
+    sheets = []
+    for idx, df in enumerate(tables, start=1):
+        sheet_name = "Output" if (only_text_mode and idx == 1) else f"Table{idx}"
+        sheets.append((_clean_sheet_name(sheet_name), _strip_frame(df)))
+    if not only_text_mode:
+        for sheet_name, df in _summary_frames(get_threat_records(markdown_content)):
+            sheets.append((_clean_sheet_name(sheet_name), _strip_frame(df)))
+    return write_workbook(sheets, fast=fast)
+
+
+@perf.timed("excel.write")
+def write_workbook(sheets: list, fast: bool = None) -> bytes:
+    """
+    [(nama sheet, DataFrame)] → bytes XLSX dengan styling ekspor yang sama.
+    Nama sheet harus sudah valid & unik (lihat _clean_sheet_name).
+    """
+    import pandas as pd
+
+    output = BytesIO()
+    if fast is None:
+        fast = sum(len(df.index) for _, df in sheets) >= FAST_EXCEL_MIN_ROWS
+    engine = excel_engine()
+    if fast and _has_module("xlsxwriter"):
+        _write_workbook_fast(output, sheets)
+        return output.getvalue()
+
+    if not engine:
+        raise ExportError("Tidak ditemukan engine Excel (openpyxl/xlsxwriter). Tambahkan salah satunya ke environment.")
+
+    if engine == "openpyxl":
+        with pd.ExcelWriter(output, engine="openpyxl") as writer:
+            for sheet_name, df in sheets:
+                profile = _column_profile(df)
+                _with_numbers(df, profile).to_excel(writer, index=False, sheet_name=sheet_name)
+                ws = writer.sheets[sheet_name]
+                _openpyxl_style_table(ws, df, profile)
+    else:
+        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+            for sheet_name, df in sheets:
+                profile = _column_profile(df)
+                _with_numbers(df, profile).to_excel(writer, index=False, sheet_name=sheet_name)
+                ws = writer.sheets[sheet_name]
+                _xlsxwriter_style_table(writer.book, ws, df, profile)
+
+    output.seek(0)
+    return output.read()
+
+
+def create_excel_from_markdown(markdown_content: str, filename: str = "alfa_threat_analysis.xlsx", doc=None):
+    """
+    Bungkus render_excel_bytes untuk UI: kesalahan ditampilkan via st.error.
+    Mengembalikan bytes XLSX atau None jika gagal.
+    """
+    try:
+        return render_excel_bytes(markdown_content, doc=doc)
+    except ExportError as e:
+        _ui_error(str(e))
+    except Exception as e:
+        _ui_error(f"Gagal membuat Excel: {e}")
+    return None
+
+
+def render_export(fmt: str, markdown_content: str) -> bytes:
+    """Entry point worker: 'pdf' atau 'xlsx' → bytes (exception diteruskan ke pemanggil)."""
+    if fmt == "pdf":
+        return render_pdf_bytes(markdown_content)
+    if fmt == "xlsx":
+        return render_excel_bytes(markdown_content)
+    raise ValueError(f"Format ekspor tidak dikenal: {fmt}")
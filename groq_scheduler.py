@@ -0,0 +1,321 @@
+"""
+Scheduler request Groq yang sadar rate limit.
+
+Semua panggilan chat.completions.create dari seluruh sesi dalam satu proses
+melewati scheduler ini:
+- Token bucket per model untuk request/menit dan token/menit
+- Antrean FIFO bersama dengan batas request yang berjalan bersamaan (stream
+  dihitung sampai selesai dibaca)
+- Retry dengan exponential backoff + jitter yang menghormati Retry-After
+- Fallback opsional ke model lain saat model utama terus dibatasi
+- Metrik: kedalaman antrean, request aktif, waktu tunggu (p50/p95); durasi
+  request & token usage juga dicatat ke perf (groq.queue, groq.request)
+"""
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import perf
+from context_budget import estimate_tokens
+
+
+@dataclass
+class ModelLimits:
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+# Mendekati limit tier gratis Groq; override lewat konstruktor jika akun berbeda.
+DEFAULT_MODEL_LIMITS = {
+    "llama-3.3-70b-versatile": ModelLimits(30, 12000),
+    "qwen/qwen3-32b": ModelLimits(60, 6000),
+    "deepseek-r1-distill-llama-70b": ModelLimits(30, 6000),
+}
+FALLBACK_LIMITS = ModelLimits(30, 6000)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class SchedulerError(Exception):
+    """Semua percobaan (termasuk fallback) gagal; `last_error` berisi penyebab terakhir."""
+
+    def __init__(self, message: str, last_error: Exception = None):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+class TokenBucket:
+    """
+    Bucket dengan reservasi: `reserve(n)` langsung memotong saldo (boleh negatif)
+    dan mengembalikan berapa detik pemanggil harus menunggu. Antrian yang adil
+    tanpa polling.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            amount = min(amount, self.capacity)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate if self.rate else 0.0
+
+    def penalize(self, seconds: float) -> None:
+        """Kosongkan bucket selama `seconds` (dipakai saat server membalas 429)."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def _status_code(exc) -> int:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = exc.__class__.__name__.lower()
+    return "timeout" in name or "connection" in name
+
+
+def retry_after_seconds(exc):
+    """Baca retry-after-ms / retry-after (detik atau tanggal HTTP) dari respons error."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return max(0.0, float(ms) / 1000.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def count_usage(usage) -> None:
+    """Catat token usage respons Groq (objek usage SDK atau None) ke counter perf."""
+    if usage is None:
+        return
+    perf.count("groq.prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+    perf.count("groq.completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+class _SlotStream:
+    """
+    Stream respons yang memegang slot konkurensi scheduler sampai habis dibaca,
+    gagal di tengah jalan, atau ditutup (close / keluar dari `with` / dibuang GC).
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __del__(self):
+        if getattr(self, "_release", None) is not None:
+            self.close()
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class GroqScheduler:
+    def __init__(self, limits: dict = None, max_concurrent: int = 4, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_cap: float = 30.0, completion_reserve: int = 1024,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.limits = dict(DEFAULT_MODEL_LIMITS, **(limits or {}))
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.completion_reserve = completion_reserve
+        self._sleep = sleep
+        self._clock = clock
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+        # Antrean FIFO berbasis tiket
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._active = 0
+        self._waiting = 0
+
+        self._waits = deque(maxlen=512)
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    # ---- rate limit ----
+    def _model_buckets(self, model: str):
+        with self._buckets_lock:
+            if model not in self._buckets:
+                lim = self.limits.get(model, FALLBACK_LIMITS)
+                self._buckets[model] = (
+                    TokenBucket(lim.requests_per_minute, clock=self._clock),
+                    TokenBucket(lim.tokens_per_minute, clock=self._clock),
+                )
+            return self._buckets[model]
+
+    def _request_tokens(self, messages, kwargs) -> int:
+        prompt = sum(estimate_tokens(m.get("content", "")) + 4 for m in messages)
+        completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or self.completion_reserve
+        return prompt + int(completion)
+
+    # ---- antrean ----
+    def _acquire_slot(self):
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting += 1
+            while ticket != self._serving or self._active >= self.max_concurrent:
+                self._cond.wait()
+            self._serving += 1
+            self._active += 1
+            self._waiting -= 1
+            self._cond.notify_all()
+
+    def _release_slot(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, exc) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        hinted = retry_after_seconds(exc)
+        if hinted is not None:
+            delay = hinted + random.uniform(0, self.backoff_base)
+        return delay
+
+    # ---- API ----
+    def create(self, client, messages, model: str, fallback_models=(), max_retries: int = None, **kwargs):
+        """
+        Pengganti client.chat.completions.create. Mengembalikan (completion, model_dipakai).
+
+        Kuota token bucket dipesan (dan ditunggu) sebelum mengambil slot konkurensi, jadi
+        model yang sedang dibatasi tidak menahan slot atau antrean model lain. Untuk
+        stream=True slot dipegang sampai stream selesai dibaca atau ditutup; retry dan
+        fallback hanya berlaku untuk pembukaan stream.
+        """
+        retries = self.max_retries if max_retries is None else max(0, int(max_retries))
+        candidates = [model] + [m for m in fallback_models if m != model]
+        last_error = None
+
+        for idx, current in enumerate(candidates):
+            if idx > 0:
+                self.fallbacks += 1
+            req_bucket, tok_bucket = self._model_buckets(current)
+            need = self._request_tokens(messages, kwargs)
+
+            for attempt in range(retries + 1):
+                queued_at = self._clock()
+                wait = max(req_bucket.reserve(1), tok_bucket.reserve(need))
+                if wait > 0:
+                    self._sleep(wait)
+                self._acquire_slot()
+                holds_slot = True
+                try:
+                    self._waits.append(self._clock() - queued_at)
+                    perf.record("groq.queue", self._waits[-1])
+                    self.requests += 1
+                    with perf.span("groq.request"):
+                        completion = client.chat.completions.create(messages=messages, model=current, **kwargs)
+                    if kwargs.get("stream"):
+                        completion = _SlotStream(completion, self._release_slot)
+                        holds_slot = False
+                    else:
+                        count_usage(getattr(completion, "usage", None))
+                    return completion, current
+                except Exception as exc:
+                    last_error = exc
+                    if not is_retryable(exc):
+                        self.failures += 1
+                        raise
+                    if _status_code(exc) == 429:
+                        self.rate_limited += 1
+                        hinted = retry_after_seconds(exc)
+                        if hinted:
+                            req_bucket.penalize(hinted)
+                    delay = self._backoff(attempt, exc)
+                finally:
+                    if holds_slot:
+                        self._release_slot()
+
+                if attempt < retries:
+                    self.retries += 1
+                    self._sleep(delay)
+
+        self.failures += 1
+        raise SchedulerError(
+            f"Groq tidak merespons setelah {retries + 1} percobaan per model ({', '.join(candidates)}): {last_error}",
+            last_error,
+        )
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth, active = self._waiting, self._active
+        waits = list(self._waits)
+        return {
+            "queue_depth": depth,
+            "active": active,
+            "wait_p50": _percentile(waits, 0.50),
+            "wait_p95": _percentile(waits, 0.95),
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+        }
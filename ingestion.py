@@ -0,0 +1,279 @@
+"""
+Ekstraksi teks dari file yang diunggah (txt, PDF, gambar) untuk konteks prompt.
+
+- TXT: decode UTF-8 (cadangan latin-1)
+- PDF: dibaca halaman demi halaman (generator); halaman tanpa teks (hasil scan)
+  di-OCR dari gambar yang tertanam di halaman tersebut
+- Gambar: di-OCR dengan pytesseract
+- Sebelum OCR gambar dikecilkan (sisi terpanjang dibatasi) dan di-binarisasi
+  (grayscale → autocontrast → threshold Otsu)
+- OCR antar halaman berjalan di pool proses (opsional)
+- Hasil di-cache berdasarkan hash isi file, jadi file yang sama tidak di-OCR ulang
+  di setiap rerun atau setiap pertanyaan
+"""
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from io import BytesIO
+from typing import List
+
+from context_budget import estimate_tokens
+from export_cache import make_export_key
+
+# Naikkan jika hasil ekstraksi berubah agar cache lama tidak dipakai
+INGEST_VERSION = 1
+
+OCR_MAX_SIDE = 2000         # sisi terpanjang gambar sebelum OCR (px)
+OCR_MIN_SIDE = 1000         # gambar kecil (screenshot) diperbesar 2x
+MIN_PDF_PAGE_CHARS = 20     # halaman PDF dengan teks lebih sedikit dianggap hasil scan
+MAX_INFLIGHT_PAGES = 8      # batas halaman OCR yang menunggu di pool
+
+TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".log", ".json", ".xml", ".yaml", ".yml")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+
+class IngestError(Exception):
+    """File tidak bisa dibaca (format tidak didukung / rusak)."""
+
+
+@dataclass
+class Page:
+    number: int
+    text: str
+    ocr: bool = False
+    error: str = ""
+
+
+@dataclass
+class IngestedFile:
+    name: str
+    kind: str                   # text | pdf | image
+    digest: str
+    pages: List[Page] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def text(self) -> str:
+        if self.kind != "pdf":
+            return "\n\n".join(p.text for p in self.pages if p.text)
+        return "\n\n".join(f"[Halaman {p.number}]\n{p.text}" for p in self.pages if p.text)
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(1 for p in self.pages if p.ocr)
+
+    @property
+    def errors(self) -> List[str]:
+        return [f"Halaman {p.number}: {p.error}" for p in self.pages if p.error]
+
+    @property
+    def nbytes(self) -> int:
+        """Perkiraan ukuran untuk batas byte ExportCache."""
+        return sum(len(p.text) for p in self.pages)
+
+    def excerpt(self, max_tokens: int) -> str:
+        """Teks file dipotong agar muat `max_tokens` (estimasi); halaman awal diutamakan."""
+        text = self.text
+        total = estimate_tokens(text)
+        if total <= max_tokens:
+            return text
+        cut = int(len(text) * max_tokens / total)
+        return text[:cut].rstrip() + f"\n\n[... dipotong, ~{total - max_tokens} token tidak disertakan]"
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def ingest_key(digest: str, lang: str = "eng") -> str:
+    return make_export_key("ingest", digest, v=INGEST_VERSION, lang=lang, max_side=OCR_MAX_SIDE)
+
+
+def detect_kind(name: str, mime: str = None) -> str:
+    name = (name or "").lower()
+    mime = (mime or "").lower()
+    if name.endswith(".pdf") or mime == "application/pdf":
+        return "pdf"
+    if name.endswith(IMAGE_EXTENSIONS) or mime.startswith("image/"):
+        return "image"
+    if name.endswith(TEXT_EXTENSIONS) or mime.startswith("text/"):
+        return "text"
+    raise IngestError(f"Format file '{name}' tidak didukung")
+
+
+# -------------------------
+# Praproses & OCR
+# -------------------------
+def _otsu_threshold(histogram) -> int:
+    """Threshold Otsu dari histogram 256 bin (memaksimalkan varians antar kelas)."""
+    hist = histogram[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    weight_b = 0
+    sum_b = 0
+    best, best_t = -1.0, 127
+    for t in range(256):
+        weight_b += hist[t]
+        if weight_b == 0:
+            continue
+        weight_f = total - weight_b
+        if weight_f == 0:
+            break
+        sum_b += t * hist[t]
+        mean_b = sum_b / weight_b
+        mean_f = (sum_all - sum_b) / weight_f
+        between = weight_b * weight_f * (mean_b - mean_f) ** 2
+        if between > best:
+            best, best_t = between, t
+    return best_t
+
+
+def prepare_for_ocr(image, max_side: int = OCR_MAX_SIDE):
+    """Grayscale, skala ulang ke rentang yang nyaman untuk tesseract, lalu binarisasi."""
+    from PIL import Image, ImageOps
+
+    img = ImageOps.exif_transpose(image).convert("L")
+    longest = max(img.size)
+    if longest > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    elif longest < OCR_MIN_SIDE:
+        img = img.resize((img.width * 2, img.height * 2), Image.LANCZOS)
+    img = ImageOps.autocontrast(img)
+    threshold = _otsu_threshold(img.histogram())
+    return img.point([255 if v > threshold else 0 for v in range(256)], "1")
+
+
+def ocr_image_bytes(data: bytes, lang: str = "eng", max_side: int = OCR_MAX_SIDE) -> str:
+    """Entry point worker: bytes gambar → teks. Harus top-level agar bisa di-pickle."""
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as img:
+        prepared = prepare_for_ocr(img, max_side)
+    return pytesseract.image_to_string(prepared, lang=lang).strip()
+
+
+def create_ocr_pool(max_workers: int = 2) -> ProcessPoolExecutor:
+    """Pool proses untuk OCR; worker forkserver sudah memuat modul ini."""
+    from export_pool import _mp_context
+    return ProcessPoolExecutor(max_workers=max(1, int(max_workers)), mp_context=_mp_context(["ingestion"]))
+
+
+def _submit(executor, fn, *args) -> Future:
+    """executor.submit, atau jalankan langsung (tanpa pool) dengan antarmuka Future yang sama."""
+    if executor is not None:
+        return executor.submit(fn, *args)
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _ocr_page(number: int, futures) -> Page:
+    texts, errors = [], []
+    for f in futures:
+        try:
+            text = f.result()
+        except Exception as e:
+            errors.append(str(e) or e.__class__.__name__)
+            continue
+        if text:
+            texts.append(text)
+    return Page(number=number, text="\n".join(texts), ocr=True, error="; ".join(errors))
+
+
+# -------------------------
+# Ekstraksi per halaman
+# -------------------------
+def _decode_text(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _iter_pdf_pages(data: bytes, executor, lang: str):
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(BytesIO(data))
+    except Exception as e:
+        raise IngestError(f"PDF tidak bisa dibaca: {e}") from e
+
+    # Antrean berurutan: (nomor, Page jadi) atau (nomor, future OCR)
+    pending = deque()
+    for number, page in enumerate(reader.pages, start=1):
+        text = (page.extract_text() or "").strip()
+        if len(text) >= MIN_PDF_PAGE_CHARS:
+            pending.append((number, Page(number=number, text=text)))
+        else:
+            try:
+                blobs = [img.data for img in page.images]
+            except Exception:
+                blobs = []
+            if blobs:
+                pending.append((number, [_submit(executor, ocr_image_bytes, b, lang) for b in blobs]))
+            else:
+                pending.append((number, Page(number=number, text=text)))
+
+        # Keluarkan halaman yang sudah siap tanpa menunggu halaman berikutnya
+        while pending and (
+            isinstance(pending[0][1], Page)
+            or all(f.done() for f in pending[0][1])
+            or len(pending) > MAX_INFLIGHT_PAGES
+        ):
+            yield _finish_pending(*pending.popleft())
+    while pending:
+        yield _finish_pending(*pending.popleft())
+
+
+def _finish_pending(number: int, item) -> Page:
+    return item if isinstance(item, Page) else _ocr_page(number, item)
+
+
+def iter_pages(data: bytes, kind: str, executor=None, lang: str = "eng"):
+    """Generator Page sesuai urutan halaman; OCR berjalan paralel di `executor`."""
+    if kind == "text":
+        yield Page(number=1, text=_decode_text(data).strip())
+    elif kind == "pdf":
+        yield from _iter_pdf_pages(data, executor, lang)
+    elif kind == "image":
+        yield _ocr_page(1, [_submit(executor, ocr_image_bytes, data, lang)])
+    else:
+        raise IngestError(f"Jenis file '{kind}' tidak didukung")
+
+
+def ingest(data: bytes, name: str, mime: str = None, cache=None, executor=None,
+           lang: str = "eng", on_page=None) -> IngestedFile:
+    """
+    Ekstrak teks file. Dengan `cache` (ExportCache) hasil dicari dulu berdasarkan
+    hash isi file; `on_page(page)` dipanggil per halaman saat ekstraksi berjalan.
+    Hasil dengan halaman gagal tidak di-cache agar bisa dicoba lagi. Entri cache
+    dipakai bersama antar unggahan, jadi hasil dari cache dikembalikan sebagai
+    salinan dengan nama file unggahan saat ini.
+    """
+    kind = detect_kind(name, mime)
+    digest = file_digest(data)
+    key = ingest_key(digest, lang)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached if cached.name == name else replace(cached, name=name)
+
+    started = time.perf_counter()
+    result = IngestedFile(name=name, kind=kind, digest=digest)
+    for page in iter_pages(data, kind, executor=executor, lang=lang):
+        result.pages.append(page)
+        if on_page is not None:
+            on_page(page)
+    result.elapsed = time.perf_counter() - started
+
+    if cache is not None and not result.errors:
+        cache.put(key, result)
+    return result
@@ -0,0 +1,205 @@
+"""
+Instrumentasi ringan jalur panas: durasi per tahap (span) dan counter.
+
+- `span("pdf.pisa")` sebagai context manager, `@timed("excel.style")` sebagai dekorator,
+  `count("groq.prompt_tokens", n)` untuk counter, `observe("pdf.output_bytes", n)` untuk
+  nilai non-waktu (ukuran file, puncak memori)
+- Per tahap disimpan jendela durasi terakhir (p50/p95/maks) + jumlah & total kumulatif
+- Ekspor JSON atau teks Prometheus (format exposition) ke file lokal
+- Mati secara default (PERF_ENABLED=1 untuk menyalakan): span mengembalikan objek
+  no-op bersama dan dekorator hanya memeriksa satu flag, tanpa alokasi/clock
+
+Rekaman per proses; tahap ekspor yang dijalankan worker pool (EXPORT_POOL_WORKERS>0)
+tercatat di proses worker, bukan di proses Streamlit.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+WINDOW = 512
+METRIC_PREFIX = "alfa"
+
+_METRIC_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_recorder", "_stage", "_started")
+
+    def __init__(self, recorder, stage: str):
+        self._recorder = recorder
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = self._recorder._clock()
+        return self
+
+    def __exit__(self, *exc):
+        self._recorder.record(self._stage, self._recorder._clock() - self._started)
+        return False
+
+
+class PerfRecorder:
+    def __init__(self, enabled: bool = False, window: int = WINDOW, clock=time.perf_counter):
+        self.enabled = enabled
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples = {}      # tahap → deque durasi terakhir (detik)
+        self._totals = {}       # tahap → [jumlah, total detik, maks]
+        self._counters = {}
+        self._values = {}       # nama → deque nilai terakhir (observe)
+        self.started = time.time()
+
+    # ---- rekam ----
+    def record(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    def count(self, name: str, value=1) -> None:
+        if not self.enabled or not value:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value) -> None:
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            values = self._values.get(name)
+            if values is None:
+                values = self._values[name] = deque(maxlen=self.window)
+            values.append(value)
+
+    def span(self, stage: str):
+        return _Span(self, stage) if self.enabled else _NULL_SPAN
+
+    def timed(self, stage: str):
+        """Dekorator: durasi tiap pemanggilan dicatat sebagai `stage`."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = self._clock()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(stage, self._clock() - started)
+            return wrapper
+        return decorate
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+            self._values.clear()
+            self.started = time.time()
+
+    # ---- baca ----
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+            totals = {stage: list(values) for stage, values in self._totals.items()}
+            counters = dict(self._counters)
+            observed = {name: list(values) for name, values in self._values.items()}
+        stages = {}
+        for stage in sorted(samples):
+            count, total, peak = totals[stage]
+            stages[stage] = {
+                "count": count,
+                "total": total,
+                "p50": percentile(samples[stage], 0.50),
+                "p95": percentile(samples[stage], 0.95),
+                "max": peak,
+            }
+        values = {
+            name: {"count": len(v), "last": v[-1], "p50": percentile(v, 0.50), "p95": percentile(v, 0.95), "max": max(v)}
+            for name, v in sorted(observed.items())
+        }
+        return {"enabled": self.enabled, "since": self.started, "stages": stages, "counters": counters,
+                "values": values}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = METRIC_PREFIX) -> str:
+        """Teks exposition Prometheus: summary per tahap & per nilai observe + satu counter per nama."""
+        snap = self.snapshot()
+        metric = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {metric} Durasi tahap jalur panas (jendela {self.window} sampel terakhir).",
+                 f"# TYPE {metric} summary"]
+        for stage, s in snap["stages"].items():
+            label = f'stage="{stage}"'
+            lines.append(f'{metric}{{{label},quantile="0.5"}} {s["p50"]:.6f}')
+            lines.append(f'{metric}{{{label},quantile="0.95"}} {s["p95"]:.6f}')
+            lines.append(f"{metric}_sum{{{label}}} {s['total']:.6f}")
+            lines.append(f"{metric}_count{{{label}}} {s['count']}")
+        for name, v in snap["values"].items():
+            gauge = f"{prefix}_{_METRIC_NAME_RE.sub('_', name)}"
+            lines.append(f"# TYPE {gauge} summary")
+            lines.append(f'{gauge}{{quantile="0.5"}} {v["p50"]}')
+            lines.append(f'{gauge}{{quantile="0.95"}} {v["p95"]}')
+            lines.append(f"{gauge}_count {v['count']}")
+        for name, value in sorted(snap["counters"].items()):
+            counter = f"{prefix}_{_METRIC_NAME_RE.sub('_', name)}_total"
+            lines.append(f"# TYPE {counter} counter")
+            lines.append(f"{counter} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: str) -> str:
+        """Tulis laporan ke `path`; ekstensi .prom/.txt → format Prometheus, selain itu JSON."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+
+# Perekam bawaan per proses, dipakai modul lain lewat fungsi di bawah
+RECORDER = PerfRecorder(enabled=os.environ.get("PERF_ENABLED", "").lower() in ("1", "true", "yes"))
+
+span = RECORDER.span
+timed = RECORDER.timed
+count = RECORDER.count
+record = RECORDER.record
+observe = RECORDER.observe
@@ -0,0 +1,285 @@
+"""
+Indeks referensi keamanan lokal: CWE, OWASP Top 10 2021, dan ASVS 4.0.3.
+
+Nomor CWE dan pemetaan standar tidak lagi dipercayakan ke ingatan model:
+- data/security_refs.tsv ikut dibundel dengan aplikasi (urut berdasarkan id),
+  jadi lookup tetap jalan tanpa akses jaringan
+- File di-mmap; di memori hanya ada id terurut + offset baris dan indeks kata
+  kunci (token → nomor entri), isi entri dibaca dari mmap saat dibutuhkan
+- Lookup id persis & prefix lewat bisect, pencarian kata kunci lewat indeks
+  terbalik berbobot IDF
+- Setelah jawaban tiba, CWE di tabel threat dicek ke indeks dan diperkaya
+  (nama CWE, kategori OWASP, bagian ASVS) sebagai satu tabel tambahan
+"""
+import bisect
+import math
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+from report_model import to_markdown_table
+from threat_records import get_threat_records, threat_key
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "security_refs.tsv")
+
+REFERENCE_SECTION_TITLE = "## Validasi Referensi (CWE / OWASP / ASVS)"
+
+# Ditambahkan ke system prompt: judul & pemetaan standar diisi dari indeks lokal
+REFERENCE_PROMPT_HINT = """
+    8. Untuk CWE cukup tulis nomornya (contoh: CWE-89) tanpa judul atau penjelasan CWE, dan jangan tulis kode OWASP/ASVS di sel tabel; nama CWE, kategori OWASP Top 10, dan bagian ASVS ditambahkan otomatis.
+    """
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CWE_RE = re.compile(r"^CWE[-\s]?0*(\d{1,4})$")
+_OWASP_RE = re.compile(r"^A0?(\d{1,2})(?::(\d{4}))?$")
+_ASVS_RE = re.compile(r"^(?:ASVS[-\s]?)?V(\d{1,2})(?:\.(\d{1,2}))?(?:\.\d+)?$")
+_OWASP_ID_RE = re.compile(r"^A\d{2}:")
+_OWASP_IN_TEXT_RE = re.compile(r"\bA(\d{2}):(?:20)?\d{2}\b")
+_ALIAS_RE = re.compile(r"\('([^']+)'\)$|\(([^)]+)\)$")
+
+
+@dataclass(frozen=True)
+class Reference:
+    id: str
+    kind: str                   # cwe | owasp | asvs
+    title: str
+    refs: Tuple[str, ...] = ()
+    keywords: Tuple[str, ...] = ()
+
+    @property
+    def short_title(self) -> str:
+        """Nama populer di akhir judul CWE ('SQL Injection', 'CSRF') atau judul lengkap."""
+        m = _ALIAS_RE.search(self.title)
+        return (m.group(1) or m.group(2)) if m else self.title
+
+    @property
+    def owasp(self) -> list:
+        return [r for r in self.refs if _OWASP_ID_RE.match(r)]
+
+    @property
+    def asvs(self) -> list:
+        return [r for r in self.refs if r.startswith("ASVS-")]
+
+
+def normalize_ref_id(value: str) -> str:
+    """'cwe 089' → 'CWE-89', 'a3' → 'A03:2021', 'V5.3.4' → 'ASVS-V5.3'; lainnya huruf besar apa adanya."""
+    value = " ".join((value or "").split()).upper()
+    m = _CWE_RE.match(value)
+    if m:
+        return f"CWE-{int(m.group(1))}"
+    m = _OWASP_RE.match(value)
+    if m:
+        return f"A{int(m.group(1)):02d}:{m.group(2) or '2021'}"
+    m = _ASVS_RE.match(value)
+    if m:
+        return f"ASVS-V{int(m.group(1))}" + (f".{int(m.group(2))}" if m.group(2) else "")
+    return value
+
+
+def _normalize_prefix(prefix: str) -> str:
+    prefix = " ".join((prefix or "").split()).upper()
+    if re.match(r"^CWE\s?\d", prefix):
+        return "CWE-" + prefix[3:].strip().lstrip("0")
+    if re.match(r"^V\d", prefix):
+        return "ASVS-" + prefix
+    return prefix
+
+
+def _tokens(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+
+
+class ReferenceIndex:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        entries = []
+        postings = {}
+        pos, size = 0, len(self._mm)
+        while pos < size:
+            end = self._mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            line = self._mm[pos:end]
+            if line.strip() and not line.startswith(b"#"):
+                fields = line.decode("utf-8").split("\t")
+                entries.append((normalize_ref_id(fields[0]), pos, end))
+                text = " ".join(fields[2:3] + fields[4:5])
+                for token in set(_tokens(text)):
+                    postings.setdefault(token, []).append(len(entries) - 1)
+            pos = end + 1
+        # Urutan file sudah berdasarkan id; diurutkan ulang jaga-jaga jika data diedit manual
+        order = sorted(range(len(entries)), key=lambda i: entries[i][0])
+        remap = {old: new for new, old in enumerate(order)}
+        self._ids = [entries[i][0] for i in order]
+        self._spans = [(entries[i][1], entries[i][2]) for i in order]
+        self._postings = {t: [remap[i] for i in ids] for t, ids in postings.items()}
+        n = len(self._ids)
+        self._idf = {t: math.log((n + 1) / (len(ids) + 0.5)) for t, ids in self._postings.items()}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _entry(self, i: int) -> Reference:
+        start, end = self._spans[i]
+        fields = (self._mm[start:end].decode("utf-8").split("\t") + [""] * 5)[:5]
+        return Reference(
+            id=self._ids[i],
+            kind=fields[1],
+            title=fields[2],
+            refs=tuple(r for r in fields[3].split(",") if r),
+            keywords=tuple(fields[4].split()),
+        )
+
+    def get(self, ref_id: str):
+        """Reference untuk id persis (format bebas, lihat normalize_ref_id) atau None."""
+        key = normalize_ref_id(ref_id)
+        i = bisect.bisect_left(self._ids, key)
+        if i < len(self._ids) and self._ids[i] == key:
+            return self._entry(i)
+        return None
+
+    def __contains__(self, ref_id: str) -> bool:
+        return self.get(ref_id) is not None
+
+    def prefix(self, prefix: str, limit: int = 20) -> list:
+        """Entri dengan id berawalan `prefix` ('CWE-7', 'A0', 'V5'), urut leksikografis id."""
+        key = _normalize_prefix(prefix)
+        out = []
+        i = bisect.bisect_left(self._ids, key)
+        while i < len(self._ids) and self._ids[i].startswith(key) and len(out) < limit:
+            out.append(self._entry(i))
+            i += 1
+        return out
+
+    def search(self, text: str, kind: str = None, limit: int = 5) -> list:
+        """[(Reference, skor)] entri yang judul/kata kuncinya paling cocok dengan `text`."""
+        scores = {}
+        for token in set(_tokens(text)):
+            for i in self._postings.get(token, ()):
+                scores[i] = scores.get(i, 0.0) + self._idf[token]
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self._ids[kv[0]]))
+        out = []
+        for i, score in ranked:
+            entry = self._entry(i)
+            if kind and entry.kind != kind:
+                continue
+            out.append((entry, round(score, 3)))
+            if len(out) >= limit:
+                break
+        return out
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+@lru_cache(maxsize=1)
+def default_index() -> ReferenceIndex:
+    """Indeks bawaan, dibuka sekali per proses."""
+    return ReferenceIndex(DEFAULT_PATH)
+
+
+# -------------------------
+# Validasi & pengayaan jawaban
+# -------------------------
+@dataclass
+class ThreatCheck:
+    threat: str
+    cwes: list          # Reference CWE yang ada di indeks
+    unknown: list       # nomor CWE di luar indeks lokal
+    suggestions: list   # Reference saran dari kata kunci (jika tidak ada CWE yang dikenali)
+    owasp: list         # Reference OWASP dari pemetaan CWE
+    asvs: list          # Reference ASVS dari pemetaan CWE
+    owasp_mismatch: list  # kode OWASP yang ditulis model tetapi tidak sesuai pemetaan CWE
+
+
+def check_records(records, index: ReferenceIndex = None) -> list:
+    """ThreatCheck per threat unik di ThreatRecords (urutan kemunculan)."""
+    index = index or default_index()
+    groups = {}
+    for i in range(len(records)):
+        threat = records.threat[i] or ""
+        key = threat_key(threat)
+        if not key:
+            continue
+        group = groups.setdefault(key, {"threat": threat, "cwes": [], "text": [], "stated": set()})
+        group["cwes"].extend(records.cwes(i))
+        group["text"].append(f"{threat} {records.scenario[i] or ''}")
+        group["stated"].update(f"A{m}" for m in _OWASP_IN_TEXT_RE.findall(threat))
+
+    checks = []
+    for group in groups.values():
+        cwes, unknown = [], []
+        for cwe in dict.fromkeys(group["cwes"]):
+            entry = index.get(cwe)
+            if entry is not None:
+                cwes.append(entry)
+            else:
+                unknown.append(cwe)
+        suggestions = []
+        if not cwes:
+            found = index.search(" ".join(group["text"]), kind="cwe", limit=2)
+            # Saran kedua hanya jika skornya sebanding dengan yang teratas
+            suggestions = [e for e, score in found if score >= found[0][1] / 2]
+        owasp_ids = list(dict.fromkeys(r for e in cwes for r in e.owasp))
+        asvs_ids = list(dict.fromkeys(r for e in cwes for r in e.asvs))
+        mapped = {r.split(":")[0] for r in owasp_ids}
+        checks.append(ThreatCheck(
+            threat=group["threat"],
+            cwes=cwes,
+            unknown=unknown,
+            suggestions=suggestions,
+            owasp=[e for e in map(index.get, owasp_ids) if e is not None],
+            asvs=[e for e in map(index.get, asvs_ids) if e is not None],
+            owasp_mismatch=sorted(group["stated"] - mapped) if mapped else [],
+        ))
+    return checks
+
+
+def _status(check: ThreatCheck) -> str:
+    # Nomor CWE di kolom status ditulis '#89' agar tidak ikut terbaca sebagai CWE threat
+    notes = []
+    if check.unknown:
+        notes.append("di luar indeks lokal: " + ", ".join("#" + c.split("-")[1] for c in check.unknown))
+    if check.owasp_mismatch:
+        notes.append(f"OWASP tertulis {', '.join(check.owasp_mismatch)} tidak sesuai pemetaan CWE")
+    if check.suggestions:
+        notes.append("saran: " + ", ".join(f"#{e.id.split('-')[1]} ({e.short_title})" for e in check.suggestions))
+    if not notes:
+        return "valid" if check.cwes else "-"
+    return "; ".join(notes)
+
+
+def reference_section(markdown_content: str, index: ReferenceIndex = None) -> str:
+    """Markdown tabel validasi/pengayaan untuk jawaban asisten, atau '' jika tidak ada threat."""
+    if REFERENCE_SECTION_TITLE in (markdown_content or ""):
+        return ""
+    checks = check_records(get_threat_records(markdown_content or ""), index)
+    if not checks:
+        return ""
+    rows = [
+        [
+            c.threat,
+            ", ".join(e.id for e in c.cwes),
+            "; ".join(e.short_title for e in c.cwes),
+            "; ".join(f"{e.id} {e.title}" for e in c.owasp),
+            "; ".join(f"{e.id[5:]} {e.title}" for e in c.asvs),
+            _status(c),
+        ]
+        for c in checks
+    ]
+    table = to_markdown_table(["THREAT", "CWE", "NAMA CWE", "OWASP TOP 10 2021", "ASVS 4.0.3", "STATUS"], rows)
+    return f"{REFERENCE_SECTION_TITLE}\n\n{table}\n"
+
+
+def enrich_response(markdown_content: str, index: ReferenceIndex = None) -> str:
+    """Jawaban + tabel validasi referensi (tidak diubah jika tidak ada threat atau sudah diperkaya)."""
+    section = reference_section(markdown_content, index)
+    if not section:
+        return markdown_content
+    return markdown_content.rstrip() + "\n\n" + section
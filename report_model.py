@@ -0,0 +1,252 @@
+"""
+Model dokumen perantara untuk output markdown asisten.
+
+Markdown di-parse SATU kali per pesan menjadi blok-blok bertipe:
+heading, paragraf, blok kode, dan tabel. Eksportir PDF/Excel, tampilan chat,
+dan ringkasan konteks memakai model yang sama sehingga tidak ada parsing
+berulang (markdown2 → read_html → fallback parser).
+"""
+import re
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from typing import List, Optional
+
+import perf
+
+MARKDOWN_EXTRAS = ["tables", "fenced-code-blocks", "code-friendly"]
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)\s*([\w+-]*)\s*$")
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+# Sama dengan parser tabel lama agar hasil Excel tidak berubah
+_TABLE_SEP_RE = re.compile(r"^\s*\|?\s*:?-{3,}.*\|.*-+")
+_BR_RE = re.compile(r"<br\s*/?>", re.I)
+_INLINE_MD_RE = re.compile(r"(\*\*|__|`)")
+
+
+def _split_row(row: str) -> List[str]:
+    row = row.strip()
+    if row.startswith("|"):
+        row = row[1:]
+    if row.endswith("|"):
+        row = row[:-1]
+    return [c.strip() for c in row.split("|")]
+
+
+def clean_cell(text: str) -> str:
+    """Teks sel tanpa markup inline (**, __, `) dan <br> menjadi baris baru."""
+    text = _BR_RE.sub("\n", text)
+    return _INLINE_MD_RE.sub("", text).strip()
+
+
+@dataclass
+class Heading:
+    level: int
+    text: str
+    source: str
+
+
+@dataclass
+class Paragraph:
+    text: str
+    source: str
+
+
+@dataclass
+class CodeBlock:
+    code: str
+    lang: str
+    source: str
+
+
+@dataclass
+class Table:
+    header: List[str]
+    rows: List[List[str]]
+    source: str
+    kind: str = "generic"   # threat | cwe | dread | generic
+
+    def column(self, *needles) -> Optional[int]:
+        """Indeks kolom pertama yang header-nya mengandung salah satu `needles`."""
+        for idx, h in enumerate(self.header):
+            h = h.lower()
+            if any(n in h for n in needles):
+                return idx
+        return None
+
+    def ciaan_columns(self):
+        """[(indeks, 'c'|'i'|'au'|'av'|'n')] untuk kolom tanda C/I/Au/Av/N."""
+        keys = [(idx, _norm_header(h)) for idx, h in enumerate(self.header)]
+        return [(idx, k) for idx, k in keys if k in CIAAN_KEYS]
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.rows, columns=self.header)
+
+
+CIAAN_KEYS = ("c", "i", "au", "av", "n")
+
+
+def _md_cell(text) -> str:
+    return " ".join(str(text).split()).replace("|", "/")
+
+
+def to_markdown_table(header: List[str], rows: List[List[str]]) -> str:
+    """Tabel markdown satu baris per row (sel dirapikan, '|' diganti '/')."""
+    lines = ["| " + " | ".join(_md_cell(c) for c in header) + " |",
+             "|" + "|".join("---" for _ in header) + "|"]
+    lines.extend("| " + " | ".join(_md_cell(c) for c in row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def _norm_header(h: str) -> str:
+    h = h.lower()
+    h = h.replace("authentication", "au").replace("availability", "av")
+    h = h.replace("confidentiality", "c").replace("integrity", "i")
+    h = h.replace("non-repudiation", "n")
+    return h.strip()
+
+
+def is_threat_table_header(header: List[str]) -> bool:
+    """
+    True jika header menyerupai tabel threat 9 kolom (FLOW, THREAT, C/I/Au/Av/N,
+    SCENARIO, REKOMENDASI). Dipakai juga untuk lebar kolom PDF.
+    """
+    mapped = [_norm_header(h) for h in header]
+    score = 0
+    if any(x.startswith("flow") for x in mapped):
+        score += 1
+    if "threat" in "".join(mapped):
+        score += 1
+    for k in CIAAN_KEYS:
+        if k in mapped:
+            score += 1
+    if any("scenario" in x for x in mapped):
+        score += 1
+    if any("rekomendasi" in x for x in mapped):
+        score += 1
+    return score >= max(5, len(mapped) // 2)
+
+
+def _classify_table(header: List[str]) -> str:
+    """
+    Tebak jenis tabel dari header: tabel 9 kolom C/I/Au/Av/N → 'threat',
+    tabel DREAD → 'dread', tabel CWE → 'cwe'.
+    """
+    joined = " ".join(_norm_header(h) for h in header)
+    if any(k in joined for k in ("dread", "discoverability", "reproducibility", "damage")):
+        return "dread"
+    if is_threat_table_header(header):
+        return "threat"
+    if "cwe" in joined:
+        return "cwe"
+    return "generic"
+
+
+@dataclass
+class ReportDocument:
+    source: str
+    blocks: list = field(default_factory=list)
+
+    @property
+    def tables(self) -> List[Table]:
+        return [b for b in self.blocks if isinstance(b, Table)]
+
+    def tables_of_kind(self, kind: str) -> List[Table]:
+        return [t for t in self.tables if t.kind == kind]
+
+    @cached_property
+    def html(self) -> str:
+        """HTML dari markdown2, dihitung sekali per dokumen (dipakai PDF)."""
+        import markdown2
+        with perf.span("markdown2.html"):
+            return markdown2.markdown(self.source, extras=MARKDOWN_EXTRAS)
+
+    def segments(self):
+        """
+        Potongan untuk ditampilkan: ('text', markdown) untuk blok non-tabel yang
+        berurutan, ('table', Table) untuk tiap tabel.
+        """
+        pending = []
+        for block in self.blocks:
+            if isinstance(block, Table):
+                if pending:
+                    yield "text", "\n\n".join(pending)
+                    pending = []
+                yield "table", block
+            else:
+                pending.append(block.source)
+        if pending:
+            yield "text", "\n\n".join(pending)
+
+
+@perf.timed("markdown.parse")
+def parse_report(markdown_content: str) -> ReportDocument:
+    """Parse markdown menjadi ReportDocument dalam satu lintasan per baris."""
+    lines = (markdown_content or "").splitlines()
+    blocks = []
+    para = []
+
+    def flush_para():
+        if para:
+            src = "\n".join(para)
+            blocks.append(Paragraph(text=" ".join(p.strip() for p in para), source=src))
+            para.clear()
+
+    i = 0
+    n = len(lines)
+    while i < n:
+        line = lines[i]
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            flush_para()
+            marker, lang = fence.group(1), fence.group(2)
+            j = i + 1
+            while j < n and not lines[j].strip().startswith(marker):
+                j += 1
+            code = "\n".join(lines[i + 1:j])
+            blocks.append(CodeBlock(code=code, lang=lang, source="\n".join(lines[i:j + 1])))
+            i = j + 1
+            continue
+
+        if "|" in line and i + 1 < n and _TABLE_SEP_RE.match(lines[i + 1]):
+            flush_para()
+            j = i + 2
+            while j < n and "|" in lines[j] and not lines[j].strip().startswith("```"):
+                j += 1
+            header = [clean_cell(h) for h in _split_row(line)]
+            width = len(header)
+            rows = []
+            for raw in lines[i + 2:j]:
+                r = [clean_cell(c) for c in _split_row(raw)]
+                if len(r) < width:
+                    r = r + [""] * (width - len(r))
+                elif len(r) > width:
+                    r = r[:width]
+                rows.append(r)
+            blocks.append(Table(header=header, rows=rows, source="\n".join(lines[i:j]),
+                                kind=_classify_table(header)))
+            i = j
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush_para()
+            blocks.append(Heading(level=len(heading.group(1)), text=heading.group(2), source=line))
+            i += 1
+            continue
+
+        if not line.strip():
+            flush_para()
+        else:
+            para.append(line)
+        i += 1
+
+    flush_para()
+    return ReportDocument(source=markdown_content or "", blocks=blocks)
+
+
+@lru_cache(maxsize=256)
+def get_report_document(markdown_content: str) -> ReportDocument:
+    """ReportDocument ter-memo per isi pesan (bertahan lintas rerun Streamlit)."""
+    return parse_report(markdown_content)
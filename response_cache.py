@@ -0,0 +1,151 @@
+"""
+Cache respons Groq (opt-in) yang disimpan di file SQLite lokal.
+
+Flow yang sama dengan model yang sama sering dikirim ulang (setelah logout,
+dari tab lain). Kunci = sha256(system prompt, nama model, prompt ternormalisasi,
+digest konteks yang benar-benar dikirim), sehingga jawaban yang sama bisa
+disajikan dalam hitungan milidetik.
+- TTL per entri dan eviksi berdasarkan jumlah entri/total ukuran (LRU)
+- Invalidasi per entri (tombol di UI)
+- Aman dipakai dari banyak thread sesi Streamlit
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    model     TEXT NOT NULL,
+    prompt    TEXT NOT NULL,
+    response  TEXT NOT NULL,
+    usage     TEXT,
+    created   REAL NOT NULL,
+    last_hit  REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    size      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_hit ON responses(last_hit);
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created);
+"""
+
+
+def normalize_prompt(text: str) -> str:
+    """Spasi dirapikan dan huruf kecil: beda spasi/kapitalisasi tetap kena cache."""
+    return " ".join((text or "").split()).casefold()
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def response_key(system_prompt: str, model: str, messages: list) -> str:
+    """
+    Kunci dari pesan yang dikirim ke Groq: pesan user terakhir (ternormalisasi)
+    + digest riwayat di antaranya (setelah ringkasan/pemotongan budget konteks).
+    """
+    history = [m for m in messages if m.get("role") != "system"]
+    prompt = history[-1]["content"] if history else ""
+    context_digest = _hash(*(f"{m['role']}:{normalize_prompt(m['content'])}" for m in history[:-1]))
+    return _hash(_hash(system_prompt), model, normalize_prompt(prompt), context_digest)
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 500,
+                 max_bytes: int = 50 * 1024 * 1024, clock=time.time):
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self._clock = clock
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """dict {response, usage, model, created, hits} atau None (tidak ada / kedaluwarsa)."""
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, usage, model, created, hits FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[3] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET hits = hits + 1, last_hit = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return {
+            "response": row[0],
+            "usage": json.loads(row[1]) if row[1] else None,
+            "model": row[2],
+            "created": row[3],
+            "hits": row[4] + 1,
+        }
+
+    def put(self, key: str, model: str, prompt: str, response: str, usage: dict = None) -> None:
+        if not response:
+            return
+        now = self._clock()
+        size = len(response.encode("utf-8")) + len(prompt.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, prompt, response, usage, created, last_hit, hits, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (key, model, prompt[:500], response, json.dumps(usage) if usage else None, now, now, size),
+            )
+            self._evict_locked(now)
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return cur.rowcount > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict_locked(self, now: float) -> None:
+        """Hapus entri kedaluwarsa, lalu entri paling lama tidak dipakai hingga di bawah batas."""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        entries, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if entries <= self.max_entries and (not self.max_bytes or total <= self.max_bytes):
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_hit ASC"):
+            if entries <= self.max_entries and (not self.max_bytes or total <= self.max_bytes):
+                break
+            victims.append((key,))
+            entries -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
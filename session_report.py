@@ -0,0 +1,247 @@
+"""
+Laporan sesi: satu PDF (dengan daftar isi) dan satu workbook Excel untuk
+seluruh percakapan, dirakit bertahap dari fragmen per pesan.
+
+- Fragmen PDF per jawaban = PDF ekspor per pesan dengan kunci cache yang sama,
+  jadi jawaban yang sudah pernah diekspor tidak di-render ulang
+- Badan PDF yang sudah dirakit disimpan per prefiks percakapan; ekspor
+  berikutnya hanya menambahkan jawaban terbaru (pypdf), lalu membuat ulang
+  halaman daftar isi yang kecil
+- Workbook: satu sheet per tabel threat dari semua jawaban + sheet ringkasan
+  (daftar jawaban, risiko per flow, top DREAD, CWE dari ThreatRecords gabungan);
+  sheet per jawaban disiapkan sekali per isi pesan
+Tanpa pemanggilan Streamlit (aman untuk worker proses).
+"""
+import html
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from typing import Tuple
+
+import numpy as np
+
+from export_cache import make_export_key
+from exporters import (
+    PDF_FONT, _clean_sheet_name, _strip_frame, _summary_frames, render_html_pdf_bytes, render_pdf_bytes,
+    write_workbook,
+)
+from report_model import get_report_document
+from threat_records import concat_records, get_threat_records
+
+SESSION_TITLE = "Laporan Sesi Alfa Threat Model"
+MAX_TITLE_CHARS = 90
+# Stylesheet PDF memaksa kolom 3-7 selebar 4% (kolom CIA tabel threat); kelas ini menimpanya
+_TOC_STYLE = "<style>th.toc-no, td.toc-no { width: 7%; } th.toc-num, td.toc-num { width: 11%; }</style>"
+
+
+@dataclass
+class SessionEntry:
+    number: int
+    title: str          # pertanyaan user (teks yang ditampilkan)
+    content: str        # jawaban asisten (markdown)
+
+
+@dataclass
+class SessionPdfBody:
+    """Gabungan fragmen PDF untuk satu prefiks percakapan (disimpan di ExportCache)."""
+    pdf: bytes
+    pages: Tuple[int, ...]      # jumlah halaman per jawaban
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pdf)
+
+
+def session_entries(messages: list) -> list:
+    """Pasangan (pertanyaan, jawaban) berurutan dari pesan percakapan."""
+    entries = []
+    question = ""
+    for message in messages:
+        if message["role"] == "user":
+            question = message.get("display") or message["content"]
+        elif message["role"] == "assistant" and message.get("content"):
+            title = " ".join(question.split()) or f"Jawaban {len(entries) + 1}"
+            if len(title) > MAX_TITLE_CHARS:
+                title = title[:MAX_TITLE_CHARS - 1].rstrip() + "…"
+            entries.append(SessionEntry(number=len(entries) + 1, title=title, content=message["content"]))
+            question = ""
+    return entries
+
+
+def fragment_key(fmt: str, content: str, version) -> str:
+    """Kunci ekspor per pesan (dipakai juga oleh aplikasi): jenis, isi, versi pengaturan ekspor, font PDF."""
+    return make_export_key(fmt, content, v=version, font=PDF_FONT)
+
+
+def _cache_get_or_create(cache, key: str, factory):
+    if cache is None:
+        return factory()
+    return cache.get_or_create(key, factory)
+
+
+# -------------------------
+# PDF
+# -------------------------
+def _body_key(entries: list, version) -> str:
+    # Judul ikut di kunci: halaman daftar isi & outline memakai judul per jawaban
+    parts = "\0".join(f"{e.title}\0{fragment_key('pdf', e.content, version)}" for e in entries)
+    return make_export_key("session-pdf-body", parts, v=version)
+
+
+def _append_fragments(body: SessionPdfBody, entries: list, cache, version) -> SessionPdfBody:
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    if body is not None:
+        writer.append(PdfReader(BytesIO(body.pdf)), import_outline=False)
+    pages = list(body.pages) if body is not None else []
+    for entry in entries:
+        fragment = _cache_get_or_create(
+            cache, fragment_key("pdf", entry.content, version), lambda e=entry: render_pdf_bytes(e.content)
+        )
+        reader = PdfReader(BytesIO(fragment))
+        pages.append(len(reader.pages))
+        writer.append(reader, import_outline=False)
+    out = BytesIO()
+    writer.write(out)
+    return SessionPdfBody(pdf=out.getvalue(), pages=tuple(pages))
+
+
+def assemble_pdf_body(entries: list, cache=None, version=0) -> SessionPdfBody:
+    """
+    Badan PDF semua jawaban. Prefiks terpanjang yang sudah dirakit diambil dari
+    cache, sehingga hanya jawaban setelahnya yang ditambahkan.
+    """
+    body, start = None, 0
+    if cache is not None:
+        for n in range(len(entries), 0, -1):
+            body = cache.get(_body_key(entries[:n], version))
+            if body is not None:
+                start = n
+                break
+    if start < len(entries) or body is None:
+        body = _append_fragments(body, entries[start:], cache, version)
+        if cache is not None:
+            cache.put(_body_key(entries, version), body)
+    return body
+
+
+def _toc_html(entries: list, first_pages: list, threat_counts: list, title: str) -> str:
+    rows = "".join(
+        f'<tr><td class="toc-no">{e.number}</td><td>{html.escape(e.title)}</td>'
+        f'<td class="toc-num">{n}</td><td class="toc-num">{p}</td></tr>'
+        for e, p, n in zip(entries, first_pages, threat_counts)
+    )
+    generated = time.strftime("%d-%m-%Y %H:%M")
+    return (
+        f"{_TOC_STYLE}<h1>{html.escape(title)}</h1>"
+        f"<p>{len(entries)} jawaban · dibuat {generated}</p>"
+        "<h2>Daftar Isi</h2>"
+        '<table><thead><tr><th class="toc-no">No</th><th>Pertanyaan</th>'
+        '<th class="toc-num">Threat</th><th class="toc-num">Hal.</th></tr></thead>'
+        f"<tbody>{rows}</tbody></table>"
+    )
+
+
+def _session_key(fmt: str, entries: list, version, title: str) -> str:
+    if fmt == "pdf":
+        return make_export_key("session-pdf", _body_key(entries, version), v=version, title=title)
+    parts = "\0".join(f"{e.title}\0{fragment_key('xlsx', e.content, version)}" for e in entries)
+    return make_export_key("session-xlsx", parts, v=version)
+
+
+def session_export_key(fmt: str, messages: list, version=0, title: str = SESSION_TITLE):
+    """Kunci cache hasil akhir render_session_pdf/xlsx untuk `messages` (None jika belum ada jawaban)."""
+    entries = session_entries(messages)
+    return _session_key(fmt, entries, version, title) if entries else None
+
+
+def render_session_pdf(messages: list, cache=None, version=0, title: str = SESSION_TITLE) -> bytes:
+    """
+    PDF laporan sesi: halaman daftar isi + jawaban berurutan, dengan outline per jawaban.
+    Hasil akhir juga di-cache (kunci: session_export_key), jadi rerun tanpa jawaban baru
+    tidak merakit ulang.
+    """
+    entries = session_entries(messages)
+    if not entries:
+        return b""
+    key = _session_key("pdf", entries, version, title)
+    return _cache_get_or_create(cache, key, lambda: _render_session_pdf(entries, cache, version, title))
+
+
+def _render_session_pdf(entries: list, cache, version, title: str) -> bytes:
+    from pypdf import PdfReader, PdfWriter
+
+    body = assemble_pdf_body(entries, cache, version)
+    threat_counts = [len(get_threat_records(e.content)) for e in entries]
+
+    # Nomor halaman bergantung pada panjang daftar isi itu sendiri: render ulang sekali jika > 1 halaman
+    toc_pages, toc = 1, None
+    for _ in range(2):
+        first_pages, page = [], toc_pages + 1
+        for count in body.pages:
+            first_pages.append(page)
+            page += count
+        toc = PdfReader(BytesIO(render_html_pdf_bytes(_toc_html(entries, first_pages, threat_counts, title))))
+        if len(toc.pages) == toc_pages:
+            break
+        toc_pages = len(toc.pages)
+
+    writer = PdfWriter()
+    writer.append(toc, import_outline=False)
+    writer.append(PdfReader(BytesIO(body.pdf)), import_outline=False)
+    writer.add_outline_item("Daftar Isi", 0)
+    for entry, first in zip(entries, first_pages):
+        writer.add_outline_item(f"{entry.number}. {entry.title}", first - 1)
+    writer.add_metadata({"/Title": title})
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+# -------------------------
+# Excel
+# -------------------------
+@lru_cache(maxsize=256)
+def _entry_sheets(content: str) -> tuple:
+    """DataFrame tabel threat satu jawaban (sudah di-strip), memo per isi pesan."""
+    return tuple(_strip_frame(t.to_dataframe()) for t in get_report_document(content).tables_of_kind("threat"))
+
+
+def _overview_frame(entries: list, records: list):
+    import pandas as pd
+
+    rows = []
+    for entry, rec in zip(entries, records):
+        scores = rec.score[~np.isnan(rec.score)]
+        rows.append({
+            "NO": entry.number,
+            "PERTANYAAN": entry.title,
+            "JUMLAH THREAT": len(rec),
+            "DREAD MAKS": round(float(scores.max()), 2) if len(scores) else None,
+            "CWE": ", ".join(c for c, _n in rec.cwe_counts(top=5)),
+        })
+    return pd.DataFrame(rows, dtype=object)
+
+
+def render_session_excel(messages: list, cache=None, version=0, fast: bool = None) -> bytes:
+    """Workbook laporan sesi: sheet 'Ringkasan Sesi' + satu sheet per tabel threat + agregat."""
+    entries = session_entries(messages)
+    if not entries:
+        return b""
+    key = _session_key("xlsx", entries, version, SESSION_TITLE)
+    return _cache_get_or_create(cache, key, lambda: _render_session_excel(entries, fast))
+
+
+def _render_session_excel(entries: list, fast: bool = None) -> bytes:
+    records = [get_threat_records(e.content).with_source(e.number) for e in entries]
+    sheets = [("Ringkasan Sesi", _strip_frame(_overview_frame(entries, records)))]
+    for entry in entries:
+        tables = _entry_sheets(entry.content)
+        for j, df in enumerate(tables, start=1):
+            suffix = f" T{j}" if len(tables) > 1 else ""
+            sheets.append((_clean_sheet_name(f"{entry.number:02d} Threat{suffix}"), df))
+    for sheet_name, df in _summary_frames(concat_records(records)):
+        sheets.append((_clean_sheet_name(sheet_name), _strip_frame(df)))
+    return write_workbook(sheets, fast=fast)
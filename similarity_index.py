@@ -0,0 +1,201 @@
+"""
+Indeks kemiripan analisis sebelumnya (TF-IDF ber-hash di NumPy).
+
+Flow yang hampir sama ("user login dengan OTP" vs "login OTP user") tidak perlu
+dianalisis ulang penuh oleh model 70B:
+- Tiap analisis = prompt user + teks flow/threat/CWE dari threat_rows SQLite;
+  keduanya jadi vektor jarang terpisah (kata + trigram karakter, di-hash ke
+  ruang fitur tetap), jadi urutan kata dan variasi imbuhan tidak berpengaruh
+- Skor = gabungan berbobot kosinus TF-IDF prompt dan kosinus ke teks threat
+- Inkremental: `sync(store)` hanya mengambil jawaban dengan id lebih besar dari
+  yang terakhir diindeks; df & norma dihitung ulang hanya saat ada dokumen baru
+- Pencarian per user, O(jumlah fitur tersimpan) dengan np.bincount
+Tanpa pemanggilan Streamlit.
+"""
+import math
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from context_budget import digest_assistant_message
+
+DIM = 1 << 18
+PROMPT_WEIGHT = 0.75            # sisanya untuk kemiripan prompt ↔ teks threat analisis lama
+TRIGRAM_WEIGHT = 0.5            # bobot trigram karakter relatif terhadap kata utuh
+MAX_PROMPT_CHARS = 300
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "dan atau yang di ke dari untuk dengan pada dalam ini itu akan adalah oleh sebagai juga "
+    "tolong buat buatkan analisa analisis analyze the a an and or of to for with in on by is are".split()
+)
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & (DIM - 1)
+
+
+def features(text: str) -> dict:
+    """{indeks fitur: bobot tf} — kata (tanpa stopword) dan trigram karakter per kata."""
+    words, grams = {}, {}
+    for word in _WORD_RE.findall((text or "").casefold()):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        f = _hash("w:" + word)
+        words[f] = words.get(f, 0) + 1
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            f = _hash("c:" + padded[i:i + 3])
+            grams[f] = grams.get(f, 0) + 1
+    # tf sublinear: kata yang diulang-ulang tidak mendominasi
+    out = {f: TRIGRAM_WEIGHT * (1.0 + math.log(c)) for f, c in grams.items()}
+    for f, c in words.items():
+        out[f] = out.get(f, 0.0) + 1.0 + math.log(c)
+    return out
+
+
+class _Field:
+    """Satu ruang vektor TF-IDF jarang; entri disimpan sebagai array (dokumen, fitur, tf)."""
+
+    def __init__(self):
+        self.df = np.zeros(DIM, dtype=np.int32)
+        self._parts = []
+        self._docs = self._feats = self._tf = None
+        self._norms = None
+        self._idf = None
+
+    def add(self, doc: int, feats: dict) -> None:
+        if feats:
+            keys = np.fromiter(feats.keys(), dtype=np.int64, count=len(feats))
+            self._parts.append((np.full(len(feats), doc, dtype=np.int32), keys,
+                                np.fromiter(feats.values(), dtype=np.float32, count=len(feats))))
+            self.df[keys] += 1
+        self._norms = None
+
+    def _prepare(self, n_docs: int) -> None:
+        if self._norms is not None and len(self._norms) == n_docs:
+            return
+        if self._parts:
+            docs, feats, tf = zip(*self._parts)
+            if self._docs is not None:
+                docs, feats, tf = (self._docs,) + docs, (self._feats,) + feats, (self._tf,) + tf
+            self._docs, self._feats, self._tf = np.concatenate(docs), np.concatenate(feats), np.concatenate(tf)
+            self._parts = []
+        self._idf = (np.log((n_docs + 1) / (self.df + 1.0)) + 1.0).astype(np.float32)
+        if self._docs is None:
+            self._norms = np.zeros(n_docs, dtype=np.float32)
+            return
+        weights = self._tf * self._idf[self._feats]
+        self._norms = np.sqrt(np.bincount(self._docs, weights * weights, minlength=n_docs)).astype(np.float32)
+
+    def scores(self, query: dict, n_docs: int) -> np.ndarray:
+        """Kosinus TF-IDF `query` ke semua dokumen (0 untuk dokumen tanpa fitur)."""
+        self._prepare(n_docs)
+        if not query or self._docs is None:
+            return np.zeros(n_docs, dtype=np.float32)
+        keys = np.fromiter(query.keys(), dtype=np.int64, count=len(query))
+        q = np.zeros(DIM, dtype=np.float32)
+        q[keys] = np.fromiter(query.values(), dtype=np.float32, count=len(query)) * self._idf[keys]
+        q_norm = float(np.sqrt(np.dot(q[keys], q[keys])))
+        hit = q[self._feats] != 0
+        dots = np.bincount(self._docs[hit], (self._tf[hit] * self._idf[self._feats[hit]] * q[self._feats[hit]]),
+                           minlength=n_docs)
+        denom = self._norms * q_norm
+        return np.divide(dots, denom, out=np.zeros(n_docs, dtype=np.float64), where=denom > 0)
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompt = _Field()
+        self._threats = _Field()
+        self._meta = []             # dict per dokumen (tanpa isi jawaban)
+        self._users = []
+        self.last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def add(self, analysis: dict) -> None:
+        """Tambah satu analisis (format AnalysisStore.load_analyses)."""
+        with self._lock:
+            if analysis["id"] <= self.last_id:        # sudah diindeks (sync bersamaan dari sesi lain)
+                return
+            self.last_id = analysis["id"]
+            if not analysis.get("indexable", True) or not (analysis.get("prompt") or "").strip():
+                return
+            doc = len(self._meta)
+            self._prompt.add(doc, features(analysis["prompt"]))
+            self._threats.add(doc, features(analysis.get("threats", "")))
+            prompt = " ".join(analysis["prompt"].split())
+            self._meta.append({
+                "id": analysis["id"],
+                "conversation_id": analysis.get("conversation_id"),
+                "prompt": prompt[:MAX_PROMPT_CHARS] + ("…" if len(prompt) > MAX_PROMPT_CHARS else ""),
+                "model": analysis.get("model"),
+                "created": analysis.get("created"),
+                "threat_count": analysis.get("threat_count", 0),
+            })
+            self._users.append(analysis.get("username", ""))
+
+    def sync(self, store, batch: int = 1000) -> int:
+        """Indeks jawaban baru dari AnalysisStore (id > last_id); mengembalikan jumlah yang dibaca."""
+        total = 0
+        while True:
+            analyses = store.load_analyses(after_id=self.last_id, limit=batch)
+            for analysis in analyses:
+                self.add(analysis)
+            total += len(analyses)
+            if len(analyses) < batch:
+                return total
+
+    def search(self, prompt: str, username: str = None, limit: int = 3, min_score: float = 0.0) -> list:
+        """Analisis paling mirip dengan `prompt`: list dict metadata + 'score' (0..1), skor menurun."""
+        query = features(prompt)
+        with self._lock:
+            n = len(self._meta)
+            if not n or not query:
+                return []
+            scores = (PROMPT_WEIGHT * self._prompt.scores(query, n)
+                      + (1 - PROMPT_WEIGHT) * self._threats.scores(query, n))
+            if username is not None:
+                scores[np.asarray(self._users, dtype=object) != username] = 0.0
+            order = np.lexsort((-np.arange(n), -scores))     # skor sama: analisis terbaru dulu
+            out, seen = [], set()
+            for doc in order:
+                score = float(scores[doc])
+                if score <= 0 or score < min_score or len(out) >= limit:
+                    break
+                meta = self._meta[doc]
+                # Pertanyaan yang sama persis cukup tampil sekali (yang terbaru)
+                key = meta["prompt"].casefold()
+                if key in seen:
+                    continue
+                seen.add(key)
+                out.append(dict(meta, score=round(score, 3)))
+        return out
+
+
+def find_similar(index: SimilarityIndex, store, prompt: str, username: str = None,
+                 limit: int = 3, min_score: float = 0.5) -> list:
+    """Sinkronkan indeks dengan store lalu cari; jawaban yang sudah dihapus dilewati."""
+    index.sync(store)
+    matches = []
+    for match in index.search(prompt, username, limit=limit * 2, min_score=min_score):
+        if len(matches) >= limit:
+            break
+        if store.get_message(match["id"]) is not None:
+            matches.append(match)
+    return matches
+
+
+def context_prompt(prompt: str, prior_prompt: str, prior_content: str) -> str:
+    """Prompt + ringkasan ringkas analisis serupa sebelumnya sebagai acuan (bukan jawaban utuh)."""
+    return (
+        f"{prompt}\n\n"
+        f"Sebagai acuan, ini ringkasan analisis sebelumnya untuk flow serupa (\"{prior_prompt}\"):\n"
+        f"{digest_assistant_message(prior_content)}\n\n"
+        "Sesuaikan dengan flow di atas; tambahkan threat yang belum tercakup dan koreksi yang tidak relevan."
+    )
@@ -0,0 +1,77 @@
+"""
+Buffer untuk respons LLM yang di-stream token demi token.
+
+Tujuannya mengurangi render ulang markdown yang mahal di Streamlit:
+- Di luar tabel: render ulang setelah cukup banyak karakter baru / jeda waktu
+- Di dalam tabel markdown: render ulang hanya saat satu baris tabel selesai,
+  dan baris yang masih setengah jadi tidak ditampilkan (agar tabel tidak "pecah")
+"""
+import time
+
+
+def _is_table_line(line: str) -> bool:
+    return line.lstrip().startswith("|")
+
+
+class MarkdownStreamBuffer:
+    def __init__(self, min_chars: int = 40, min_interval: float = 0.15, clock=time.monotonic):
+        self.min_chars = min_chars
+        self.min_interval = min_interval
+        self._clock = clock
+        self._text = ""
+        self._rendered_len = 0
+        self._last_render = clock()
+        self.renders = 0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def _tail_state(self, text: str):
+        """(baris_terakhir_lengkap, baris_parsial) dari teks saat ini."""
+        cut = text.rfind("\n")
+        partial = text[cut + 1:]
+        if cut < 0:
+            return "", partial
+        prev_cut = text.rfind("\n", 0, cut)
+        return text[prev_cut + 1:cut], partial
+
+    def in_table(self) -> bool:
+        """True jika teks sedang berada di dalam tabel markdown (baris parsial atau baris terakhir)."""
+        last_line, partial = self._tail_state(self.text)
+        return _is_table_line(partial) or (not partial.strip() and _is_table_line(last_line))
+
+    def feed(self, delta: str) -> bool:
+        """Tambahkan potongan token; True jika tampilan sebaiknya dirender ulang."""
+        if not delta:
+            return False
+        self._text += delta
+
+        if self.in_table():
+            # Di dalam tabel: tunggu sampai baris selesai
+            if "\n" not in delta:
+                return False
+            return self._mark_rendered(len(self.renderable()))
+
+        new_chars = len(self._text) - self._rendered_len
+        if new_chars >= self.min_chars or (self._clock() - self._last_render) >= self.min_interval:
+            return self._mark_rendered(len(self._text))
+        return False
+
+    def _mark_rendered(self, upto: int) -> bool:
+        if upto <= self._rendered_len:
+            return False
+        self._rendered_len = upto
+        self._last_render = self._clock()
+        self.renders += 1
+        return True
+
+    def renderable(self) -> str:
+        """Teks yang aman untuk ditampilkan (tanpa baris tabel yang belum lengkap)."""
+        text = self.text
+        cut = text.rfind("\n")
+        if cut >= 0 and _is_table_line(text[cut + 1:]):
+            return text[:cut + 1]
+        if cut < 0 and _is_table_line(text):
+            return ""
+        return text
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+
+@pytest.fixture
+def sample_report():
+    """Jawaban contoh berformat SYSTEM_PROMPT_CONTENT (threat ditulis dengan kode OWASP)."""
+    from fake_groq_server import SAMPLE_REPORT
+
+    return SAMPLE_REPORT
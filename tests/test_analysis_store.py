@@ -0,0 +1,16 @@
+from analysis_store import AnalysisStore
+
+
+def test_load_contents_covers_whole_conversation(tmp_path, sample_report):
+    store = AnalysisStore(str(tmp_path / "analysis.db"))
+    cid = store.create_conversation("putri")
+    for i in range(6):
+        store.append_message(cid, {"role": "user", "content": f"flow {i}"}, username="putri")
+        store.append_message(cid, {"role": "assistant", "content": sample_report}, username="putri")
+
+    assert len(store.load_messages(cid, limit=4)) == 4
+    contents = store.load_contents(cid)
+    assert [seq for seq, _ in contents] == [1, 3, 5, 7, 9, 11]
+    assert all(content == sample_report for _, content in contents)
+    assert store.load_contents(cid, role="user")[0] == (0, "flow 0")
+    store.close()
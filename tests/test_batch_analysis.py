@@ -0,0 +1,40 @@
+from batch_analysis import BatchResult, merge_batch_results
+from report_model import parse_report
+
+LOGIN = """| FLOW PROSES | THREAT | C | I | Au | Av | N | SCENARIO | REKOMENDASI PENGAMANAN |
+|---|---|---|---|---|---|---|---|---|
+| user login | SQL Injection | v |  |  |  |  | payload di form login | parameterized queries |
+"""
+
+# Flow kedua: urutan kolom berbeda dan tanpa kolom N
+TRANSFER = """| THREAT | SCENARIO | FLOW PROSES | REKOMENDASI PENGAMANAN | C | I | Au | Av |
+|---|---|---|---|---|---|---|---|
+| Tampering nominal | ubah nominal di request | transfer dana | tanda tangan request |  | v |  |  |
+"""
+
+
+def test_merge_batch_results_maps_columns_by_name():
+    results = [
+        BatchResult(index=1, flow="transfer dana", response=TRANSFER),
+        BatchResult(index=0, flow="user login", response=LOGIN),
+    ]
+    report = merge_batch_results(results)
+
+    table = parse_report(report).tables[0]
+    assert table.header == ["NO FLOW", "FLOW PROSES", "THREAT", "C", "I", "Au", "Av", "N", "SCENARIO",
+                            "REKOMENDASI PENGAMANAN"]
+    rows = [dict(zip(table.header, row)) for row in table.rows]
+    assert rows[0]["NO FLOW"] == "1" and rows[0]["THREAT"] == "SQL Injection"
+    transfer = rows[1]
+    assert transfer["NO FLOW"] == "2"
+    assert transfer["FLOW PROSES"] == "transfer dana"
+    assert transfer["THREAT"] == "Tampering nominal"
+    assert (transfer["C"], transfer["I"], transfer["N"]) == ("", "v", "")
+    assert transfer["SCENARIO"] == "ubah nominal di request"
+    assert transfer["REKOMENDASI PENGAMANAN"] == "tanda tangan request"
+
+
+def test_merge_batch_results_lists_failed_flows():
+    report = merge_batch_results([BatchResult(index=0, flow="user login", error="HTTP 429")])
+    assert "Konsolidasi Threat" not in report
+    assert "Flow 1: user login — HTTP 429" in report
@@ -0,0 +1,75 @@
+from batch_analysis import BatchResult
+from chunked_analysis import merge_chunk_results, merge_dread_scores, merge_threat_tables, split_into_chunks
+
+FIRST = """| FLOW PROSES | THREAT | C | I | Au | Av | N | SCENARIO | REKOMENDASI PENGAMANAN |
+|---|---|---|---|---|---|---|---|---|
+| user login | SQL Injection | v |  |  |  |  | payload di form login | parameterized queries |
+"""
+
+# Urutan kolom berbeda, tanpa kolom N, dan ada kolom tambahan
+SECOND = """| THREAT | FLOW PROSES | SCENARIO | C | I | Au | Av | REKOMENDASI PENGAMANAN | OWNER |
+|---|---|---|---|---|---|---|---|---|
+| SQL Injection | user login | payload lain | | v | | | prepared statement | tim backend |
+| Brute force | user login | tebak password | v | | v | | rate limiting | tim auth |
+"""
+
+
+def _result(index, response="", error=""):
+    return BatchResult(index=index, flow=f"bagian {index}", response=response, error=error)
+
+
+def test_merge_maps_cells_by_column_name():
+    header, rows, total = merge_threat_tables([_result(0, FIRST), _result(1, SECOND)])
+    assert header == ["FLOW PROSES", "THREAT", "C", "I", "Au", "Av", "N", "SCENARIO",
+                      "REKOMENDASI PENGAMANAN", "OWNER"]
+    assert total == 3
+    by_threat = {row[1]: dict(zip(header, row)) for row in rows}
+    sqli = by_threat["SQL Injection"]
+    assert (sqli["C"], sqli["I"]) == ("v", "v")             # tanda digabung antar bagian
+    assert sqli["SCENARIO"] == "payload di form login"
+    assert sqli["OWNER"] == "tim backend"
+    brute = by_threat["Brute force"]
+    assert brute["FLOW PROSES"] == "user login"
+    assert (brute["C"], brute["Au"], brute["N"]) == ("v", "v", "")
+    assert brute["REKOMENDASI PENGAMANAN"] == "rate limiting"
+
+
+def test_merge_ignores_owasp_and_cwe_codes_in_threat_names():
+    coded = FIRST.replace("| SQL Injection |", "| SQL Injection (A03:2021, CWE-89) |") + (
+        "\n| THREAT | DAMAGE | REPRODUCIBILITY | EXPLOITABILITY | AFFECTED USERS | DISCOVERABILITY |\n"
+        "|---|---|---|---|---|---|\n"
+        "| SQL Injection (A03:2021) | 5 | 4 | 4 | 4 | 3 |\n"
+    )
+    plain = SECOND + (
+        "\n| THREAT | DAMAGE | REPRODUCIBILITY | EXPLOITABILITY | AFFECTED USERS | DISCOVERABILITY |\n"
+        "|---|---|---|---|---|---|\n"
+        "| SQL Injection | 3 | 3 | 3 | 3 | 3 |\n"
+    )
+    results = [_result(0, coded), _result(1, plain)]
+
+    header, rows, total = merge_threat_tables(results)
+    assert total == 3 and len(rows) == 2
+    assert sorted(row[1] for row in rows) == ["Brute force", "SQL Injection (A03:2021, CWE-89)"]
+
+    scores = merge_dread_scores(results)
+    assert len(scores) == 1
+    assert scores[0][1:] == (4.0, [1, 2])
+
+
+def test_merge_skips_failed_chunks():
+    header, rows, total = merge_threat_tables([_result(0, error="timeout"), _result(1, SECOND)])
+    assert header[:2] == ["THREAT", "FLOW PROSES"]
+    assert total == len(rows) == 2
+
+
+def test_merge_chunk_results_lists_failed_parts():
+    report = merge_chunk_results([_result(0, FIRST), _result(1, error="HTTP 429")], "doc.pdf", "apa risikonya?")
+    assert "Bagian 2 — HTTP 429" in report
+    assert "SQL Injection" in report
+
+
+def test_split_into_chunks_respects_budget_and_overlap():
+    text = "\n".join(f"baris nomor {i}" for i in range(40))
+    chunks = split_into_chunks(text, max_tokens=30, overlap_tokens=6)
+    assert len(chunks) > 1
+    assert chunks[1].splitlines()[0] in chunks[0]
@@ -0,0 +1,23 @@
+from cli import MERGED_NAME, read_inputs
+
+
+def test_read_inputs_dedups_same_stem_from_different_dirs(tmp_path):
+    paths = []
+    for folder in ("a", "b", "c"):
+        (tmp_path / folder).mkdir()
+        path = tmp_path / folder / "laporan.md"
+        path.write_text(f"isi {folder}", encoding="utf-8")
+        paths.append(str(path))
+
+    items = read_inputs(paths, "export")
+
+    assert [name for name, _ in items] == ["laporan", "laporan_2", "laporan_3"]
+    assert [text for _, text in items] == ["isi a", "isi b", "isi c"]
+
+
+def test_read_inputs_keeps_merged_report_name_free(tmp_path):
+    path = tmp_path / f"{MERGED_NAME}.txt"
+    path.write_text("user login dengan OTP", encoding="utf-8")
+
+    assert read_inputs([str(path)], "analyze") == [(f"{MERGED_NAME}_2", "user login dengan OTP")]
+    assert read_inputs([str(path)], "export") == [(MERGED_NAME, "user login dengan OTP")]
@@ -0,0 +1,24 @@
+from context_budget import build_context, digest_assistant_message
+
+
+def test_digest_keeps_cwe_and_dread_for_threats_with_owasp_codes(sample_report):
+    digest = digest_assistant_message(sample_report)
+    lines = digest.splitlines()
+    assert lines[0] == "[Ringkasan analisis sebelumnya]"
+    assert lines[1] == "- Flow: user login | Threat: SQL Injection A03:2021 | CWE: CWE-89 | DREAD: 4.4"
+    assert lines[2] == "- Flow: user login | Threat: Brute force | DREAD: 3.8"
+
+
+def test_build_context_digests_older_answers(sample_report):
+    system = {"role": "system", "content": "sistem"}
+    history = [
+        {"role": "user", "content": "flow 1"},
+        {"role": "assistant", "content": sample_report},
+        {"role": "user", "content": "flow 2"},
+        {"role": "assistant", "content": sample_report},
+        {"role": "user", "content": "flow 3"},
+    ]
+    messages, report = build_context(system, history, "llama-3.3-70b-versatile", keep_recent=3)
+    assert report["digested"] == 1
+    assert messages[2]["content"].startswith("[Ringkasan analisis sebelumnya]")
+    assert messages[-1] == {"role": "user", "content": "flow 3"}
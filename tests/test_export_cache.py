@@ -0,0 +1,53 @@
+from export_cache import ExportCache, make_export_key
+
+
+def test_make_export_key_ignores_settings_order():
+    assert make_export_key("pdf", "isi", a=1, b=2) == make_export_key("pdf", "isi", b=2, a=1)
+    assert make_export_key("pdf", "isi") != make_export_key("xlsx", "isi")
+
+
+def test_evicts_least_recently_used_by_entries():
+    cache = ExportCache(max_entries=2, max_bytes=0)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_bytes_but_keeps_newest_entry():
+    cache = ExportCache(max_entries=10, max_bytes=10)
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 6
+
+    cache.put("big", b"z" * 50)
+    assert cache.get("big") == b"z" * 50
+    assert cache.stats()["entries"] == 1
+
+
+def test_empty_values_are_not_cached():
+    cache = ExportCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_create("k", factory) is None
+    assert cache.get_or_create("k", factory) is None
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicted_entries_come_back_from_spill_dir(tmp_path):
+    cache = ExportCache(max_entries=1, max_bytes=0, spill_dir=str(tmp_path))
+    cache.put("a", b"pdf-a")
+    cache.put("b", b"pdf-b")
+
+    assert cache.get("a") == b"pdf-a"
+    assert cache.stats()["disk_hits"] == 1
@@ -0,0 +1,50 @@
+import time
+
+from export_pool import JOB_DONE, JOB_PENDING, JOB_TIMEOUT, ExportExecutor
+
+
+def _report(rows):
+    return "| No | Threat | CWE |\n|---|---|---|\n" + "".join(f"| {i} | SQL Injection | CWE-89 |\n" for i in range(rows))
+
+
+REPORT = _report(2000)
+
+
+def _wait(executor, job_id, deadline=60.0):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        state, result = executor.poll(job_id)
+        if state != JOB_PENDING:
+            return state, result
+        time.sleep(0.05)
+    raise AssertionError("job tidak selesai")
+
+
+def test_timed_out_job_recycles_pool_and_resubmits_others():
+    executor = ExportExecutor(max_workers=1, default_timeout=60)
+    try:
+        slow = executor.submit("pdf", REPORT, key="slow", timeout=0.2)
+        queued = executor.submit("xlsx", "| a | b |\n|---|---|\n| 1 | 2 |\n", key="queued")
+        assert _wait(executor, slow)[0] == JOB_TIMEOUT
+        assert executor.stats()["recycled"] == 1
+        state, result = _wait(executor, queued)
+        assert state == JOB_DONE and result[:2] == b"PK"
+    finally:
+        executor.shutdown()
+
+
+def test_timeout_starts_when_job_runs_not_when_queued():
+    executor = ExportExecutor(max_workers=1, default_timeout=60)
+    try:
+        busy = executor.submit("pdf", _report(600), key="busy")
+        queued = executor.submit("xlsx", "| a | b |\n|---|---|\n| 1 | 2 |\n", key="queued", timeout=1.5)
+        # Job kedua di-poll selama menunggu di antrean (seperti UI), jauh melewati timeout-nya
+        while executor.poll(busy)[0] == JOB_PENDING:
+            assert executor.poll(queued)[0] == JOB_PENDING
+            time.sleep(0.05)
+        assert executor.poll(busy)[0] == JOB_DONE
+        state, result = _wait(executor, queued)
+        assert state == JOB_DONE and result[:2] == b"PK"
+        assert executor.stats()["timed_out"] == executor.stats()["recycled"] == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,121 @@
+import pytest
+
+from groq_scheduler import GroqScheduler, ModelLimits, SchedulerError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """Meniru client.chat.completions.create; `outcomes[model]` = daftar hasil/exception berurutan."""
+
+    def __init__(self, outcomes):
+        self.outcomes = {m: list(v) for m, v in outcomes.items()}
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, messages, model, **kwargs):
+        self.calls.append(model)
+        outcome = self.outcomes[model].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _scheduler(clock, **kwargs):
+    kwargs.setdefault("limits", {"m1": ModelLimits(600, 10 ** 6), "m2": ModelLimits(600, 10 ** 6)})
+    return GroqScheduler(sleep=clock.sleep, clock=clock, backoff_base=0.01, **kwargs)
+
+
+def test_token_bucket_reserve_returns_wait_and_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)           # 1 token/detik, kapasitas 60
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_token_bucket_caps_request_at_capacity():
+    bucket = TokenBucket(60, clock=FakeClock())
+    assert bucket.reserve(1000) == 0.0              # dipotong ke kapasitas, tidak menunggu selamanya
+
+
+def test_retry_then_success():
+    clock = FakeClock()
+    client = FakeClient({"m1": [ApiError(503), ApiError(429), "ok"]})
+    scheduler = _scheduler(clock, max_retries=3)
+    assert scheduler.create(client, [{"role": "user", "content": "x"}], "m1") == ("ok", "m1")
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 1 and stats["active"] == 0
+
+
+def test_non_retryable_error_is_raised_immediately():
+    client = FakeClient({"m1": [ApiError(400), "ok"]})
+    with pytest.raises(ApiError):
+        _scheduler(FakeClock()).create(client, [], "m1")
+    assert client.calls == ["m1"]
+
+
+def test_fallback_to_next_model_after_retries():
+    client = FakeClient({"m1": [ApiError(429), ApiError(429)], "m2": ["ok"]})
+    scheduler = _scheduler(FakeClock(), max_retries=1)
+    assert scheduler.create(client, [], "m1", fallback_models=["m2"]) == ("ok", "m2")
+    assert client.calls == ["m1", "m1", "m2"]
+    assert scheduler.stats()["fallbacks"] == 1
+
+
+def test_all_models_fail_raises_scheduler_error():
+    client = FakeClient({"m1": [ApiError(500)] * 2, "m2": [ApiError(500)] * 2})
+    with pytest.raises(SchedulerError) as info:
+        _scheduler(FakeClock(), max_retries=1).create(client, [], "m1", fallback_models=["m2"])
+    assert isinstance(info.value.last_error, ApiError)
+
+
+def test_rate_limit_wait_happens_before_taking_a_slot():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, limits={"m1": ModelLimits(1, 10 ** 6)})
+    active_during_sleep = []
+
+    def sleep(seconds):
+        active_during_sleep.append(scheduler.stats()["active"])
+        clock.sleep(seconds)
+
+    scheduler._sleep = sleep
+    client = FakeClient({"m1": ["a", "b"]})
+    scheduler.create(client, [], "m1")
+    scheduler.create(client, [], "m1")              # bucket 1 request/menit → menunggu
+    assert active_during_sleep == [0]
+
+
+def test_stream_holds_slot_until_consumed():
+    scheduler = _scheduler(FakeClock(), max_concurrent=1)
+    client = FakeClient({"m1": [iter(["a", "b"])]})
+    stream, _model = scheduler.create(client, [], "m1", stream=True)
+    assert scheduler.stats()["active"] == 1
+    assert list(stream) == ["a", "b"]
+    assert scheduler.stats()["active"] == 0
+
+
+def test_stream_close_releases_slot():
+    scheduler = _scheduler(FakeClock(), max_concurrent=1)
+    client = FakeClient({"m1": [iter(["a", "b"])]})
+    stream, _model = scheduler.create(client, [], "m1", stream=True)
+    with stream:
+        next(iter(stream))
+    assert scheduler.stats()["active"] == 0
@@ -0,0 +1,14 @@
+from export_cache import ExportCache
+from ingestion import ingest
+
+
+def test_cache_hit_keeps_current_upload_name():
+    cache = ExportCache()
+    data = "user login dengan OTP\n".encode("utf-8")
+    first = ingest(data, "flow_lama.txt", cache=cache)
+    again = ingest(data, "flow_baru.txt", cache=cache)
+
+    assert again.name == "flow_baru.txt"
+    assert again.text == first.text
+    assert cache.stats()["hits"] == 1
+    assert ingest(data, "flow_lama.txt", cache=cache).name == "flow_lama.txt"
@@ -0,0 +1,65 @@
+import pytest
+
+from response_cache import ResponseCache, response_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _cache(tmp_path, clock, **kwargs):
+    return ResponseCache(str(tmp_path / "cache.db"), clock=clock, **kwargs)
+
+
+def test_response_key_normalizes_prompt():
+    a = response_key("sys", "m", [{"role": "user", "content": "Login  OTP"}])
+    b = response_key("sys", "m", [{"role": "user", "content": "login otp"}])
+    assert a == b
+    assert a != response_key("sys", "m2", [{"role": "user", "content": "login otp"}])
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, clock, ttl_seconds=60)
+    cache.put("k", "model", "prompt", "jawaban")
+    clock.now += 59
+    assert cache.get("k")["response"] == "jawaban"
+
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_hit_by_entries(tmp_path, clock):
+    cache = _cache(tmp_path, clock, max_entries=2)
+    cache.put("a", "m", "p", "A")
+    clock.now += 1
+    cache.put("b", "m", "p", "B")
+    clock.now += 1
+    assert cache.get("a") is not None
+    clock.now += 1
+    cache.put("c", "m", "p", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_evicts_oldest_by_bytes(tmp_path, clock):
+    cache = _cache(tmp_path, clock, max_entries=100, max_bytes=25)
+    cache.put("a", "m", "p", "x" * 10)
+    clock.now += 1
+    cache.put("b", "m", "p", "y" * 10)
+    clock.now += 1
+    cache.put("c", "m", "p", "z" * 10)
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 25
+    assert cache.get("c")["response"] == "z" * 10
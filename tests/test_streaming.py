@@ -0,0 +1,14 @@
+from streaming import MarkdownStreamBuffer
+
+
+def test_table_rows_render_only_when_complete():
+    buf = MarkdownStreamBuffer(min_chars=5, clock=lambda: 0.0)
+    assert buf.feed("Ringkasan analisis\n")
+    assert not buf.feed("| FLOW | THREAT ")
+    assert buf.in_table()
+    assert buf.renderable() == "Ringkasan analisis\n"
+    assert buf.feed("|\n|---|---|\n")
+    assert not buf.feed("| login | SQL")
+    assert buf.feed("i |\nSelesai dianalisis")
+    assert not buf.in_table()
+    assert buf.renderable().endswith("Selesai dianalisis")
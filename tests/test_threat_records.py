@@ -0,0 +1,50 @@
+import math
+
+from threat_records import parse_threat_records, threat_key
+
+
+def test_threat_key_strips_owasp_and_cwe_codes():
+    assert threat_key("SQL Injection A03:2021") == "sql injection"
+    assert threat_key("**SQL Injection** (CWE-89)") == "sql injection"
+    assert threat_key("SQL Injection") == "sql injection"
+
+
+def test_sample_report_links_cwe_and_dread_to_threat_rows(sample_report):
+    rows = parse_threat_records(sample_report).rows()
+    assert [r["threat"] for r in rows] == ["SQL Injection A03:2021", "Brute force"]
+    sqli, brute = rows
+    assert sqli["flow"] == "user login"
+    assert sqli["cwes"] == ["CWE-89"]
+    assert sqli["dread"] == 4.4
+    assert sqli["ciaan"] == "C, I"
+    assert brute["dread"] == 3.8
+    assert brute["ciaan"] == "C, Au, Av"
+
+
+def test_sample_report_has_no_flowless_rows(sample_report):
+    records = parse_threat_records(sample_report)
+    assert records.flows == ["user login"]
+    assert [r["flow"] for r in records.flow_risk()] == ["user login"]
+
+
+def test_dread_only_answer_keeps_scores_for_top_n():
+    markdown = (
+        "| Threat | Damage | Reproducibility | Exploitability | Affected Users | Discoverability | Skor |\n"
+        "|---|---|---|---|---|---|---|\n"
+        "| XSS | 3 | 3 | 3 | 3 | 3 | 3.0 |\n"
+    )
+    records = parse_threat_records(markdown)
+    assert len(records) == 1
+    assert math.isclose(float(records.score[0]), 3.0)
+
+
+def test_negative_ciaan_marks_are_not_counted():
+    markdown = (
+        "| FLOW PROSES | THREAT | C | I | Au | Av | N | SCENARIO | REKOMENDASI PENGAMANAN |\n"
+        "|---|---|---|---|---|---|---|---|---|\n"
+        "| login | Brute force | ✓ | - | ✗ | N/A | tidak | tebak password | rate limiting |\n"
+        "| login | Replay | no | x̶ | Ya | ✔ | V | kirim ulang token | nonce |\n"
+    )
+    brute, replay = parse_threat_records(markdown).rows()
+    assert brute["ciaan"] == "C"
+    assert replay["ciaan"] == "Au, Av, N"
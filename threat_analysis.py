@@ -0,0 +1,65 @@
+"""
+Lapisan analisis tanpa Streamlit: daftar model, system prompt, klien Groq, dan
+analisis banyak flow → markdown laporan. Dipakai aplikasi Streamlit dan cli.py.
+
+- Klien Groq memakai pool koneksi yang cukup untuk request bersamaan dari
+  GroqScheduler; retry bawaan SDK dimatikan karena ditangani scheduler
+- analyze_flows = run_batch + validasi/pengayaan CWE/OWASP/ASVS lokal
+"""
+from batch_analysis import run_batch
+from reference_index import REFERENCE_PROMPT_HINT, enrich_response
+
+MODEL_OPTIONS = ('llama-3.3-70b-versatile', 'qwen/qwen3-32b', 'deepseek-r1-distill-llama-70b')
+
+# Indentasi dipertahankan apa adanya (teks ini ikut kunci cache respons)
+SYSTEM_PROMPT_CONTENT = """
+    Anda adalah pakar keamanan siber dengan pengalaman 30 tahun, yang mahir dalam mengidentifikasi dan menganalisis potensi ancaman keamanan siber berdasarkan ASVS dan CWE. Jika ada pertanyaan di luar cyber security jangan berikan jawaban.
+    Peran Anda adalah membuat kajian/report dalam tabel yang rapi serta up to date dengan perkembangan cyber security atas poin berikut:
+    1. Gambarkan threat modelling diagram DFD menggunakan arrow.
+
+    2. Berikan dalam tabel dan mapping nomor CWE-nya berdasarkan threat.
+
+    3. Berikan list kerentanan dalam satu tabel pada Confidentiality, Integrity, Authentication, Availability, Non-repudiation atas threat tersebut termasuk dalam threat apa (contoh: SQLi, XSS, IDOR, DDoS). Lalu pada kolom sampingnya berikan Scenario serangan, lalu pada kolom sampingnya berikan rekomendasi keamanannya (minimal 5 rekomendasi).
+       Format tabel contoh:
+       | FLOW PROSES            | THREAT                    | C | I | Au | Av | N | SCENARIO                                                     | REKOMENDASI PENGAMANAN             |
+       ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+       | contoh flow: user login | contoh threat: injection A06:01 | v |   | v  |   | v | fraudster injeksi form login                                 | implementasikan parameterized queries |
+
+    4. Berikan penilaian DREAD (INFORMATIONAL=1, LOW=2, MEDIUM=3, HIGH=4, CRITICAL=5). Beri nilai masing-masing komponen dalam satu kolom, contoh: Discoverability=3, Reproducibility=2, dst. Rata-rata dari 5 komponen adalah skornya.
+
+    5. Gunakan standar industri (OWASP, ASVS, NIST, Gartner) untuk analisis teknis.
+
+    6. Batasi jawaban hanya dalam lingkup keamanan siber.
+
+    7. Semua output Bahasa Indonesia dan jangan buang makna serapan Inggrisnya.
+    """
+
+
+def system_prompt(validate_refs: bool = True) -> str:
+    """System prompt analisis; dengan validasi lokal model cukup menulis nomor CWE."""
+    return SYSTEM_PROMPT_CONTENT + REFERENCE_PROMPT_HINT if validate_refs else SYSTEM_PROMPT_CONTENT
+
+
+def create_groq_client(api_key: str, base_url: str = None, max_concurrent: int = 4, keepalive: float = 60.0):
+    """Klien Groq dengan pool HTTP untuk `max_concurrent` request scheduler + streaming."""
+    import groq
+    import httpx
+
+    http_client = groq.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max(10, max_concurrent * 4),
+            max_keepalive_connections=max(5, max_concurrent * 2),
+            keepalive_expiry=float(keepalive),
+        )
+    )
+    return groq.Groq(api_key=api_key, base_url=base_url or None, max_retries=0, http_client=http_client)
+
+
+def analyze_flows(client, flows: list, model: str, system_prompt: str, scheduler=None, concurrency: int = 4,
+                  retries: int = 2, fallback_models=(), validate_refs: bool = True):
+    """Generator BatchResult (urutan selesai); jawaban yang berhasil diperkaya referensi lokal."""
+    for result in run_batch(client, flows, model, system_prompt, concurrency=concurrency, retries=retries,
+                            scheduler=scheduler, fallback_models=fallback_models):
+        if validate_refs and result.ok:
+            result.response = enrich_response(result.response)
+        yield result
@@ -0,0 +1,322 @@
+"""
+Rekaman threat bertipe dalam bentuk kolumnar (numpy).
+
+Tabel threat 9 kolom + tabel CWE + tabel DREAD pada jawaban asisten di-parse
+SATU kali menjadi array:
+- flow (dictionary-encoded: kode int32 + daftar nama flow)
+- threat, skenario, rekomendasi (array object)
+- C/I/Au/Av/N sebagai bitmask uint8
+- CWE dalam format CSR (cwe_ids int32 + offset per baris)
+- 5 komponen DREAD (float32, NaN jika tidak ada) + skor rata-rata
+
+Agregat lintas sesi/batch (jumlah per CWE, top-N DREAD, risiko per flow)
+dihitung secara vektor dari array tersebut; dashboard, store, dan ekspor
+membaca array ini, bukan mem-parse ulang markdown.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from context_budget import dread_score
+from report_model import get_report_document
+
+CIAAN_BITS = {"c": 1, "i": 2, "au": 4, "av": 8, "n": 16}
+CIAAN_LABELS = (("c", "C"), ("i", "I"), ("au", "Au"), ("av", "Av"), ("n", "N"))
+# Isi sel C/I/Au/Av/N yang berarti "terdampak"; selain ini ('-', '✗', 'tidak', 'N/A', ...) = tidak
+POSITIVE_MARKS = frozenset(("✓", "✔", "√", "v", "x", "y", "ya", "yes", "true", "1"))
+
+DREAD_COMPONENTS = ("damage", "reproducibility", "exploitability", "affected_users", "discoverability")
+# Kata kunci header/penanda untuk tiap komponen (urutan = DREAD_COMPONENTS)
+_DREAD_NEEDLES = (("damage",), ("reproducib",), ("exploitab",), ("affected",), ("discoverab",))
+_DREAD_ASSIGN_RE = re.compile(
+    r"(damage|reproducibility|exploitability|affected\s*users?|discoverability)\s*[=:]\s*([1-5](?:[.,]\d+)?)",
+    re.I,
+)
+_LEVEL_VALUES = {"informational": 1.0, "low": 2.0, "medium": 3.0, "high": 4.0, "critical": 5.0}
+_NUMBER_RE = re.compile(r"\b([1-5](?:[.,]\d+)?)\b")
+_CWE_RE = re.compile(r"CWE[-\s]?(\d{1,4})", re.I)
+_KEY_RE = re.compile(r"[^\w]+")
+_OWASP_IN_TEXT_RE = re.compile(r"\bA(\d{2}):(?:20)?\d{2}\b")
+_CWE_IN_TEXT_RE = re.compile(r"\bCWE[-\s]?\d{1,4}\b", re.I)
+
+
+def threat_key(text: str) -> str:
+    """
+    Kunci pencocokan nama threat antar tabel: huruf kecil, tanpa tanda baca dan tanpa
+    kode OWASP/CWE, jadi 'SQL Injection A03:2021' di tabel threat cocok dengan
+    'SQL Injection' di tabel CWE/DREAD.
+    """
+    text = _CWE_IN_TEXT_RE.sub(" ", _OWASP_IN_TEXT_RE.sub(" ", text or ""))
+    return _KEY_RE.sub(" ", text.lower()).strip()
+
+
+def _level_value(cell: str) -> float:
+    cell = (cell or "").strip()
+    m = _NUMBER_RE.search(cell)
+    if m:
+        return float(m.group(1).replace(",", "."))
+    return _LEVEL_VALUES.get(cell.lower(), np.nan)
+
+
+def ciaan_labels(mask: int) -> str:
+    """Bitmask → 'C, I, Au' (urutan C/I/Au/Av/N)."""
+    return ", ".join(label for key, label in CIAAN_LABELS if int(mask) & CIAAN_BITS[key])
+
+
+def _dread_components(table, row) -> list:
+    """Lima komponen DREAD dari kolom per komponen, atau dari teks 'Damage=3, ...' dalam satu sel."""
+    values = [np.nan] * 5
+    for i, needles in enumerate(_DREAD_NEEDLES):
+        idx = table.column(*needles)
+        if idx is not None and idx < len(row):
+            values[i] = _level_value(row[idx])
+    if all(np.isnan(v) for v in values):
+        for name, value in _DREAD_ASSIGN_RE.findall(" ".join(row)):
+            name = name.lower()
+            for i, needles in enumerate(_DREAD_NEEDLES):
+                if name.startswith(needles[0]):
+                    values[i] = float(value.replace(",", "."))
+    return values
+
+
+class ThreatRecords:
+    """Kumpulan baris threat kolumnar. Gunakan parse_threat_records / concat_records untuk membuat."""
+
+    __slots__ = ("flows", "flow_code", "threat", "scenario", "recommendation",
+                 "ciaan", "dread", "score", "cwe_ids", "cwe_offsets", "source")
+
+    def __init__(self, flows, flow_code, threat, scenario, recommendation,
+                 ciaan, dread, score, cwe_ids, cwe_offsets, source):
+        self.flows = list(flows)
+        self.flow_code = np.asarray(flow_code, dtype=np.int32)
+        self.threat = np.asarray(threat, dtype=object)
+        self.scenario = np.asarray(scenario, dtype=object)
+        self.recommendation = np.asarray(recommendation, dtype=object)
+        self.ciaan = np.asarray(ciaan, dtype=np.uint8)
+        self.dread = np.asarray(dread, dtype=np.float32).reshape(-1, 5)
+        self.score = np.asarray(score, dtype=np.float32)
+        self.cwe_ids = np.asarray(cwe_ids, dtype=np.int32)
+        self.cwe_offsets = np.asarray(cwe_offsets, dtype=np.int32)
+        self.source = np.asarray(source, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.threat)
+
+    @classmethod
+    def from_rows(cls, rows: list, source: int = 0):
+        """rows: dict berisi flow, threat, scenario, recommendation, ciaan (bitmask), dread (5), score, cwes."""
+        flows, codes = [], []
+        index = {}
+        cwe_ids, offsets = [], [0]
+        for row in rows:
+            flow = row.get("flow", "")
+            if flow not in index:
+                index[flow] = len(flows)
+                flows.append(flow)
+            codes.append(index[flow])
+            cwe_ids.extend(row.get("cwes", ()))
+            offsets.append(len(cwe_ids))
+        return cls(
+            flows=flows,
+            flow_code=codes,
+            threat=[r.get("threat", "") for r in rows],
+            scenario=[r.get("scenario", "") for r in rows],
+            recommendation=[r.get("recommendation", "") for r in rows],
+            ciaan=[r.get("ciaan", 0) for r in rows],
+            dread=[r.get("dread", [np.nan] * 5) for r in rows] or np.empty((0, 5)),
+            score=[np.nan if r.get("score") is None else r["score"] for r in rows],
+            cwe_ids=cwe_ids,
+            cwe_offsets=offsets,
+            source=[source] * len(rows),
+        )
+
+    def with_source(self, source: int):
+        """Salinan dangkal dengan kolom `source` diganti (hasil memo tidak diubah)."""
+        return ThreatRecords(self.flows, self.flow_code, self.threat, self.scenario, self.recommendation,
+                             self.ciaan, self.dread, self.score, self.cwe_ids, self.cwe_offsets,
+                             np.full(len(self), source, dtype=np.int32))
+
+    # ---- akses per baris ----
+    def cwes(self, i: int) -> list:
+        return [f"CWE-{c}" for c in self.cwe_ids[self.cwe_offsets[i]:self.cwe_offsets[i + 1]]]
+
+    def flow(self, i: int) -> str:
+        return self.flows[self.flow_code[i]]
+
+    def rows(self) -> list:
+        """Baris sebagai dict (untuk tabel UI / penyimpanan)."""
+        out = []
+        for i in range(len(self)):
+            score = float(self.score[i])
+            out.append({
+                "flow": self.flow(i),
+                "threat": self.threat[i],
+                "scenario": self.scenario[i],
+                "recommendation": self.recommendation[i],
+                "ciaan": ciaan_labels(self.ciaan[i]),
+                "cwes": self.cwes(i),
+                "dread": None if np.isnan(score) else round(score, 2),
+                "source": int(self.source[i]),
+            })
+        return out
+
+    # ---- agregat (vektor) ----
+    def cwe_counts(self, top: int = None) -> list:
+        """[(CWE-id, jumlah threat)] urut terbanyak."""
+        if not len(self.cwe_ids):
+            return []
+        ids, counts = np.unique(self.cwe_ids, return_counts=True)
+        order = np.lexsort((ids, -counts))
+        if top:
+            order = order[:top]
+        return [(f"CWE-{ids[i]}", int(counts[i])) for i in order]
+
+    def top_by_dread(self, n: int = 10) -> list:
+        """Indeks baris dengan skor DREAD tertinggi (baris tanpa skor diabaikan)."""
+        scored = np.flatnonzero(~np.isnan(self.score))
+        order = scored[np.argsort(-self.score[scored], kind="stable")]
+        return order[:n].tolist()
+
+    def flow_risk(self) -> list:
+        """Per flow: jumlah threat, skor DREAD maks & rata-rata, gabungan C/I/Au/Av/N."""
+        k = len(self.flows)
+        if not k:
+            return []
+        codes = self.flow_code
+        counts = np.bincount(codes, minlength=k)
+        scored = ~np.isnan(self.score)
+        sums = np.bincount(codes, weights=np.where(scored, self.score, 0.0), minlength=k)
+        n_scored = np.bincount(codes, weights=scored.astype(np.float64), minlength=k)
+        max_score = np.full(k, np.nan, dtype=np.float32)
+        np.fmax.at(max_score, codes, self.score)
+        masks = np.zeros(k, dtype=np.uint8)
+        np.bitwise_or.at(masks, codes, self.ciaan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_score = np.where(n_scored > 0, sums / n_scored, np.nan)
+        order = np.argsort(-np.nan_to_num(max_score, nan=-1.0), kind="stable")
+        return [
+            {
+                "flow": self.flows[i] or "-",
+                "threats": int(counts[i]),
+                "dread_max": None if np.isnan(max_score[i]) else round(float(max_score[i]), 2),
+                "dread_mean": None if np.isnan(mean_score[i]) else round(float(mean_score[i]), 2),
+                "ciaan": ciaan_labels(masks[i]),
+            }
+            for i in order
+        ]
+
+
+def concat_records(records: list) -> ThreatRecords:
+    """Gabungkan beberapa ThreatRecords (mis. semua pesan satu sesi / semua flow batch)."""
+    records = [r for r in records if r is not None and len(r)]
+    if not records:
+        return ThreatRecords.from_rows([])
+    flows, index = [], {}
+    codes = []
+    for rec in records:
+        remap = np.empty(len(rec.flows), dtype=np.int32)
+        for j, flow in enumerate(rec.flows):
+            if flow not in index:
+                index[flow] = len(flows)
+                flows.append(flow)
+            remap[j] = index[flow]
+        codes.append(remap[rec.flow_code])
+    offsets = [np.zeros(1, dtype=np.int32)]
+    base = 0
+    for rec in records:
+        offsets.append(rec.cwe_offsets[1:] + base)
+        base += len(rec.cwe_ids)
+    return ThreatRecords(
+        flows=flows,
+        flow_code=np.concatenate(codes),
+        threat=np.concatenate([r.threat for r in records]),
+        scenario=np.concatenate([r.scenario for r in records]),
+        recommendation=np.concatenate([r.recommendation for r in records]),
+        ciaan=np.concatenate([r.ciaan for r in records]),
+        dread=np.concatenate([r.dread for r in records]),
+        score=np.concatenate([r.score for r in records]),
+        cwe_ids=np.concatenate([r.cwe_ids for r in records]),
+        cwe_offsets=np.concatenate(offsets),
+        source=np.concatenate([r.source for r in records]),
+    )
+
+
+def parse_threat_records(markdown_content: str, source: int = 0) -> ThreatRecords:
+    """
+    Satu jawaban asisten → ThreatRecords. CWE dan DREAD dari tabel terpisah
+    dihubungkan ke baris threat lewat threat_key. Baris DREAD tanpa pasangan hanya
+    dicatat (flow kosong) jika jawaban tidak punya tabel threat sama sekali, agar
+    ikut dalam top-N; selain itu diabaikan, bukan jadi threat tambahan.
+    """
+    doc = get_report_document(markdown_content)
+    cwes_by_threat = {}
+    dread_by_threat = {}
+    for table in doc.tables:
+        if table.kind not in ("dread", "cwe"):
+            continue
+        threat_idx = table.column("threat", "ancaman", "kerentanan")
+        if threat_idx is None:
+            threat_idx = 0
+        header = [h.lower() for h in table.header]
+        for row in table.rows:
+            threat = row[threat_idx].strip() if threat_idx < len(row) else ""
+            key = threat_key(threat)
+            if not key:
+                continue
+            if table.kind == "dread":
+                cwes_by_threat.setdefault(key, []).extend(int(c) for c in _CWE_RE.findall(" ".join(row)))
+                components = _dread_components(table, row)
+                score = dread_score(header, row)
+                if score is None and not all(np.isnan(v) for v in components):
+                    score = float(np.nanmean(components))
+                dread_by_threat[key] = (threat, components, score)
+            else:
+                cwes_by_threat.setdefault(key, []).extend(int(c) for c in _CWE_RE.findall(" ".join(row)))
+
+    rows = []
+    seen = set()
+    for table in doc.tables_of_kind("threat"):
+        flow_idx = table.column("flow")
+        threat_idx = table.column("threat")
+        scenario_idx = table.column("scenario", "skenario")
+        rec_idx = table.column("rekomendasi", "recommendation", "mitigasi")
+        marks = table.ciaan_columns()
+
+        def cell(row, idx):
+            return row[idx].strip() if idx is not None and idx < len(row) else ""
+
+        for row in table.rows:
+            threat = cell(row, threat_idx)
+            key = threat_key(threat)
+            if not key:
+                continue
+            seen.add(key)
+            cwes = [int(c) for c in _CWE_RE.findall(" ".join(row))] + cwes_by_threat.get(key, [])
+            _t, components, score = dread_by_threat.get(key, (None, [np.nan] * 5, None))
+            mask = 0
+            for idx, name in marks:
+                if cell(row, idx).casefold() in POSITIVE_MARKS:
+                    mask |= CIAAN_BITS[name]
+            rows.append({
+                "flow": cell(row, flow_idx),
+                "threat": threat,
+                "scenario": cell(row, scenario_idx),
+                "recommendation": cell(row, rec_idx),
+                "ciaan": mask,
+                "dread": components,
+                "score": score,
+                "cwes": list(dict.fromkeys(cwes)),
+            })
+
+    for key, (threat, components, score) in dread_by_threat.items():
+        if not seen:
+            rows.append({"threat": threat, "dread": components, "score": score,
+                         "cwes": list(dict.fromkeys(cwes_by_threat.get(key, [])))})
+    return ThreatRecords.from_rows(rows, source=source)
+
+
+@lru_cache(maxsize=256)
+def get_threat_records(markdown_content: str) -> ThreatRecords:
+    """ThreatRecords ter-memo per isi pesan (seperti get_report_document)."""
+    return parse_threat_records(markdown_content)
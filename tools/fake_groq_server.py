@@ -0,0 +1,158 @@
+"""
+Server Groq palsu (OpenAI-compatible) untuk menguji scheduler, batch, dan streaming
+tanpa jaringan dan tanpa kuota.
+
+    python tools/fake_groq_server.py --port 8787 --latency 0.5 --rate-limit-every 3
+
+Lalu arahkan aplikasi ke server ini:
+    GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_API_KEY=dummy streamlit run appgroqlog.py
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_REPORT = """### 1. Diagram DFD
+User -> Web App -> API Gateway -> Auth Service -> Database
+
+### 2. Mapping CWE
+| No | Threat | CWE |
+|---|---|---|
+| 1 | SQL Injection | CWE-89 |
+| 2 | Broken Authentication | CWE-287 |
+
+### 3. Tabel Kerentanan
+| FLOW PROSES | THREAT | C | I | Au | Av | N | SCENARIO | REKOMENDASI PENGAMANAN |
+|---|---|---|---|---|---|---|---|---|
+| user login | SQL Injection A03:2021 | v | v |  |  |  | penyerang menyisipkan payload pada form login | parameterized queries |
+| user login | Brute force | v |  | v | v |  | penebakan password berulang | rate limiting, MFA |
+
+### 4. DREAD
+| Threat | Damage | Reproducibility | Exploitability | Affected Users | Discoverability | Skor |
+|---|---|---|---|---|---|---|
+| SQL Injection | 5 | 4 | 4 | 5 | 4 | 4.4 |
+| Brute force | 3 | 4 | 4 | 3 | 5 | 3.8 |
+"""
+
+
+class FakeGroqState:
+    def __init__(self, latency: float, rate_limit_every: int, retry_after: float, busy_models):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.busy_models = set(busy_models or [])
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+
+
+def make_handler(state: FakeGroqState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                return self._json(200, {"requests": state.requests, "rate_limited": state.rate_limited})
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+            model = req.get("model", "fake-model")
+            n = next(state.counter)
+            with state.lock:
+                state.requests += 1
+
+            if model in state.busy_models or (state.rate_limit_every and n % state.rate_limit_every == 0):
+                with state.lock:
+                    state.rate_limited += 1
+                return self._json(
+                    429,
+                    {"error": {"message": f"Rate limit reached for model `{model}`", "type": "tokens",
+                               "code": "rate_limit_exceeded"}},
+                    {"retry-after": f"{state.retry_after:g}"},
+                )
+
+            time.sleep(state.latency)
+            prompt = req.get("messages", [{}])[-1].get("content", "")
+            text = f"Analisis untuk: {prompt[:80]}\n\n{SAMPLE_REPORT}"
+            usage = {"prompt_tokens": len(json.dumps(req.get("messages"))) // 4,
+                     "completion_tokens": len(text) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            created = int(time.time())
+
+            if req.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                pieces = [text[i:i + 24] for i in range(0, len(text), 24)]
+                for i, piece in enumerate(pieces):
+                    chunk = {"id": f"chatcmpl-{n}", "object": "chat.completion.chunk", "created": created,
+                             "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    if i == len(pieces) - 1:
+                        chunk["choices"][0]["finish_reason"] = "stop"
+                        chunk["x_groq"] = {"id": f"req-{n}", "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(0.01)
+                self.wfile.write(b"data: [DONE]\n\n")
+                return
+
+            self._json(200, {
+                "id": f"chatcmpl-{n}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8787, latency: float = 0.3, rate_limit_every: int = 0,
+          retry_after: float = 1.0, busy_models=()):
+    """Jalankan server; kembalikan (server, state). Panggil server.shutdown() untuk berhenti."""
+    state = FakeGroqState(latency, rate_limit_every, retry_after, busy_models)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--latency", type=float, default=0.3, help="detik per respons")
+    ap.add_argument("--rate-limit-every", type=int, default=0, help="balas 429 setiap request ke-N (0 = tidak)")
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--busy-model", action="append", default=[], help="model yang selalu membalas 429")
+    args = ap.parse_args()
+
+    server, _state = serve(args.host, args.port, args.latency, args.rate_limit_every,
+                           args.retry_after, args.busy_model)
+    print(f"Fake Groq server di http://{args.host}:{args.port} (Ctrl+C untuk berhenti)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()